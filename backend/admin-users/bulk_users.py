@@ -0,0 +1,192 @@
+"""
+Business: Массовые операции над пользователями: смена роли, активация и деактивация (мягкое удаление)
+Args: тело PATCH-запроса: operation, role (для set_role), ids или filter, dry_run
+Returns: итог по каждому id: updated, unchanged, protected, self, not_found
+
+Пользователи выбираются списком ids (до BULK_MAX_IDS) или фильтром filter с полями
+role, user_type, is_active и last_login_before (не входившие ни разу тоже попадают).
+users.last_login пишется отложенно (auth-new/last_login.py) и может отставать, поэтому
+last_login_before не выбирает пользователей с сессией, созданной начиная с этой даты.
+Вся операция - один UPDATE в одной транзакции: строки блокируются в порядке id,
+поэтому встречные массовые операции не взаимоблокируются. Защиты как у одиночных
+операций и строже: администраторы не меняются (protected), администратор не меняет
+сам себя (self), назначить роль admin можно только одиночным обновлением.
+Смена роли и is_active увеличивает users.session_version (триггер из V0029), поэтому
+выданные токены затронутых пользователей отзываются той же транзакцией.
+dry_run=true возвращает тот же итог и откатывает транзакцию.
+"""
+
+import os
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+from psycopg2 import extensions
+
+from user_listing import ROLES, USER_TYPES, filter_conditions
+
+BULK_MAX_IDS = 10000
+# Сколько пользователей может затронуть операция по фильтру; больше - отказ без изменений
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', '20000'))
+
+OPERATIONS = {
+    'set_role': 'role',
+    'activate': 'is_active',
+    'deactivate': 'is_active'
+}
+OUTCOMES = ('updated', 'unchanged', 'protected', 'self', 'not_found')
+
+
+class BulkLimitExceeded(Exception):
+    """Фильтр выбирает больше BULK_MAX_ROWS пользователей"""
+
+
+def _values(raw: Any, name: str, allowed: set) -> List[str]:
+    values = raw.split(',') if isinstance(raw, str) else raw
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f'{name} должен быть списком строк')
+    values = sorted({value.strip() for value in values if value.strip()})
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        raise ValueError(f"Неизвестные значения {name}: {', '.join(unknown)}")
+    return values
+
+
+def _parse_filter(raw: Any) -> Dict[str, Any]:
+    if not isinstance(raw, dict):
+        raise ValueError('filter должен быть объектом')
+    unknown = sorted(set(raw) - {'role', 'user_type', 'is_active', 'last_login_before'})
+    if unknown:
+        raise ValueError(f"Неизвестные поля filter: {', '.join(unknown)}")
+    criteria: Dict[str, Any] = {
+        'role': _values(raw['role'], 'role', ROLES) if raw.get('role') else None,
+        'user_type': _values(raw['user_type'], 'user_type', USER_TYPES) if raw.get('user_type') else None,
+        'is_active': None,
+        'last_login_before': None
+    }
+    if raw.get('is_active') is not None:
+        if not isinstance(raw['is_active'], bool):
+            raise ValueError('filter.is_active должен быть true или false')
+        criteria['is_active'] = raw['is_active']
+    if raw.get('last_login_before'):
+        try:
+            criteria['last_login_before'] = date.fromisoformat(str(raw['last_login_before']))
+        except ValueError:
+            raise ValueError('filter.last_login_before должен быть датой в формате YYYY-MM-DD')
+    if all(value is None for value in criteria.values()):
+        # Пустой фильтр выбрал бы всех пользователей
+        raise ValueError('filter должен содержать хотя бы одно условие')
+    return criteria
+
+
+def parse_bulk(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Нормализованная операция из тела запроса; ValueError с текстом для ответа 400"""
+    if not isinstance(data, dict):
+        raise ValueError('Тело запроса должно быть объектом')
+    operation = data.get('operation')
+    if operation not in OPERATIONS:
+        raise ValueError(f"operation должен быть одним из: {', '.join(sorted(OPERATIONS))}")
+
+    if operation == 'set_role':
+        value = data.get('role')
+        if value == 'admin':
+            raise ValueError('Назначить администратора можно только обновлением одного пользователя')
+        if value not in ROLES:
+            raise ValueError(f"role должен быть одним из: {', '.join(sorted(ROLES - {'admin'}))}")
+    else:
+        value = operation == 'activate'
+
+    if ('ids' in data) == ('filter' in data):
+        raise ValueError('Нужен ровно один из ids и filter')
+    bulk: Dict[str, Any] = {
+        'operation': operation,
+        'column': OPERATIONS[operation],
+        'value': value,
+        'ids': None,
+        'filter': None,
+        'dry_run': data.get('dry_run') is True
+    }
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError('ids должен быть непустым списком чисел')
+        if len(ids) > BULK_MAX_IDS:
+            raise ValueError(f'Не больше {BULK_MAX_IDS} id за один запрос')
+        bulk['ids'] = sorted(set(ids))
+    else:
+        bulk['filter'] = _parse_filter(data['filter'])
+    return bulk
+
+
+def _target(bulk: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    if bulk['ids'] is not None:
+        return ['u.id = ANY(%s)'], [bulk['ids']]
+    criteria = bulk['filter']
+    conditions, params = filter_conditions(criteria)
+    if criteria['last_login_before'] is not None:
+        conditions.append('(u.last_login IS NULL OR u.last_login < %s)')
+        # Вход мог ещё не дойти до last_login из буфера auth-new; сессия создаётся при входе сразу.
+        # Сессия, созданная после даты, истекает позже неё: условие по expires_at отсекает секции
+        conditions.append("""NOT EXISTS (
+            SELECT 1 FROM t_p67413675_chess_tournament_org.user_sessions s
+            WHERE s.user_id = u.id AND s.expires_at >= %s AND s.created_at >= %s
+        )""")
+        params.extend([criteria['last_login_before']] * 3)
+    return conditions, params
+
+
+def apply_bulk(conn, bulk: Dict[str, Any], actor_id: int) -> Dict[str, List[int]]:
+    """
+    Выполняет операцию одним запросом в текущей транзакции (commit/rollback - у вызывающего).
+    Возвращает id пользователей по итогам; BulkLimitExceeded - фильтр выбрал слишком много
+    """
+    conditions, params = _target(bulk)
+    column = bulk['column']
+    value = bulk['value']
+    row_limit = [] if bulk['ids'] is not None else [BULK_MAX_ROWS + 1]
+
+    cursor = conn.cursor(cursor_factory=extensions.cursor)
+    try:
+        cursor.execute(f"""
+            WITH target AS (
+                SELECT u.id, u.role, u.{column} AS current
+                FROM t_p67413675_chess_tournament_org.users u
+                WHERE {' AND '.join(conditions)}
+                ORDER BY u.id
+                {'' if bulk['ids'] is not None else 'LIMIT %s'}
+                FOR UPDATE
+            ),
+            changed AS (
+                UPDATE t_p67413675_chess_tournament_org.users u
+                SET {column} = %s, updated_at = NOW()
+                FROM target t
+                WHERE u.id = t.id
+                  AND t.id <> %s
+                  AND t.role IS DISTINCT FROM 'admin'
+                  AND t.current IS DISTINCT FROM %s
+                RETURNING u.id
+            )
+            SELECT t.id,
+                   CASE
+                       WHEN t.id = %s THEN 'self'
+                       WHEN t.role = 'admin' THEN 'protected'
+                       WHEN c.id IS NOT NULL THEN 'updated'
+                       ELSE 'unchanged'
+                   END
+            FROM target t
+            LEFT JOIN changed c ON c.id = t.id
+            ORDER BY t.id
+        """, params + row_limit + [value, actor_id, value, actor_id])
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    if bulk['ids'] is None and len(rows) > BULK_MAX_ROWS:
+        raise BulkLimitExceeded(f'Под фильтр попадает больше {BULK_MAX_ROWS} пользователей, уточните условия')
+
+    outcomes: Dict[str, List[int]] = {outcome: [] for outcome in OUTCOMES}
+    for user_id, outcome in rows:
+        outcomes[outcome].append(user_id)
+    if bulk['ids'] is not None:
+        found = {row[0] for row in rows}
+        outcomes['not_found'] = [user_id for user_id in bulk['ids'] if user_id not in found]
+    return outcomes
@@ -7,10 +7,18 @@ Returns: HTTP response dict
 
 import json
 import os
-import psycopg2
 from typing import Dict, Any, List, Optional
 from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from datetime import datetime, date
+
+from db_pool import acquire_connection, release_connection
+from session_tokens import is_session_active, verify_token
+from text_search import match_sql, next_cursor, parse_search
+from bulk_users import BulkLimitExceeded, apply_bulk, parse_bulk
+from user_listing import CONTENT_TYPES, export_page, load_page, parse_listing
+
+# Роли, которым доступна функция (администратор)
+ADMIN_ROLES = ('admin',)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -21,7 +29,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Session-Token',
                 'Access-Control-Max-Age': '86400'
             },
@@ -32,21 +40,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     headers = event.get('headers', {})
     session_token = headers.get('X-Session-Token') or headers.get('x-session-token')
     
-    # Проверяем права администратора
-    admin_user = check_admin_rights(session_token)
-    if not admin_user:
-        return {
-            'statusCode': 403,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Доступ запрещен. Требуются права администратора'})
-        }
-    
+    forbidden_response = {
+        'statusCode': 403,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Доступ запрещен. Требуются права администратора'})
+    }
+    conn = None
     try:
+        # Подпись, срок и роль проверяются по токену без обращения к БД
+        claims = verify_token(session_token)
+        if not claims or claims.get('role') not in ADMIN_ROLES:
+            return forbidden_response
+        
+        # Одно подключение из пула на весь запрос: и на проверку отзыва сессии, и на работу
+        conn = get_db_connection()
+        
+        # Проверяем, что сессия не отозвана
+        admin_user = check_admin_rights(conn, claims)
+        if not admin_user:
+            return forbidden_response
+        
         if method == 'GET':
-            return get_users()
+            query_params = event.get('queryStringParameters', {}) or {}
+            if query_params.get('q'):
+                return search_users(conn, query_params)
+            if query_params.get('format'):
+                return export_users(conn, query_params)
+            return get_users(conn, query_params)
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
-            return update_user(body_data)
+            return update_user(conn, body_data)
+        elif method == 'PATCH':
+            body_data = json.loads(event.get('body', '{}'))
+            return bulk_update_users(conn, body_data, admin_user['id'])
         elif method == 'DELETE':
             query_params = event.get('queryStringParameters', {}) or {}
             user_id = query_params.get('id')
@@ -56,7 +82,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'headers': {'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({'error': 'Не указан ID пользователя'})
                 }
-            return delete_user(int(user_id))
+            return delete_user(conn, int(user_id))
         else:
             return {
                 'statusCode': 405,
@@ -69,84 +95,131 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': f'Ошибка сервера: {str(e)}'})
         }
+    finally:
+        release_db_connection(conn)
 
 def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise Exception('DATABASE_URL не настроен')
-    
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    """Получение подключения к базе данных из пула, живущего между тёплыми вызовами"""
+    conn = acquire_connection()
+    conn.cursor_factory = RealDictCursor
+    return conn
 
-def check_admin_rights(session_token: Optional[str]) -> Optional[Dict[str, Any]]:
-    """Проверка прав администратора по токену сессии"""
-    if not session_token:
-        return None
-    
+def release_db_connection(conn) -> None:
+    """Возврат подключения в пул (незавершённая транзакция откатывается)"""
+    release_connection(conn)
+
+def check_admin_rights(conn, claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Проверка, что сессия подписанного токена не отозвана (кэш, при промахе - запрос)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Получаем пользователя по токену сессии
-        cursor.execute("""
-            SELECT u.id, u.username, u.email, u.full_name, u.role, u.user_type
-            FROM t_p67413675_chess_tournament_org.users u
-            JOIN t_p67413675_chess_tournament_org.user_sessions s ON u.id = s.user_id
-            WHERE s.session_token = %s AND s.expires_at > NOW()
-        """, (session_token,))
-        
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        # Проверяем, что пользователь администратор
-        if user and user['role'] == 'admin':
-            return dict(user)
-        
-        return None
+        if not is_session_active(conn, claims):
+            return None
+        return {'id': claims['uid'], 'role': claims['role']}
     except Exception:
+        conn.rollback()
         return None
 
-def get_users() -> Dict[str, Any]:
-    """Получение списка всех пользователей"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_users(conn, params: Dict[str, str]) -> Dict[str, Any]:
+    """Страница списка пользователей: фильтры role, user_type, is_active, выбор полей fields"""
+    try:
+        listing = parse_listing(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
     
-    cursor.execute("""
-        SELECT 
-            id,
-            username,
-            email,
-            full_name,
-            role,
-            user_type,
-            is_active,
-            created_at,
-            last_login,
-            date_of_birth,
-            gender,
-            fcr_id,
-            educational_institution,
-            trainer_name,
-            representative_email,
-            representative_phone
-        FROM t_p67413675_chess_tournament_org.users
-        ORDER BY created_at DESC
-    """)
+    page = load_page(conn, listing)
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, **page})
+    }
+
+def export_users(conn, params: Dict[str, str]) -> Dict[str, Any]:
+    """Выгрузка пользователей в CSV/NDJSON страницами, следующая - по заголовку X-Next-Cursor"""
+    fmt = params.get('format')
+    try:
+        if fmt not in CONTENT_TYPES:
+            raise ValueError('format должен быть csv или ndjson')
+        listing = parse_listing(params, export=True)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
     
-    users = cursor.fetchall()
+    body, next_cursor, count = export_page(conn, listing, fmt)
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': CONTENT_TYPES[fmt],
+            'Content-Disposition': f'attachment; filename="users.{fmt}"',
+            'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Users-Count',
+            'X-Next-Cursor': next_cursor or '',
+            'X-Users-Count': str(count)
+        },
+        'body': body
+    }
+
+def search_users(conn, params: Dict[str, str]) -> Dict[str, Any]:
+    """Поиск пользователей по ФИО, логину, почте и учебному заведению с ранжированием"""
+    try:
+        search = parse_search(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    condition, score = match_sql('u', ['full_name', 'username'])
+    query_params = {'q': search['q'], 'tsquery': search['tsquery'], 'limit': search['limit'] + 1}
+    after = ''
+    if search['after']:
+        after = 'WHERE (r.score, r.id) < (%(after_score)s, %(after_id)s)'
+        query_params['after_score'], query_params['after_id'] = search['after']
+    
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT r.* FROM (
+            SELECT
+                u.id,
+                u.username,
+                u.email,
+                u.full_name,
+                u.role,
+                u.user_type,
+                u.is_active,
+                u.created_at,
+                u.last_login,
+                u.date_of_birth,
+                u.gender,
+                u.fcr_id,
+                u.educational_institution,
+                u.trainer_name,
+                u.representative_email,
+                u.representative_phone,
+                {score} AS score
+            FROM t_p67413675_chess_tournament_org.users u
+            WHERE {condition}
+        ) r
+        {after}
+        ORDER BY r.score DESC, r.id DESC
+        LIMIT %(limit)s
+    """, query_params)
+    rows, cursor_token = next_cursor(cursor.fetchall(), search['limit'],
+                                     lambda row: row['score'], lambda row: row['id'])
     cursor.close()
-    conn.close()
     
-    # Преобразуем даты в строки для JSON
     users_list = []
-    for user in users:
+    for user in rows:
         user_dict = dict(user)
         for key, value in user_dict.items():
-            if isinstance(value, datetime):
+            if isinstance(value, (datetime, date)):
                 user_dict[key] = value.isoformat()
-            elif value is None:
-                user_dict[key] = None
         users_list.append(user_dict)
     
     return {
@@ -155,11 +228,12 @@ def get_users() -> Dict[str, Any]:
         'body': json.dumps({
             'success': True,
             'users': users_list,
-            'total': len(users_list)
+            'count': len(users_list),
+            'next_cursor': cursor_token
         })
     }
 
-def update_user(data: Dict[str, Any]) -> Dict[str, Any]:
+def update_user(conn, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обновление данных пользователя"""
     user_id = data.get('id')
     if not user_id:
@@ -204,7 +278,6 @@ def update_user(data: Dict[str, Any]) -> Dict[str, Any]:
     update_fields.append("updated_at = NOW()")
     update_values.append(user_id)  # для WHERE условия
     
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Обновляем пользователя
@@ -220,7 +293,6 @@ def update_user(data: Dict[str, Any]) -> Dict[str, Any]:
     
     conn.commit()
     cursor.close()
-    conn.close()
     
     if updated_user:
         user_dict = dict(updated_user)
@@ -245,9 +317,38 @@ def update_user(data: Dict[str, Any]) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Пользователь не найден'})
         }
 
-def delete_user(user_id: int) -> Dict[str, Any]:
+def bulk_update_users(conn, data: Dict[str, Any], actor_id: int) -> Dict[str, Any]:
+    """Массовая смена роли, активация или деактивация одной транзакцией, итог по каждому id"""
+    try:
+        bulk = parse_bulk(data)
+        outcomes = apply_bulk(conn, bulk, actor_id)
+    except (ValueError, BulkLimitExceeded) as e:
+        conn.rollback()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    if bulk['dry_run']:
+        conn.rollback()
+    else:
+        conn.commit()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'operation': bulk['operation'],
+            'dry_run': bulk['dry_run'],
+            'summary': {outcome: len(ids) for outcome, ids in outcomes.items()},
+            'outcomes': outcomes
+        })
+    }
+
+def delete_user(conn, user_id: int) -> Dict[str, Any]:
     """Удаление пользователя (мягкое удаление - деактивация)"""
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Проверяем, существует ли пользователь
@@ -259,7 +360,6 @@ def delete_user(user_id: int) -> Dict[str, Any]:
     user = cursor.fetchone()
     if not user:
         cursor.close()
-        conn.close()
         return {
             'statusCode': 404,
             'headers': {'Access-Control-Allow-Origin': '*'},
@@ -269,7 +369,6 @@ def delete_user(user_id: int) -> Dict[str, Any]:
     # Запрещаем удаление администраторов
     if user['role'] == 'admin':
         cursor.close()
-        conn.close()
         return {
             'statusCode': 403,
             'headers': {'Access-Control-Allow-Origin': '*'},
@@ -285,7 +384,6 @@ def delete_user(user_id: int) -> Dict[str, Any]:
     
     conn.commit()
     cursor.close()
-    conn.close()
     
     return {
         'statusCode': 200,
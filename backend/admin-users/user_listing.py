@@ -0,0 +1,268 @@
+"""
+Business: Список пользователей для админки страницами по id, с выбором полей и фильтрами, и выгрузка в CSV/NDJSON
+Args: параметры запроса fields, role, user_type, is_active, limit, cursor, format
+Returns: страница пользователей и курсор следующей страницы либо текст выгрузки
+
+Пользователи идут от новых к старым по id (он растёт вместе с created_at, но не
+бывает NULL), курсор хранит id последнего пользователя страницы. fields - список
+полей через запятую (по умолчанию все), id есть в ответе всегда. role и user_type
+принимают несколько значений через запятую.
+
+Выгрузка читает строки серверным (именованным) курсором порциями по
+USERS_EXPORT_FETCH_SIZE и сразу пишет их в текст. Ответ функции отдаётся целиком,
+поэтому HTTP-выгрузка идёт страницами до USERS_EXPORT_PAGE_SIZE_MAX строк.
+
+Полная выгрузка в файл: python user_listing.py [--format ndjson] [--role player] [--output users.csv]
+"""
+
+import argparse
+import base64
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from psycopg2 import extensions
+
+USERS_PAGE_SIZE = 50
+USERS_PAGE_MAX = 200
+USERS_EXPORT_PAGE_SIZE = 1000
+USERS_EXPORT_PAGE_SIZE_MAX = 5000
+USERS_EXPORT_FETCH_SIZE = int(os.environ.get('USERS_EXPORT_FETCH_SIZE', '500'))
+
+ROLES = {'player', 'moderator', 'admin'}
+USER_TYPES = {'child', 'parent', 'trainer', 'admin', 'player'}
+
+# Поля ответа в порядке вывода; id выбирается всегда - по нему строится курсор
+FIELDS = [
+    'id', 'username', 'email', 'full_name', 'role', 'user_type', 'is_active',
+    'created_at', 'last_login', 'date_of_birth', 'gender', 'fcr_id',
+    'educational_institution', 'trainer_name', 'representative_email', 'representative_phone'
+]
+TEMPORAL_FIELDS = {'created_at', 'last_login', 'date_of_birth'}
+
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+
+
+def encode_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([user_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[int]:
+    """id последнего пользователя предыдущей страницы; ValueError - курсор повреждён"""
+    if not token:
+        return None
+    try:
+        user_id, = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return int(user_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+
+
+def _values(params: Dict[str, str], name: str, allowed: set) -> Optional[List[str]]:
+    raw = params.get(name)
+    if not raw:
+        return None
+    values = sorted({value.strip() for value in raw.split(',') if value.strip()})
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        raise ValueError(f"Неизвестные значения {name}: {', '.join(unknown)}")
+    return values or None
+
+
+def parse_listing(params: Dict[str, str], export: bool = False) -> Dict[str, Any]:
+    """Поля, фильтры и страница из query string; ValueError с текстом для ответа 400"""
+    fields = FIELDS
+    if params.get('fields'):
+        requested = {field.strip() for field in params['fields'].split(',') if field.strip()}
+        unknown = sorted(requested - set(FIELDS))
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        # Порядок полей - как в FIELDS, id нужен всегда
+        fields = [field for field in FIELDS if field in requested or field == 'id']
+
+    is_active = params.get('is_active')
+    if is_active not in (None, '', '0', '1', 'true', 'false'):
+        raise ValueError('is_active должен быть true или false')
+
+    default, maximum = (USERS_EXPORT_PAGE_SIZE, USERS_EXPORT_PAGE_SIZE_MAX) if export else (USERS_PAGE_SIZE, USERS_PAGE_MAX)
+    try:
+        limit = int(params.get('limit', default))
+    except ValueError:
+        raise ValueError('limit должен быть числом')
+
+    return {
+        'fields': fields,
+        'role': _values(params, 'role', ROLES),
+        'user_type': _values(params, 'user_type', USER_TYPES),
+        'is_active': None if not is_active else is_active in ('1', 'true'),
+        'limit': max(1, min(limit, maximum)),
+        'after': decode_cursor(params.get('cursor'))
+    }
+
+
+def filter_conditions(criteria: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    """Условия по role, user_type, is_active для таблицы users с псевдонимом u"""
+    conditions: List[str] = []
+    params: List[Any] = []
+    for name in ('role', 'user_type'):
+        if criteria.get(name):
+            conditions.append(f'u.{name} = ANY(%s)')
+            params.append(criteria[name])
+    if criteria.get('is_active') is not None:
+        conditions.append('u.is_active = %s')
+        params.append(criteria['is_active'])
+    return conditions, params
+
+
+def _query(listing: Dict[str, Any], limit: Optional[int]) -> Tuple[str, List[Any]]:
+    conditions, params = filter_conditions(listing)
+    if listing['after'] is not None:
+        conditions.append('u.id < %s')
+        params.append(listing['after'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = ', '.join(f'u.{field}' for field in listing['fields'])
+    limit_sql = ''
+    if limit is not None:
+        limit_sql = 'LIMIT %s'
+        params.append(limit)
+    return f"""
+        SELECT {columns}
+        FROM t_p67413675_chess_tournament_org.users u
+        {where}
+        ORDER BY u.id DESC
+        {limit_sql}
+    """, params
+
+
+def serialize_user(fields: List[str], row: Tuple) -> Dict[str, Any]:
+    user = dict(zip(fields, row))
+    for field in TEMPORAL_FIELDS.intersection(fields):
+        if isinstance(user[field], date):
+            user[field] = user[field].isoformat()
+    return user
+
+
+def load_page(conn, listing: Dict[str, Any]) -> Dict[str, Any]:
+    """Страница списка: пользователи с выбранными полями и курсор следующей страницы"""
+    limit = listing['limit']
+    sql, params = _query(listing, limit + 1)
+    # Кортежи вместо RealDictCursor подключения: словарь строится только из выбранных полей
+    cursor = conn.cursor(cursor_factory=extensions.cursor)
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0])
+    users = [serialize_user(listing['fields'], row) for row in rows]
+    return {'users': users, 'count': len(users), 'next_cursor': next_cursor}
+
+
+def iter_rows(conn, listing: Dict[str, Any], limit: Optional[int],
+              fetch_size: int = USERS_EXPORT_FETCH_SIZE) -> Iterator[Tuple]:
+    """Строки выборки через именованный курсор; limit=None - без ограничения"""
+    sql, params = _query(listing, limit)
+    cursor = conn.cursor(name='users_export', cursor_factory=extensions.cursor)
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class ExportWriter:
+    """Пишет строки выгрузки в текст: CSV с заголовком или NDJSON"""
+
+    def __init__(self, fields: List[str], fmt: str, header: bool = True):
+        self.fields = fields
+        self.fmt = fmt
+        self.buffer = io.StringIO()
+        self.csv = csv.writer(self.buffer, lineterminator='\n') if fmt == 'csv' else None
+        if self.csv and header:
+            # BOM: Excel иначе открывает кириллицу в CSV не в той кодировке
+            self.buffer.write('\ufeff')
+            self.csv.writerow(fields)
+
+    def write(self, row: Tuple) -> None:
+        if self.csv:
+            self.csv.writerow([_csv_value(value) for value in row])
+        else:
+            self.buffer.write(json.dumps(serialize_user(self.fields, row), ensure_ascii=False))
+            self.buffer.write('\n')
+
+    def drain(self) -> str:
+        """Накопленный текст; буфер очищается"""
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+def export_page(conn, listing: Dict[str, Any], fmt: str) -> Tuple[str, Optional[str], int]:
+    """Одна страница выгрузки: (текст, курсор следующей страницы или None, число строк)"""
+    limit = listing['limit']
+    # Заголовок CSV - только в первой странице, чтобы страницы склеивались в один файл
+    writer = ExportWriter(listing['fields'], fmt, header=listing['after'] is None)
+    count, last_id, more = 0, None, False
+    rows = iter_rows(conn, listing, limit + 1)
+    try:
+        for row in rows:
+            if count == limit:
+                more = True
+                break
+            writer.write(row)
+            count += 1
+            last_id = row[0]
+    finally:
+        rows.close()
+    return writer.drain(), encode_cursor(last_id) if more else None, count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка пользователей в CSV или NDJSON')
+    parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+    parser.add_argument('--fields', help='поля через запятую (по умолчанию все)')
+    parser.add_argument('--role', help='роли через запятую')
+    parser.add_argument('--user-type', help='типы пользователей через запятую')
+    parser.add_argument('--is-active', choices=['true', 'false'])
+    parser.add_argument('--output', help='файл (по умолчанию stdout)')
+    args = parser.parse_args()
+    import psycopg2
+
+    options = parse_listing({
+        'fields': args.fields or '', 'role': args.role or '', 'user_type': args.user_type or '',
+        'is_active': args.is_active or ''
+    }, export=True)
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        writer = ExportWriter(options['fields'], args.format)
+        for number, user_row in enumerate(iter_rows(connection, options, None), 1):
+            writer.write(user_row)
+            if number % USERS_EXPORT_FETCH_SIZE == 0:
+                out.write(writer.drain())
+        out.write(writer.drain())
+    finally:
+        if args.output:
+            out.close()
+        connection.close()
@@ -1,17 +1,34 @@
 import json
 import os
-import psycopg2
 import hashlib
-import secrets
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
+
+import last_login
+import login_throttle
+from db_pool import acquire_connection, release_connection
+from session_tokens import (
+    expires_at_of, forget_session, is_session_active, new_session, session_key, sign_token, verify_token
+)
+
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', '10'))
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     API для регистрации и авторизации пользователей с хэшированием паролей
     Поддерживает регистрацию, вход, выход, проверку сессии
     """
-    
+    try:
+        return handle_request(event)
+    finally:
+        # Буфер last_login проверяется в конце каждого вызова, а не только после входа:
+        # иначе одиночный вход ждал бы следующего входа на этом же экземпляре.
+        # Сброс идёт до возврата ответа: вызов, на который он пришёлся, ждёт
+        # соединение из пула и UPDATE
+        flush_last_login()
+
+
+def handle_request(event: Dict[str, Any]) -> Dict[str, Any]:
     method = event.get('httpMethod', 'GET')
     
     # CORS headers
@@ -29,21 +46,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
+    headers = event.get('headers', {})
+    session_token = headers.get('X-Session-Token') or headers.get('x-session-token')
+    
+    # Подпись и срок токена проверяются без БД: с негодным токеном подключение не нужно
+    claims = verify_token(session_token) if method == 'GET' else None
+    if method == 'GET' and not claims:
+        return {
+            'statusCode': 200,
+            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'authenticated': False})
+        }
+    
     conn = None
     cursor = None
     
     try:
-        # Подключение к БД
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor()
-        
         body_data = {}
         if event.get('body'):
             body_data = json.loads(event.get('body', '{}'))
         
         action = body_data.get('action', '')
-        headers = event.get('headers', {})
-        session_token = headers.get('X-Session-Token') or headers.get('x-session-token')
+        
+        # Попытки входа сверх лимита отклоняются до подключения к БД
+        throttle_limits = []
+        if method == 'POST' and action == 'login':
+            throttle_limits = login_throttle.limits_for(body_data.get('username'), login_throttle.client_ip(event))
+            wait = login_throttle.take(throttle_limits)
+            if wait:
+                return too_many_attempts(cors_headers, wait)
+        
+        # Подключение из пула, живущего между тёплыми вызовами
+        conn = acquire_connection()
+        cursor = conn.cursor()
         
         if method == 'POST':
             if action == 'login':
@@ -51,9 +86,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 username = body_data.get('username')
                 password = body_data.get('password')
                 
-                print(f"Login attempt: username={username}, password length={len(password) if password else 0}")
-                print(f"Body data: {body_data}")
-                
                 if not username or not password:
                     return {
                         'statusCode': 400,
@@ -61,46 +93,85 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'success': False, 'error': 'Логин и пароль обязательны'})
                     }
                 
-                # Ищем пользователя по username
+                # Один запрос: общий лимит попыток, пользователь с паролем, новая сессия и отзыв
+                # сессий сверх лимита. jti и срок известны заранее, токен подписывается после -
+                # ему нужны роль и версия. При исчерпанном лимите пароль не проверяется
+                password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+                jti, exp = new_session()
+                expires_at = expires_at_of(exp)
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
                 cursor.execute("""
-                    SELECT id, username, email, password_hash, full_name, user_type, birth_date, 
-                           fsr_id, coach, educational_institution, role
-                    FROM users 
-                    WHERE username = %s AND is_active = true
-                """, (username.lower(),))
+                    WITH blocked AS (
+                        -- {ключ: секунд до жетона} по пустым общим корзинам или NULL
+                        SELECT json_object_agg(t.key, (1 - t.available) / t.rate) AS retry_after
+                        FROM (
+                            SELECT key, rate,
+                                   tokens + EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - updated_at) * rate AS available
+                            FROM login_throttle
+                            WHERE key = ANY(%(throttle_keys)s::text[])
+                        ) t
+                        WHERE t.available < 1
+                    ),
+                    u AS (
+                        SELECT id, username, email, full_name, user_type, birth_date,
+                               fsr_id, coach, educational_institution, role, session_version
+                        FROM users
+                        WHERE username = %(username)s AND password_hash = %(password_hash)s AND is_active = true
+                          AND NOT EXISTS (SELECT 1 FROM blocked WHERE retry_after IS NOT NULL)
+                    ),
+                    created AS (
+                        INSERT INTO user_sessions (user_id, session_token, expires_at)
+                        SELECT id, %(jti)s, %(expires_at)s FROM u
+                    ),
+                    evicted AS (
+                        UPDATE user_sessions SET revoked_at = CURRENT_TIMESTAMP
+                        WHERE (id, expires_at) IN (
+                            SELECT s.id, s.expires_at
+                            FROM user_sessions s JOIN u ON s.user_id = u.id
+                            WHERE s.expires_at > %(now)s AND s.revoked_at IS NULL
+                            ORDER BY s.created_at DESC, s.id DESC
+                            OFFSET %(keep)s
+                        )
+                        RETURNING session_token
+                    )
+                    SELECT blocked.retry_after, u.*, ARRAY(SELECT session_token FROM evicted)
+                    FROM blocked LEFT JOIN u ON true
+                """, {
+                    'throttle_keys': [key for key, _, _ in throttle_limits],
+                    'username': username.lower(),
+                    'password_hash': password_hash,
+                    'jti': jti,
+                    'expires_at': expires_at,
+                    'now': now,
+                    # Новая сессия в снимке запроса ещё не видна: из прежних остаётся на одну меньше
+                    'keep': max(MAX_SESSIONS_PER_USER - 1, 0)
+                })
                 
-                user = cursor.fetchone()
-                if not user:
-                    return {
-                        'statusCode': 401,
-                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                        'body': json.dumps({'success': False, 'error': 'Неверный логин или пароль'})
-                    }
+                row = cursor.fetchone()
+                retry_after, user = row[0], row[1:]
+                if retry_after:
+                    conn.rollback()
+                    login_throttle.hold(throttle_limits, retry_after)
+                    return too_many_attempts(cors_headers, max(retry_after.values()))
                 
-                # Проверяем пароль через хэш SHA-256
-                password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-                if user[3] != password_hash:
+                if user[0] is None:
+                    # Неудачный вход тратит жетон общих корзин; остаток переносится в локальные
+                    remaining = login_throttle.record_failure(cursor, throttle_limits)
+                    conn.commit()
+                    login_throttle.sync(throttle_limits, remaining)
                     return {
                         'statusCode': 401,
                         'headers': {**cors_headers, 'Content-Type': 'application/json'},
                         'body': json.dumps({'success': False, 'error': 'Неверный логин или пароль'})
                     }
                 
-                # Создаем сессию
-                session_token = secrets.token_urlsafe(32)
-                expires_at = datetime.now() + timedelta(hours=24)
-                
-                cursor.execute("""
-                    INSERT INTO user_sessions (user_id, session_token, expires_at)
-                    VALUES (%s, %s, %s)
-                """, (user[0], session_token, expires_at))
-                
-                # Обновляем last_login
-                cursor.execute("""
-                    UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s
-                """, (user[0],))
-                
                 conn.commit()
+                session_token = sign_token(user[0], user[9], user[10], jti, exp)
+                for evicted in user[11]:
+                    forget_session(evicted)
+                
+                # last_login пишется отложенно пачкой, без блокировки строки пользователя при входе
+                last_login.record_login(user[0], now)
                 
                 return {
                     'statusCode': 200,
@@ -113,24 +184,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'id': user[0],
                             'username': user[1],
                             'email': user[2],
-                            'fullName': user[4],
-                            'userType': user[10] if user[10] else user[5],  # role или user_type
-                            'birthDate': user[6].isoformat() if user[6] else None,
-                            'fsrId': user[7],
-                            'coach': user[8],
-                            'educationalInstitution': user[9],
-                            'role': user[10] if user[10] else 'player'
+                            'fullName': user[3],
+                            'userType': user[9] if user[9] else user[4],  # role или user_type
+                            'birthDate': user[5].isoformat() if user[5] else None,
+                            'fsrId': user[6],
+                            'coach': user[7],
+                            'educationalInstitution': user[8],
+                            'role': user[9] if user[9] else 'player'
                         }
                     })
                 }
             
             elif action == 'logout':
-                # Выход пользователя
-                if session_token:
+                # Выход пользователя: сессия помечается отозванной
+                key = session_key(session_token)
+                if key:
+                    jti, expires_at = key
                     cursor.execute("""
-                        DELETE FROM user_sessions WHERE session_token = %s
-                    """, (session_token,))
+                        UPDATE user_sessions SET revoked_at = CURRENT_TIMESTAMP
+                        WHERE session_token = %s AND expires_at = %s AND revoked_at IS NULL
+                    """, (jti, expires_at))
                     conn.commit()
+                    forget_session(jti)
                 
                 return {
                     'statusCode': 200,
@@ -152,41 +227,35 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'success': False, 'error': 'Все обязательные поля должны быть заполнены'})
                     }
                 
-                # Проверяем уникальность username и email
+                # Уникальность логина и email проверяют ограничения таблицы: без отдельного SELECT
+                password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+                jti, exp = new_session()
+                expires_at = expires_at_of(exp)
                 cursor.execute("""
-                    SELECT id FROM users WHERE username = %s OR email = %s
-                """, (username.lower(), email.lower()))
+                    WITH new_user AS (
+                        INSERT INTO users (username, email, password_hash, full_name, user_type, role)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT DO NOTHING
+                        RETURNING id, username, email, full_name, user_type, role, session_version
+                    ),
+                    created AS (
+                        INSERT INTO user_sessions (user_id, session_token, expires_at)
+                        SELECT id, %s, %s FROM new_user
+                    )
+                    SELECT * FROM new_user
+                """, (username.lower(), email.lower(), password_hash, full_name, 'player', 'player', jti, expires_at))
                 
-                if cursor.fetchone():
+                new_user = cursor.fetchone()
+                if not new_user:
+                    conn.rollback()
                     return {
                         'statusCode': 409,
                         'headers': {**cors_headers, 'Content-Type': 'application/json'},
                         'body': json.dumps({'success': False, 'error': 'Пользователь с таким логином или email уже существует'})
                     }
                 
-                # Хэшируем пароль
-                password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-                
-                # Создаём пользователя
-                cursor.execute("""
-                    INSERT INTO users (username, email, password_hash, full_name, user_type, role)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING id, username, email, full_name, user_type, role
-                """, (username.lower(), email.lower(), password_hash, full_name, 'player', 'player'))
-                
-                new_user = cursor.fetchone()
-                conn.commit()
-                
-                # Создаем сессию
-                session_token = secrets.token_urlsafe(32)
-                expires_at = datetime.now() + timedelta(hours=24)
-                
-                cursor.execute("""
-                    INSERT INTO user_sessions (user_id, session_token, expires_at)
-                    VALUES (%s, %s, %s)
-                """, (new_user[0], session_token, expires_at))
-                
                 conn.commit()
+                session_token = sign_token(new_user[0], new_user[5], new_user[6], jti, exp)
                 
                 return {
                     'statusCode': 200,
@@ -207,16 +276,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         elif method == 'GET':
-            if session_token:
-                # Проверка сессии
+            # Токен уже проверен; отзыв - из кэша, затем профиль по id пользователя
+            if is_session_active(conn, claims):
                 cursor.execute("""
                     SELECT u.id, u.username, u.email, u.full_name, u.user_type, u.birth_date, 
                            u.fsr_id, u.coach, u.educational_institution, p.id as player_id, u.role
                     FROM users u
-                    JOIN user_sessions s ON u.id = s.user_id
                     LEFT JOIN players p ON u.id = p.user_id
-                    WHERE s.session_token = %s AND s.expires_at > CURRENT_TIMESTAMP AND u.is_active = true
-                """, (session_token,))
+                    WHERE u.id = %s AND u.is_active = true
+                """, (claims['uid'],))
                 
                 user = cursor.fetchone()
                 if user:
@@ -264,4 +332,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
+
+
+
+def too_many_attempts(cors_headers: Dict[str, str], wait: float) -> Dict[str, Any]:
+    retry_after = login_throttle.retry_after_header(wait)
+    return {
+        'statusCode': 429,
+        'headers': {
+            **cors_headers,
+            'Content-Type': 'application/json',
+            'Retry-After': retry_after,
+            'Access-Control-Expose-Headers': 'Retry-After'
+        },
+        'body': json.dumps({
+            'success': False,
+            'error': f'Слишком много попыток входа. Повторите через {retry_after} с'
+        })
+    }
+
+
+def flush_last_login() -> None:
+    """
+    Сброс буфера last_login, если он назрел; выполняется до возврата ответа и
+    удлиняет этот вызов. Ошибка сброса не мешает ответу
+    """
+    if not last_login.flush_due():
+        return
+    conn = None
+    try:
+        conn = acquire_connection()
+        written = last_login.flush(conn)
+        print(f"last_login flushed: {written} users")
+    except Exception as e:
+        print(f"last_login flush failed: {str(e)}")
+    finally:
+        if conn:
+            release_connection(conn)
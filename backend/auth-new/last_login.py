@@ -0,0 +1,80 @@
+"""
+Business: Отложенная запись users.last_login пачками вместо UPDATE на каждый вход
+Args: LAST_LOGIN_FLUSH_SECONDS, LAST_LOGIN_FLUSH_SIZE из окружения
+Returns: число записанных строк при сбросе буфера
+
+Вход только кладёт время в буфер тёплого экземпляра (повторные входы одного
+пользователя схлопываются). Буфер сбрасывается одним UPDATE, когда набралось
+LAST_LOGIN_FLUSH_SIZE пользователей или прошло LAST_LOGIN_FLUSH_SECONDS с первой записи;
+это проверяется в конце каждого вызова функции, до возврата ответа. Строки, заблокированные правкой
+администратора, пропускаются (SKIP LOCKED) и остаются в буфере до следующего сброса.
+last_login - справочное поле: при остановке экземпляра несброшенные значения теряются.
+Поэтому отбор по давности входа (admin-users, filter.last_login_before) смотрит ещё и
+на user_sessions.created_at, которое пишется при входе сразу.
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from psycopg2.extras import execute_values
+
+LAST_LOGIN_FLUSH_SECONDS = float(os.environ.get('LAST_LOGIN_FLUSH_SECONDS', '30'))
+LAST_LOGIN_FLUSH_SIZE = int(os.environ.get('LAST_LOGIN_FLUSH_SIZE', '50'))
+
+# user_id -> время последнего входа
+_pending: Dict[int, datetime] = {}
+_pending_since: Optional[float] = None
+
+
+def record_login(user_id: int, logged_in_at: datetime) -> None:
+    global _pending_since
+    if not _pending:
+        _pending_since = time.monotonic()
+    previous = _pending.get(user_id)
+    if previous is None or logged_in_at > previous:
+        _pending[user_id] = logged_in_at
+
+
+def flush_due() -> bool:
+    return bool(_pending) and (len(_pending) >= LAST_LOGIN_FLUSH_SIZE or
+                               time.monotonic() - _pending_since >= LAST_LOGIN_FLUSH_SECONDS)
+
+
+def flush(conn) -> int:
+    """Записывает буфер одной транзакцией; вызывать вне транзакции запроса"""
+    global _pending_since
+    if not _pending:
+        return 0
+    batch = sorted(_pending.items())
+    cursor = conn.cursor()
+    try:
+        rows = execute_values(cursor, """
+            WITH v(id, last_login) AS (VALUES %s),
+            locked AS (
+                SELECT u.id, v.last_login
+                FROM t_p67413675_chess_tournament_org.users u
+                JOIN v ON v.id = u.id
+                FOR UPDATE OF u SKIP LOCKED
+            )
+            UPDATE t_p67413675_chess_tournament_org.users u
+            SET last_login = GREATEST(u.last_login, locked.last_login)
+            FROM locked
+            WHERE u.id = locked.id
+            RETURNING u.id
+        """, batch, template='(%s::integer, %s::timestamp)', page_size=len(batch), fetch=True)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    # Заблокированные строки остаются в буфере; новый вход за время сброса тоже не теряется
+    written = {row[0] for row in rows}
+    for user_id, logged_in_at in batch:
+        if user_id in written and _pending.get(user_id) == logged_in_at:
+            del _pending[user_id]
+    _pending_since = time.monotonic() if _pending else None
+    return len(written)
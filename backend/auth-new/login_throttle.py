@@ -0,0 +1,125 @@
+"""
+Business: Ограничение частоты попыток входа по логину и по IP (token bucket) до обращения к БД
+Args: LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE, LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE, LOGIN_THROTTLE_MAX_KEYS из окружения
+Returns: через сколько секунд можно повторить попытку (0 - попытка разрешена)
+
+Два уровня. Корзины тёплого экземпляра тратят жетон на каждую попытку и отклоняют
+лишние без подключения к БД. Общие корзины в login_throttle тратят жетон только на
+неудачный вход и проверяются тем же запросом, что и пароль, поэтому перебор через
+разные экземпляры функции тоже упирается в лимит. Состояние общей корзины,
+полученное из БД, переносится в локальную: следующие попытки отклоняются уже без БД.
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+LOGIN_USER_BURST = float(os.environ.get('LOGIN_USER_BURST', '5'))
+LOGIN_USER_PER_MINUTE = float(os.environ.get('LOGIN_USER_PER_MINUTE', '2'))
+# С одного адреса входят целые шахматные клубы и школы: лимит заметно выше
+LOGIN_IP_BURST = float(os.environ.get('LOGIN_IP_BURST', '30'))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', '30'))
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', '4096'))
+
+# (ключ корзины, ёмкость, пополнение в жетонах за секунду)
+Limit = Tuple[str, float, float]
+
+# ключ -> [жетоны, время обновления]; вытесняется давно не использованный ключ
+_buckets: 'OrderedDict[str, List[float]]' = OrderedDict()
+
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    """Адрес клиента из контекста вызова, иначе первый адрес X-Forwarded-For"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for')
+    if not forwarded:
+        return None
+    return forwarded.split(',')[0].strip() or None
+
+
+def limits_for(username: Any, ip: Optional[str]) -> List[Limit]:
+    limits = []
+    if isinstance(username, str) and username.strip():
+        limits.append((f'user:{username.strip().lower()}', LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60))
+    if ip:
+        limits.append((f'ip:{ip}', LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60))
+    return limits
+
+
+def _refilled(key: str, burst: float, rate: float, now: float) -> List[float]:
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = [burst, now]
+        _buckets[key] = bucket
+    else:
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+    _buckets.move_to_end(key)
+    return bucket
+
+
+def _trim() -> None:
+    while len(_buckets) > LOGIN_THROTTLE_MAX_KEYS:
+        _buckets.popitem(last=False)
+
+
+def take(limits: List[Limit]) -> float:
+    """Тратит жетон из каждой корзины; если хоть одна пуста - ничего не тратит и возвращает ожидание"""
+    now = time.monotonic()
+    buckets = [(_refilled(key, burst, rate, now), rate) for key, burst, rate in limits]
+    _trim()
+    wait = max([(1 - bucket[0]) / rate for bucket, rate in buckets if bucket[0] < 1] or [0.0])
+    if wait:
+        return wait
+    for bucket, _ in buckets:
+        bucket[0] -= 1
+    return 0.0
+
+
+def hold(limits: List[Limit], retry_after: Dict[str, float]) -> None:
+    """Переносит блокировку общей корзины в локальную: ключ пуст ещё retry_after секунд"""
+    now = time.monotonic()
+    for key, burst, rate in limits:
+        if key in retry_after:
+            bucket = _refilled(key, burst, rate, now)
+            bucket[0] = min(bucket[0], 1 - retry_after[key] * rate)
+    _trim()
+
+
+def sync(limits: List[Limit], remaining: Dict[str, float]) -> None:
+    """Локальная корзина не может быть полнее общей после неудачного входа"""
+    now = time.monotonic()
+    for key, burst, rate in limits:
+        if key in remaining:
+            bucket = _refilled(key, burst, rate, now)
+            bucket[0] = min(bucket[0], remaining[key])
+    _trim()
+
+
+def retry_after_header(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
+
+
+def record_failure(cursor, limits: List[Limit]) -> Dict[str, float]:
+    """Тратит жетон общих корзин за неудачный вход; возвращает остаток по ключам"""
+    if not limits:
+        return {}
+    cursor.execute("""
+        INSERT INTO login_throttle AS t (key, tokens, burst, rate, updated_at)
+        SELECT l.key, l.burst - 1, l.burst, l.rate, CURRENT_TIMESTAMP
+        FROM unnest(%s::text[], %s::float8[], %s::float8[]) AS l(key, burst, rate)
+        ORDER BY l.key
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = GREATEST(LEAST(EXCLUDED.burst,
+                t.tokens + EXTRACT(EPOCH FROM EXCLUDED.updated_at - t.updated_at) * EXCLUDED.rate) - 1, 0),
+            burst = EXCLUDED.burst,
+            rate = EXCLUDED.rate,
+            updated_at = EXCLUDED.updated_at
+        RETURNING key, tokens
+    """, ([key for key, _, _ in limits], [burst for _, burst, _ in limits], [rate for _, _, rate in limits]))
+    return {row[0]: float(row[1]) for row in cursor.fetchall()}
@@ -0,0 +1,166 @@
+"""
+Business: Обслуживание user_sessions: секции на месяцы вперёд и удаление истёкших секций целиком
+Args: SESSION_PARTITIONS_AHEAD, SESSION_RETENTION_DAYS, SESSION_SWEEPER_LOCK_TIMEOUT из окружения
+Returns: вынесенные из секции по умолчанию, созданные, удалённые и отложенные секции, число удалённых корзин входа
+
+Запускается по расписанию раз в сутки: python session_sweeper.py [--dry-run]
+Одновременно работает один экземпляр (pg_try_advisory_lock), второй сразу завершается.
+Секция отсоединяется обычным DETACH PARTITION и только потом удаляется: CONCURRENTLY
+PostgreSQL не допускает при секции по умолчанию. DETACH держит блокировку user_sessions
+считанные миллисекунды, а ожидание блокировок ограничено SESSION_SWEEPER_LOCK_TIMEOUT:
+при конфликте секция остаётся до следующего запуска, остальная работа продолжается.
+Заодно удаляются полностью пополненные корзины login_throttle: на лимит входа они не влияют.
+
+Сессии месяца без своей секции попадают в секцию по умолчанию user_sessions_default
+(V0033), поэтому пропущенный запуск не ломает вход. Сборщик выносит такие строки
+в секции их месяцев (create_user_sessions_partition переносит их сам), после чего
+истёкшие месяцы удаляются обычным порядком.
+"""
+
+import argparse
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from psycopg2 import errors as pg_errors
+
+SESSION_PARTITIONS_AHEAD = int(os.environ.get('SESSION_PARTITIONS_AHEAD', '3'))
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', '7'))
+SESSION_SWEEPER_LOCK_TIMEOUT = os.environ.get('SESSION_SWEEPER_LOCK_TIMEOUT', '2s')
+
+SCHEMA = 't_p67413675_chess_tournament_org'
+PARTITION_PATTERN = re.compile(r'^user_sessions_p(\d{4})(\d{2})$')
+# Ключ pg_try_advisory_lock сборщика
+SWEEPER_LOCK_KEY = 0x5E55_1011
+
+
+def month_start(day: date, months: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_PATTERN.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def list_partitions(cursor) -> List[Tuple[str, bool]]:
+    """Секции user_sessions: (имя, отсоединение не завершено)"""
+    cursor.execute("""
+        SELECT c.relname, i.inhdetachpending
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = %s AND p.relname = 'user_sessions'
+    """, (SCHEMA,))
+    return cursor.fetchall()
+
+
+def list_detached(cursor) -> List[str]:
+    """Таблицы секций, отсоединённые прошлым запуском, но не удалённые"""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = 'r' AND NOT c.relispartition
+          AND c.relname ~ '^user_sessions_p[0-9]{6}$'
+    """, (SCHEMA,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def sweep(conn, today: Optional[date] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """Один проход сборщика; conn переводится в autocommit: каждый шаг - своя короткая транзакция"""
+    today = today or datetime.now(timezone.utc).date()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    report: Dict[str, Any] = {'split': [], 'created': [], 'dropped': [], 'postponed': []}
+
+    cursor.execute('SELECT pg_try_advisory_lock(%s)', (SWEEPER_LOCK_KEY,))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        report['skipped'] = 'сборщик уже запущен'
+        return report
+
+    try:
+        cursor.execute('SET lock_timeout = %s', (SESSION_SWEEPER_LOCK_TIMEOUT,))
+        cursor.execute(f"""
+            SELECT DISTINCT date_trunc('month', expires_at)::date
+            FROM {SCHEMA}.user_sessions_default
+            ORDER BY 1
+        """)
+        for start, in cursor.fetchall():
+            name = f"user_sessions_p{start:%Y%m}"
+            try:
+                if not dry_run:
+                    cursor.execute(f'SELECT {SCHEMA}.create_user_sessions_partition(%s)', (start,))
+                report['split'].append(name)
+            except pg_errors.LockNotAvailable:
+                report['postponed'].append(name)
+
+        partitions = list_partitions(cursor)
+        attached = {name for name, _ in partitions}
+
+        for months in range(SESSION_PARTITIONS_AHEAD + 1):
+            start = month_start(today, months)
+            name = f"user_sessions_p{start:%Y%m}"
+            if name in attached:
+                continue
+            try:
+                if not dry_run:
+                    cursor.execute(f'SELECT {SCHEMA}.create_user_sessions_partition(%s)', (start,))
+                report['created'].append(name)
+            except pg_errors.LockNotAvailable:
+                report['postponed'].append(name)
+
+        # Секция удаляется, когда все её сессии истекли больше SESSION_RETENTION_DAYS назад
+        cutoff = today - timedelta(days=SESSION_RETENTION_DAYS)
+        expired = [(name, pending) for name, pending in partitions
+                   if partition_month(name) and month_start(partition_month(name), 1) <= cutoff]
+        for name, pending in sorted(expired):
+            if dry_run:
+                report['dropped'].append(name)
+                continue
+            try:
+                # pending - отсоединение CONCURRENTLY, прерванное до появления секции по умолчанию
+                if pending:
+                    cursor.execute(f'ALTER TABLE {SCHEMA}.user_sessions DETACH PARTITION {SCHEMA}.{name} FINALIZE')
+                else:
+                    cursor.execute(f'ALTER TABLE {SCHEMA}.user_sessions DETACH PARTITION {SCHEMA}.{name}')
+                cursor.execute(f'DROP TABLE {SCHEMA}.{name}')
+                report['dropped'].append(name)
+            except pg_errors.LockNotAvailable:
+                report['postponed'].append(name)
+
+        for name in list_detached(cursor):
+            month = partition_month(name)
+            if month and month_start(month, 1) <= cutoff:
+                if not dry_run:
+                    cursor.execute(f'DROP TABLE IF EXISTS {SCHEMA}.{name}')
+                report['dropped'].append(name)
+
+        refilled = 'tokens + EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - updated_at) * rate >= burst'
+        if dry_run:
+            cursor.execute(f'SELECT count(*) FROM {SCHEMA}.login_throttle WHERE {refilled}')
+            report['throttle_keys_deleted'] = cursor.fetchone()[0]
+        else:
+            cursor.execute(f'DELETE FROM {SCHEMA}.login_throttle WHERE {refilled}')
+            report['throttle_keys_deleted'] = cursor.rowcount
+    finally:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (SWEEPER_LOCK_KEY,))
+        cursor.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Секции user_sessions: создание наперёд и удаление истёкших')
+    parser.add_argument('--dry-run', action='store_true', help='только показать, что будет сделано')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(sweep(connection, dry_run=args.dry_run))
+    finally:
+        connection.close()
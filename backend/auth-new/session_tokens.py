@@ -0,0 +1,157 @@
+"""
+Business: Подписанные токены сессий и проверка отзыва с кэшем тёплого экземпляра
+Args: SESSION_SECRET (ключ HMAC), SESSION_REVOCATION_CACHE_TTL, SESSION_REVOCATION_CACHE_SIZE из окружения
+Returns: данные сессии из токена (id и роль пользователя, срок, версия сессий) или None
+
+Модуль одинаков в auth-new, admin-users и tournaments-admin: каждая функция деплоится отдельно.
+Токен "v1.<данные>.<подпись>": HMAC-SHA256 над JSON с id пользователя, ролью, сроком,
+версией сессий пользователя и jti. Подпись и срок проверяются без БД.
+
+Строка сессии в user_sessions ищется по (jti, expires_at): срок из токена указывает
+секцию таблицы (она секционирована по месяцу expires_at).
+
+Отзыв: выход помечает строку user_sessions (session_token = jti) как отозванную, а
+смена роли, блокировка или смена пароля увеличивают users.session_version - это
+отзывает все токены пользователя. Результат такой проверки кэшируется по jti
+на SESSION_REVOCATION_CACHE_TTL секунд: отзыв доходит до других экземпляров не позже.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Tuple
+
+SESSION_TTL = timedelta(hours=24)
+SESSION_REVOCATION_CACHE_TTL = float(os.environ.get('SESSION_REVOCATION_CACHE_TTL', '30'))
+SESSION_REVOCATION_CACHE_SIZE = int(os.environ.get('SESSION_REVOCATION_CACHE_SIZE', '1024'))
+
+TOKEN_PREFIX = 'v1'
+
+# jti -> (сессия действительна, время проверки)
+_revocation_cache: 'OrderedDict[str, Tuple[bool, float]]' = OrderedDict()
+
+
+def _secret() -> bytes:
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret:
+        raise Exception('SESSION_SECRET не настроен')
+    return secret.encode('utf-8')
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_secret(), f'{TOKEN_PREFIX}.{payload}'.encode('ascii'), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def expires_at_of(exp: int) -> datetime:
+    """user_sessions.expires_at (UTC без часового пояса) для срока токена в секундах Unix"""
+    return datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None)
+
+
+def new_session() -> Tuple[str, int]:
+    """jti и срок (секунды Unix) новой сессии: известны до записи в БД"""
+    return secrets.token_urlsafe(16), int(time.time() + SESSION_TTL.total_seconds())
+
+
+def sign_token(user_id: int, role: Optional[str], session_version: int, jti: str, exp: int) -> str:
+    claims = {
+        'uid': user_id,
+        'role': role or 'player',
+        'sv': session_version or 0,
+        'exp': exp,
+        'jti': jti
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f'{TOKEN_PREFIX}.{payload}.{_sign(payload)}'
+
+
+def issue_token(user_id: int, role: Optional[str], session_version: int) -> Tuple[str, str, datetime]:
+    """Новый токен: (токен, jti для user_sessions, срок действия)"""
+    jti, exp = new_session()
+    return sign_token(user_id, role, session_version, jti, exp), jti, expires_at_of(exp)
+
+
+def _signed_claims(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Данные токена с верной подписью, срок не проверяется"""
+    if not token:
+        return None
+    parts = token.split('.')
+    if len(parts) != 3 or parts[0] != TOKEN_PREFIX:
+        return None
+    try:
+        if not hmac.compare_digest(parts[2], _sign(parts[1])):
+            return None
+        claims = json.loads(_b64decode(parts[1]))
+    except (ValueError, TypeError):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def verify_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Данные токена, если подпись верна и срок не истёк; без обращения к БД"""
+    claims = _signed_claims(token)
+    if claims is None or claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+
+def session_key(token: Optional[str]) -> Optional[Tuple[str, datetime]]:
+    """(jti, expires_at) токена с верной подписью (в том числе истёкшего) - для выхода"""
+    claims = _signed_claims(token)
+    if not claims or 'jti' not in claims or not isinstance(claims.get('exp'), int):
+        return None
+    return claims['jti'], expires_at_of(claims['exp'])
+
+
+def is_session_active(conn, claims: Dict[str, Any]) -> bool:
+    """
+    Проверка, что сессия не отозвана: из кэша, при промахе - одним запросом
+    к одной секции user_sessions и к users по первичному ключу
+    """
+    jti = claims['jti']
+    cached = _revocation_cache.get(jti)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < SESSION_REVOCATION_CACHE_TTL:
+        _revocation_cache.move_to_end(jti)
+        return cached[0]
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT u.session_version, u.is_active, s.revoked_at IS NULL
+            FROM t_p67413675_chess_tournament_org.user_sessions s
+            JOIN t_p67413675_chess_tournament_org.users u ON u.id = s.user_id
+            WHERE s.session_token = %s AND s.expires_at = %s AND s.user_id = %s
+        """, (jti, expires_at_of(claims['exp']), claims['uid']))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if isinstance(row, dict):
+        row = tuple(row.values())
+    active = bool(row) and row[0] == claims['sv'] and bool(row[1]) and bool(row[2])
+
+    _revocation_cache[jti] = (active, now)
+    _revocation_cache.move_to_end(jti)
+    while len(_revocation_cache) > SESSION_REVOCATION_CACHE_SIZE:
+        _revocation_cache.popitem(last=False)
+    return active
+
+
+def forget_session(jti: Optional[str]) -> None:
+    """Сбрасывает кэш проверки в этом экземпляре (после выхода)"""
+    if jti:
+        _revocation_cache.pop(jti, None)
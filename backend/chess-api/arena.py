@@ -0,0 +1,317 @@
+"""
+Business: Турнирная таблица арены: очки с бонусами за серию и берсерк, обновляемые по каждой партии
+Args: ARENA_SNAPSHOT_EVERY, ARENA_SNAPSHOT_SECONDS из окружения
+Returns: первые N участников и место конкретного игрока за O(log n)
+
+Таблица живёт в памяти тёплого экземпляра функции в индексируемом skip list по ключу
+(-очки, id игрока). Очки за серию зависят от порядка партий, поэтому все экземпляры
+применяют партии только из журнала arena_game_log (V0037) в порядке seq. finish_game
+пишет в журнал строку без номера; перед догрузкой номера раздаются уже закоммиченным
+строкам под рекомендательной блокировкой, по одному экземпляру за раз. Строка с
+меньшим seq не может появиться после строки с большим, поэтому водяной знак по seq
+ничего не пропускает, а таблица одинакова на всех экземплярах и в снимках.
+Состояние периодически сохраняется в arena_snapshots, чтобы холодный экземпляр
+не перечитывал всю историю арены.
+
+Снимок вручную: python arena.py --snapshot <tournament_id>
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+ARENA_SNAPSHOT_EVERY = int(os.environ.get('ARENA_SNAPSHOT_EVERY', '200'))
+ARENA_SNAPSHOT_SECONDS = float(os.environ.get('ARENA_SNAPSHOT_SECONDS', '60'))
+# Ключ pg_try_advisory_xact_lock раздачи номеров журналу arena_game_log
+ARENA_SEQUENCER_LOCK_KEY = 0x0A4E_5E01
+
+# Очки арены: победа 2, ничья 1; на серии (после двух побед подряд) - вдвое больше.
+# Победа в берсерке даёт +1, если берсеркнувший сделал хотя бы BERSERK_MIN_MOVES ходов
+WIN_POINTS, DRAW_POINTS = 2, 1
+STREAK_WINS = 2
+BERSERK_MIN_MOVES = 7
+
+ARENA_GAMES_SQL = """
+    SELECT l.seq, g.id, g.white_player_id, g.black_player_id, g.result, g.moves_count,
+           g.white_berserk, g.black_berserk
+    FROM arena_game_log l
+    JOIN games g ON g.id = l.game_id
+    WHERE l.tournament_id = %s AND l.seq > %s
+    ORDER BY l.seq
+"""
+
+_MAX_LEVEL = 24
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """Упорядоченное множество ключей с вставкой, удалением, местом ключа и срезом за O(log n)"""
+
+    def __init__(self):
+        self.head = _Node(None, _MAX_LEVEL)
+        self.level = 1
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _path(self, key) -> Tuple[List[_Node], List[int]]:
+        """Последний узел с ключом меньше key на каждом уровне и его позиция"""
+        update = [self.head] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node, position = self.head, 0
+        for level in range(self.level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def insert(self, key) -> None:
+        update, positions = self._path(key)
+        level = 1
+        while level < _MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        if level > self.level:
+            for i in range(self.level, level):
+                update[i] = self.head
+                positions[i] = 0
+                self.head.width[i] = self.size + 1
+            self.level = level
+
+        node = _Node(key, level)
+        position = positions[0] + 1
+        for i in range(level):
+            prev = update[i]
+            node.next[i] = prev.next[i]
+            prev.next[i] = node
+            # Ширина ребра - сколько элементов оно перепрыгивает
+            node.width[i] = prev.width[i] - (position - positions[i]) + 1
+            prev.width[i] = position - positions[i]
+        for i in range(level, self.level):
+            update[i].width[i] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self.level):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int:
+        """Позиция ключа (с нуля); KeyError, если ключа нет"""
+        update, positions = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+    def slice(self, start: int, count: int) -> List[Any]:
+        """count ключей, начиная с позиции start"""
+        node, position = self.head, 0
+        for level in range(self.level - 1, -1, -1):
+            while node.next[level] is not None and position + node.width[level] <= start:
+                position += node.width[level]
+                node = node.next[level]
+        keys = []
+        node = node.next[0]
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class ArenaBoard:
+    """Таблица одной арены: состояние игроков, skip list и водяной знак обработанных партий"""
+
+    def __init__(self, tournament_id: int):
+        self.tournament_id = tournament_id
+        # id игрока -> [очки, текущая серия побед, партий, побед, берсерков]
+        self.players: Dict[int, List[int]] = {}
+        self.ranking = IndexableSkipList()
+        # seq последней учтённой партии журнала
+        self.watermark = 0
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+
+    def _key(self, player_id: int) -> Tuple[int, int]:
+        return (-self.players[player_id][0], player_id)
+
+    def _score_side(self, player_id: int, points: float, plies: int, is_white: bool, berserk: bool) -> None:
+        state = self.players.get(player_id)
+        if state is None:
+            state = self.players[player_id] = [0, 0, 0, 0, 0]
+        else:
+            self.ranking.remove(self._key(player_id))
+
+        on_streak = state[1] >= STREAK_WINS
+        if points == 1:
+            gained = WIN_POINTS * (2 if on_streak else 1)
+            own_moves = (plies + 1) // 2 if is_white else plies // 2
+            if berserk and own_moves >= BERSERK_MIN_MOVES:
+                gained += 1
+            state[1] += 1
+            state[3] += 1
+        else:
+            gained = DRAW_POINTS * (2 if on_streak else 1) if points == 0.5 else 0
+            state[1] = 0
+        state[0] += gained
+        state[2] += 1
+        state[4] += int(berserk)
+        self.ranking.insert(self._key(player_id))
+
+    def apply(self, seq: int, game_id: int, white_id: Optional[int], black_id: Optional[int], result: str,
+              plies: int, white_berserk: bool, black_berserk: bool) -> bool:
+        """Учитывает партию, следующую за водяным знаком; False, если она уже была учтена"""
+        if seq <= self.watermark:
+            return False
+        self.watermark = seq
+        if result not in ('white_wins', 'black_wins', 'draw'):
+            return False
+        white_points = {'white_wins': 1, 'black_wins': 0, 'draw': 0.5}[result]
+        if white_id is not None:
+            self._score_side(white_id, white_points, plies or 0, True, bool(white_berserk))
+        if black_id is not None:
+            self._score_side(black_id, 1 - white_points, plies or 0, False, bool(black_berserk))
+        self.unsaved += 1
+        return True
+
+    def catch_up(self, conn, cursor) -> int:
+        """Применяет партии журнала после водяного знака в порядке seq"""
+        sequence_log(conn, cursor)
+        cursor.execute(ARENA_GAMES_SQL, (self.tournament_id, self.watermark))
+        return sum(self.apply(*row) for row in cursor.fetchall())
+
+    def top(self, count: int, offset: int = 0) -> List[Dict[str, Any]]:
+        return [self._row(key[1], offset + i + 1) for i, key in enumerate(self.ranking.slice(offset, count))]
+
+    def rank_of(self, player_id: int) -> Optional[Dict[str, Any]]:
+        if player_id not in self.players:
+            return None
+        return self._row(player_id, self.ranking.rank(self._key(player_id)) + 1)
+
+    def _row(self, player_id: int, place: int) -> Dict[str, Any]:
+        score, streak, games, wins, berserks = self.players[player_id]
+        return {
+            'place': place,
+            'player_id': player_id,
+            'score': score,
+            'on_streak': streak >= STREAK_WINS,
+            'games_played': games,
+            'games_won': wins,
+            'berserks': berserks
+        }
+
+    def snapshot_due(self) -> bool:
+        return self.unsaved >= ARENA_SNAPSHOT_EVERY or (
+            self.unsaved > 0 and time.monotonic() - self.saved_at >= ARENA_SNAPSHOT_SECONDS)
+
+    def save_snapshot(self, conn) -> None:
+        """Сохраняет состояние в arena_snapshots; более старый снимок не перезаписывает более новый"""
+        state = {'players': [[player_id] + values for player_id, values in self.players.items()]}
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO arena_snapshots (tournament_id, watermark_seq, state, games_applied, updated_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (tournament_id) DO UPDATE
+            SET watermark_seq = EXCLUDED.watermark_seq, state = EXCLUDED.state,
+                games_applied = EXCLUDED.games_applied, updated_at = CURRENT_TIMESTAMP
+            WHERE arena_snapshots.watermark_seq <= EXCLUDED.watermark_seq
+        """, (self.tournament_id, self.watermark, json.dumps(state),
+              sum(values[2] for values in self.players.values()) // 2))
+        conn.commit()
+        cursor.close()
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+
+    @classmethod
+    def from_snapshot(cls, tournament_id: int, watermark: int, state: Any) -> 'ArenaBoard':
+        board = cls(tournament_id)
+        if isinstance(state, str):
+            state = json.loads(state)
+        for player_id, *values in state.get('players', []):
+            board.players[player_id] = values
+            board.ranking.insert(board._key(player_id))
+        board.watermark = watermark
+        return board
+
+
+_boards: Dict[int, ArenaBoard] = {}
+
+
+def sequence_log(conn, cursor) -> None:
+    """
+    Нумерует закоммиченные строки журнала и коммитит. Номера раздаёт один экземпляр
+    за раз; если блокировка занята, догрузка берёт то, что уже пронумеровано
+    """
+    cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', (ARENA_SEQUENCER_LOCK_KEY,))
+    if cursor.fetchone()[0]:
+        cursor.execute("""
+            UPDATE arena_game_log SET seq = nextval('arena_game_log_seq') WHERE seq IS NULL
+        """)
+    conn.commit()
+
+
+def load_board(conn, cursor, tournament_id: int) -> Optional[ArenaBoard]:
+    """
+    Таблица арены: из памяти, иначе из последнего снимка; затем догоняет партии из журнала.
+    None, если турнира нет или он не арена.
+    """
+    board = _boards.get(tournament_id)
+    if board is None:
+        cursor.execute("""
+            SELECT t.tournament_type, s.watermark_seq, s.state
+            FROM tournaments t
+            LEFT JOIN arena_snapshots s ON s.tournament_id = t.id
+            WHERE t.id = %s
+        """, (tournament_id,))
+        row = cursor.fetchone()
+        if not row or row[0] != 'arena':
+            return None
+        board = ArenaBoard.from_snapshot(tournament_id, row[1], row[2]) if row[2] else ArenaBoard(tournament_id)
+        _boards[tournament_id] = board
+
+    board.catch_up(conn, cursor)
+    if board.snapshot_due():
+        board.save_snapshot(conn)
+    return board
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != '--snapshot':
+        print('Использование: python arena.py --snapshot <tournament_id>')
+        sys.exit(1)
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        arena = load_board(connection, connection.cursor(), int(sys.argv[2]))
+        if arena is None:
+            print('Турнир не найден или не является ареной')
+            sys.exit(1)
+        arena.save_snapshot(connection)
+        print({'tournament_id': arena.tournament_id, 'players': len(arena.players),
+               'watermark_seq': arena.watermark})
+    finally:
+        connection.close()
@@ -0,0 +1,97 @@
+"""
+Business: Проверка генератора ходов (perft) и инкрементального Zobrist-ключа со скоростью
+Args: --quick - только небольшие глубины; --no-hash-check - без сверки ключей (чистая скорость)
+Returns: число узлов по эталонным позициям, время и узлы в секунду
+
+Перед perft проверяется разбор нотации (NOTATION_SUITE), в том числе рокировка нулями.
+
+Эталонные значения perft - стандартные позиции из Chess Programming Wiki.
+Запуск: python bench_perft.py [--quick] [--no-hash-check]
+"""
+
+import sys
+import time
+from typing import List, Tuple
+
+from chess_board import IllegalMoveError, Position
+
+# (название, FEN, [(глубина, узлов)])
+PERFT_SUITE: List[Tuple[str, str, List[Tuple[int, int]]]] = [
+    ('start', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [(1, 20), (2, 400), (3, 8902), (4, 197281)]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [(1, 48), (2, 2039), (3, 97862)]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [(1, 14), (2, 191), (3, 2812), (4, 43238)]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [(1, 6), (2, 264), (3, 9467)]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [(1, 44), (2, 1486), (3, 62379)]),
+]
+
+# Разбор нотации: (FEN, ход, ожидаемый SAN) - регрессии parse_move
+NOTATION_SUITE: List[Tuple[str, str, str]] = [
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', '0-0', 'O-O'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', '0-0-0', 'O-O-O'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1', '0-0-0+', 'O-O-O'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O-O', 'O-O-O'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'e1c1', 'O-O-O'),
+]
+
+
+def check_notation() -> int:
+    """Число ходов NOTATION_SUITE, разобранных не так, как ожидалось"""
+    failures = 0
+    for fen, notation, expected in NOTATION_SUITE:
+        position = Position.from_fen(fen)
+        try:
+            san = position.move_to_san(position.parse_move(notation))
+        except IllegalMoveError as e:
+            san = f'ошибка: {e}'
+        if san != expected:
+            failures += 1
+            print(f"нотация {notation!r} в {fen}: получено {san}, ожидалось {expected}  ОШИБКА")
+    return failures
+
+
+def perft(position: Position, depth: int, check_hash: bool) -> int:
+    if check_hash and position.key != position.compute_key():
+        raise AssertionError(f'Zobrist-ключ расходится в позиции {position.to_fen()}')
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1 and not check_hash:
+        return len(moves)
+    return sum(perft(position.make_move(move), depth - 1, check_hash) for move in moves)
+
+
+def main(argv: List[str]) -> int:
+    quick = '--quick' in argv
+    check_hash = '--no-hash-check' not in argv
+    failures = check_notation()
+    total_nodes = 0
+    total_seconds = 0.0
+
+    print(f"{'позиция':<12} {'глубина':>7} {'узлов':>10} {'ожидалось':>10} {'сек':>7} {'узлов/с':>9}")
+    for name, fen, expectations in PERFT_SUITE:
+        position = Position.from_fen(fen)
+        for depth, expected in expectations:
+            if quick and expected > 10000:
+                continue
+            started = time.perf_counter()
+            nodes = perft(position, depth, check_hash)
+            elapsed = time.perf_counter() - started
+            total_nodes += nodes
+            total_seconds += elapsed
+            mark = '' if nodes == expected else '  ОШИБКА'
+            failures += nodes != expected
+            print(f"{name:<12} {depth:>7} {nodes:>10} {expected:>10} {elapsed:>7.2f} "
+                  f"{nodes / elapsed if elapsed else 0:>9.0f}{mark}")
+
+    print(f"итого: {total_nodes} узлов за {total_seconds:.2f} с, {total_nodes / total_seconds:.0f} узлов/с, "
+          f"сверка Zobrist {'включена' if check_hash else 'выключена'}, ошибок: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,558 @@
+"""
+Business: Шахматная позиция на битбордах: FEN, компактная упаковка, генерация и разбор ходов
+Args: FEN-строки, нотация ходов (SAN или UCI), упакованные позиции bytea
+Returns: Position, ходы в виде int, FEN и bytes
+
+Поля a1..h8 нумеруются 0..63. Ход кодируется числом: from | to << 6 | promo << 12,
+где promo - тип фигуры превращения (0 - нет).
+"""
+
+import random
+import re
+from typing import List, Optional, Tuple
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+PIECE_CHARS = 'PNBRQK'
+FILES = 'abcdefgh'
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ = 1, 2, 4, 8
+
+# Упакованная позиция: 32 байта полубайтов фигур + флаги + en passant + счётчики
+PACKED_SIZE = 37
+
+_FULL = (1 << 64) - 1
+
+# Случайные 64-битные ключи Zobrist; зерно фиксировано, чтобы хеши в moves.position_hash
+# совпадали между экземплярами функции и запусками
+_zobrist_random = random.Random(0x5A0B215)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+
+def square_name(sq: int) -> str:
+    return FILES[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name: str) -> int:
+    return FILES.index(name[0]) + (int(name[1]) - 1) * 8
+
+
+def _build_step_table(deltas: List[Tuple[int, int]]) -> List[int]:
+    table = []
+    for sq in range(64):
+        file, rank = sq & 7, sq >> 3
+        mask = 0
+        for df, dr in deltas:
+            f, r = file + df, rank + dr
+            if 0 <= f < 8 and 0 <= r < 8:
+                mask |= 1 << (r * 8 + f)
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _build_step_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _build_step_table([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+PAWN_ATTACKS = [
+    _build_step_table([(-1, 1), (1, 1)]),
+    _build_step_table([(-1, -1), (1, -1)]),
+]
+
+# Лучи для дальнобойных фигур: первые четыре направления растут по номеру поля
+_DIRECTIONS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (1, -1), (-1, -1)]
+_POSITIVE = (True, True, True, True, False, False, False, False)
+_ROOK_DIRS = (0, 1, 4, 5)
+_BISHOP_DIRS = (2, 3, 6, 7)
+
+
+def _build_rays() -> List[List[int]]:
+    rays = []
+    for df, dr in _DIRECTIONS:
+        table = []
+        for sq in range(64):
+            f, r = (sq & 7) + df, (sq >> 3) + dr
+            mask = 0
+            while 0 <= f < 8 and 0 <= r < 8:
+                mask |= 1 << (r * 8 + f)
+                f += df
+                r += dr
+            table.append(mask)
+        rays.append(table)
+    return rays
+
+
+RAYS = _build_rays()
+
+# Маска сохранения прав на рокировку при ходе с поля или на поле
+_CASTLE_KEEP = [15] * 64
+_CASTLE_KEEP[0] &= ~CASTLE_WQ
+_CASTLE_KEEP[7] &= ~CASTLE_WK
+_CASTLE_KEEP[4] &= ~(CASTLE_WK | CASTLE_WQ)
+_CASTLE_KEEP[56] &= ~CASTLE_BQ
+_CASTLE_KEEP[63] &= ~CASTLE_BK
+_CASTLE_KEEP[60] &= ~(CASTLE_BK | CASTLE_BQ)
+
+
+def _slide(sq: int, occupied: int, directions: Tuple[int, ...]) -> int:
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if _POSITIVE[d]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return _slide(sq, occupied, _ROOK_DIRS)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _slide(sq, occupied, _BISHOP_DIRS)
+
+
+def _squares(bb: int):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def encode_move(frm: int, to: int, promo: int = 0) -> int:
+    return frm | (to << 6) | (promo << 12)
+
+
+def decode_move(move: int) -> Tuple[int, int, int]:
+    return move & 63, (move >> 6) & 63, move >> 12
+
+
+def move_to_uci(move: int) -> str:
+    frm, to, promo = decode_move(move)
+    return square_name(frm) + square_name(to) + ('nbrq'[promo - 1] if promo else '')
+
+
+class IllegalMoveError(ValueError):
+    """Ход невозможен в данной позиции или нотация не распознана"""
+
+
+class Position:
+    """Позиция: 12 битбордов фигур, зеркальный массив 64 полей и состояние партии"""
+
+    __slots__ = ('pieces', 'board', 'side', 'castling', 'ep', 'halfmove', 'fullmove', 'key')
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.board = [-1] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep = -1
+        self.halfmove = 0
+        self.fullmove = 1
+        # Zobrist-ключ: часть фигур ведут _put/_remove, часть состояния - _state_key
+        self.key = 0
+
+    def copy(self) -> 'Position':
+        other = Position.__new__(Position)
+        other.pieces = self.pieces[:]
+        other.board = self.board[:]
+        other.side = self.side
+        other.castling = self.castling
+        other.ep = self.ep
+        other.halfmove = self.halfmove
+        other.fullmove = self.fullmove
+        other.key = self.key
+        return other
+
+    # --- FEN ---
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        parts = fen.strip().split()
+        if len(parts) < 4:
+            raise ValueError(f'Некорректный FEN: {fen!r}')
+        pos = cls()
+        ranks = parts[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f'Некорректный FEN: {fen!r}')
+        for i, rank_text in enumerate(ranks):
+            rank = 7 - i
+            file = 0
+            for ch in rank_text:
+                if ch.isdigit():
+                    file += int(ch)
+                    continue
+                kind = PIECE_CHARS.find(ch.upper())
+                if kind < 0 or file > 7:
+                    raise ValueError(f'Некорректный FEN: {fen!r}')
+                pos._put((WHITE if ch.isupper() else BLACK) * 6 + kind, rank * 8 + file)
+                file += 1
+            if file != 8:
+                raise ValueError(f'Некорректный FEN: {fen!r}')
+        if parts[1] not in ('w', 'b'):
+            raise ValueError(f'Некорректный FEN: {fen!r}')
+        pos.side = WHITE if parts[1] == 'w' else BLACK
+        for ch in parts[2]:
+            if ch != '-':
+                flag = 'KQkq'.find(ch)
+                if flag < 0:
+                    raise ValueError(f'Некорректный FEN: {fen!r}')
+                pos.castling |= 1 << flag
+        pos.ep = parse_square(parts[3]) if parts[3] != '-' else -1
+        pos.halfmove = int(parts[4]) if len(parts) > 4 else 0
+        pos.fullmove = int(parts[5]) if len(parts) > 5 else 1
+        pos.key ^= pos._state_key()
+        return pos
+
+    @classmethod
+    def start(cls) -> 'Position':
+        return cls.from_fen(START_FEN)
+
+    def to_fen(self) -> str:
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                piece = self.board[rank * 8 + file]
+                if piece < 0:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                ch = PIECE_CHARS[piece % 6]
+                row += ch if piece < 6 else ch.lower()
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = ''.join(c for i, c in enumerate('KQkq') if self.castling & (1 << i)) or '-'
+        ep = square_name(self.ep) if self.ep >= 0 else '-'
+        return f"{'/'.join(rows)} {'wb'[self.side]} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    # --- Упаковка ---
+
+    def pack(self) -> bytes:
+        """64 полубайта фигур (0 - пусто, 1..6 белые PNBRQK, 9..14 чёрные) + 5 байт состояния"""
+        nibbles = [0 if p < 0 else (p % 6 + 1) | (8 if p >= 6 else 0) for p in self.board]
+        data = bytearray((nibbles[i] << 4) | nibbles[i + 1] for i in range(0, 64, 2))
+        data.append(self.side | (self.castling << 1))
+        data.append(self.ep if self.ep >= 0 else 255)
+        data.append(min(self.halfmove, 255))
+        data += min(self.fullmove, 65535).to_bytes(2, 'big')
+        return bytes(data)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'Position':
+        data = bytes(data)
+        if len(data) != PACKED_SIZE:
+            raise ValueError('Некорректная упакованная позиция')
+        pos = cls()
+        for i in range(32):
+            for sq, nibble in ((2 * i, data[i] >> 4), (2 * i + 1, data[i] & 15)):
+                if nibble:
+                    pos._put((6 if nibble & 8 else 0) + (nibble & 7) - 1, sq)
+        pos.side = data[32] & 1
+        pos.castling = (data[32] >> 1) & 15
+        pos.ep = data[33] if data[33] != 255 else -1
+        pos.halfmove = data[34]
+        pos.fullmove = int.from_bytes(data[35:37], 'big')
+        pos.key ^= pos._state_key()
+        return pos
+
+    # --- Zobrist ---
+
+    def _state_key(self) -> int:
+        """
+        Часть ключа от очереди хода, прав рокировки и en passant. Поле en passant
+        учитывается, только если взятие на проходе возможно: иначе позиции, различающиеся
+        лишь пустым полем en passant, для правила троекратного повторения одинаковы.
+        """
+        key = ZOBRIST_CASTLING[self.castling]
+        if self.side == BLACK:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.ep >= 0 and PAWN_ATTACKS[self.side ^ 1][self.ep] & self.pieces[self.side * 6 + PAWN]:
+            key ^= ZOBRIST_EP_FILE[self.ep & 7]
+        return key
+
+    def compute_key(self) -> int:
+        """Ключ с нуля по всей позиции (для проверки инкрементального key)"""
+        key = self._state_key()
+        for sq, piece in enumerate(self.board):
+            if piece >= 0:
+                key ^= ZOBRIST_PIECES[piece][sq]
+        return key
+
+    @property
+    def position_hash(self) -> int:
+        """Ключ как знаковое 64-битное число для BIGINT"""
+        return self.key - (1 << 64) if self.key >= 1 << 63 else self.key
+
+    # --- Доска ---
+
+    def _put(self, piece: int, sq: int) -> None:
+        self.pieces[piece] |= 1 << sq
+        self.board[sq] = piece
+        self.key ^= ZOBRIST_PIECES[piece][sq]
+
+    def _remove(self, sq: int) -> int:
+        piece = self.board[sq]
+        if piece >= 0:
+            self.pieces[piece] &= ~(1 << sq)
+            self.board[sq] = -1
+            self.key ^= ZOBRIST_PIECES[piece][sq]
+        return piece
+
+    def occupancy(self, color: int) -> int:
+        p = self.pieces
+        base = color * 6
+        return p[base] | p[base + 1] | p[base + 2] | p[base + 3] | p[base + 4] | p[base + 5]
+
+    def is_attacked(self, sq: int, by_color: int) -> bool:
+        p = self.pieces
+        base = by_color * 6
+        if KNIGHT_ATTACKS[sq] & p[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & p[base + KING]:
+            return True
+        if PAWN_ATTACKS[by_color ^ 1][sq] & p[base + PAWN]:
+            return True
+        occupied = self.occupancy(WHITE) | self.occupancy(BLACK)
+        queens = p[base + QUEEN]
+        if bishop_attacks(sq, occupied) & (p[base + BISHOP] | queens):
+            return True
+        if rook_attacks(sq, occupied) & (p[base + ROOK] | queens):
+            return True
+        return False
+
+    def king_square(self, color: int) -> int:
+        king = self.pieces[color * 6 + KING]
+        return king.bit_length() - 1 if king else -1
+
+    def in_check(self) -> bool:
+        king = self.king_square(self.side)
+        return king >= 0 and self.is_attacked(king, self.side ^ 1)
+
+    # --- Генерация ходов ---
+
+    def pseudo_legal_moves(self) -> List[int]:
+        moves: List[int] = []
+        us, them = self.side, self.side ^ 1
+        p = self.pieces
+        own = self.occupancy(us)
+        enemy = self.occupancy(them)
+        occupied = own | enemy
+        empty = ~occupied & _FULL
+        base = us * 6
+
+        # Пешки
+        pawns = p[base + PAWN]
+        forward = 8 if us == WHITE else -8
+        last_rank = 7 if us == WHITE else 0
+        start_rank = 1 if us == WHITE else 6
+        ep_mask = (1 << self.ep) if self.ep >= 0 else 0
+        for frm in _squares(pawns):
+            to = frm + forward
+            targets = PAWN_ATTACKS[us][frm] & (enemy | ep_mask)
+            if 0 <= to < 64 and empty >> to & 1:
+                targets |= 1 << to
+                if frm >> 3 == start_rank and empty >> (to + forward) & 1:
+                    moves.append(frm | ((to + forward) << 6))
+            for dest in _squares(targets):
+                if dest >> 3 == last_rank:
+                    for promo in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(frm | (dest << 6) | (promo << 12))
+                else:
+                    moves.append(frm | (dest << 6))
+
+        # Кони и король
+        not_own = ~own & _FULL
+        for frm in _squares(p[base + KNIGHT]):
+            for dest in _squares(KNIGHT_ATTACKS[frm] & not_own):
+                moves.append(frm | (dest << 6))
+        king = self.king_square(us)
+        if king >= 0:
+            for dest in _squares(KING_ATTACKS[king] & not_own):
+                moves.append(king | (dest << 6))
+
+        # Дальнобойные фигуры
+        queens = p[base + QUEEN]
+        for frm in _squares(p[base + BISHOP] | queens):
+            for dest in _squares(bishop_attacks(frm, occupied) & not_own):
+                moves.append(frm | (dest << 6))
+        for frm in _squares(p[base + ROOK] | queens):
+            for dest in _squares(rook_attacks(frm, occupied) & not_own):
+                moves.append(frm | (dest << 6))
+
+        # Рокировки: поля между королём и ладьёй пусты, король не проходит через битые поля
+        if king >= 0 and self.castling:
+            if us == WHITE:
+                rights = ((CASTLE_WK, 4, 7, 0x60, (4, 5, 6)), (CASTLE_WQ, 4, 0, 0x0E, (4, 3, 2)))
+            else:
+                rights = ((CASTLE_BK, 60, 63, 0x60 << 56, (60, 61, 62)), (CASTLE_BQ, 60, 56, 0x0E << 56, (60, 59, 58)))
+            for flag, king_from, rook_from, between, path in rights:
+                if (self.castling & flag and king == king_from
+                        and p[base + ROOK] >> rook_from & 1 and not occupied & between
+                        and not any(self.is_attacked(sq, them) for sq in path)):
+                    moves.append(king_from | (path[2] << 6))
+        return moves
+
+    def legal_moves(self) -> List[int]:
+        return [move for move in self.pseudo_legal_moves() if self.is_legal(move)]
+
+    def is_legal(self, move: int) -> bool:
+        """Псевдолегальный ход не оставляет своего короля под шахом"""
+        us = self.side
+        child = self.make_move(move)
+        king = child.king_square(us)
+        return king < 0 or not child.is_attacked(king, us ^ 1)
+
+    def make_move(self, move: int) -> 'Position':
+        """Возвращает новую позицию после хода (легальность не проверяется)"""
+        frm, to, promo = move & 63, (move >> 6) & 63, move >> 12
+        pos = self.copy()
+        pos.key ^= self._state_key()
+        us = self.side
+        piece = pos._remove(frm)
+        if piece < 0:
+            raise IllegalMoveError(f'На поле {square_name(frm)} нет фигуры')
+        captured = pos._remove(to)
+        kind = piece % 6
+
+        if kind == PAWN and to == self.ep:
+            pos._remove(to - 8 if us == WHITE else to + 8)
+            captured = us ^ 1
+        pos._put(us * 6 + promo if promo else piece, to)
+
+        if kind == KING and abs(to - frm) == 2:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            pos._put(pos._remove(rook_from), rook_to)
+
+        pos.castling &= _CASTLE_KEEP[frm] & _CASTLE_KEEP[to]
+        pos.ep = (frm + to) // 2 if kind == PAWN and abs(to - frm) == 16 else -1
+        pos.halfmove = 0 if kind == PAWN or captured >= 0 else self.halfmove + 1
+        if us == BLACK:
+            pos.fullmove += 1
+        pos.side = us ^ 1
+        pos.key ^= pos._state_key()
+        return pos
+
+    # --- Нотация ---
+
+    def parse_move(self, notation: str) -> int:
+        """Находит легальный ход по SAN ("Nf3", "exd5", "O-O", "e8=Q+") или UCI ("g1f3")"""
+        text = notation.strip().rstrip('+#!?')
+        if _ZERO_CASTLE_RE.match(text):
+            # Рокировка нулями: "0-0" и "0-0-0" целиком, а не подстрокой
+            text = text.replace('0', 'O')
+        # Легальность проверяется только у ходов, подходящих под нотацию
+        legal = self.pseudo_legal_moves()
+
+        if _UCI_RE.match(text):
+            frm, to = parse_square(text[0:2]), parse_square(text[2:4])
+            promo = 'nbrq'.index(text[4]) + 1 if len(text) == 5 else 0
+            for move in legal:
+                m_frm, m_to, m_promo = decode_move(move)
+                if (m_frm == frm and m_to == to and (m_promo == promo or (not promo and m_promo == QUEEN))
+                        and self.is_legal(move)):
+                    return move
+            raise IllegalMoveError(f'Недопустимый ход {notation!r}')
+
+        if text in ('O-O', 'O-O-O'):
+            king = self.king_square(self.side)
+            target = king + (2 if text == 'O-O' else -2)
+            for move in legal:
+                if (move & 63 == king and (move >> 6) & 63 == target and self.board[king] % 6 == KING
+                        and self.is_legal(move)):
+                    return move
+            raise IllegalMoveError(f'Недопустимый ход {notation!r}')
+
+        match = _SAN_RE.match(text)
+        if not match:
+            raise IllegalMoveError(f'Нотация не распознана: {notation!r}')
+        piece_char, from_file, from_rank, target, promo_char = match.groups()
+        kind = PIECE_CHARS.index(piece_char) if piece_char else PAWN
+        to = parse_square(target)
+        promo = PIECE_CHARS.index(promo_char.lstrip('=')) if promo_char else 0
+
+        candidates = []
+        for move in legal:
+            m_frm, m_to, m_promo = decode_move(move)
+            if m_to != to or self.board[m_frm] % 6 != kind:
+                continue
+            if from_file and FILES[m_frm & 7] != from_file:
+                continue
+            if from_rank and str((m_frm >> 3) + 1) != from_rank:
+                continue
+            if m_promo != (promo or (QUEEN if m_promo else 0)):
+                continue
+            if self.is_legal(move):
+                candidates.append(move)
+        if len(candidates) != 1:
+            reason = 'Неоднозначный' if candidates else 'Недопустимый'
+            raise IllegalMoveError(f'{reason} ход {notation!r}')
+        return candidates[0]
+
+    def move_to_san(self, move: int) -> str:
+        frm, to, promo = decode_move(move)
+        kind = self.board[frm] % 6
+        if kind == KING and abs(to - frm) == 2:
+            san = 'O-O' if to > frm else 'O-O-O'
+        else:
+            is_capture = self.board[to] >= 0 or (kind == PAWN and to == self.ep)
+            if kind == PAWN:
+                san = (FILES[frm & 7] + 'x' if is_capture else '') + square_name(to)
+                if promo:
+                    san += '=' + PIECE_CHARS[promo]
+            else:
+                others = [m & 63 for m in self.legal_moves()
+                          if (m >> 6) & 63 == to and m & 63 != frm and self.board[m & 63] % 6 == kind]
+                hint = ''
+                if others:
+                    if all(sq & 7 != frm & 7 for sq in others):
+                        hint = FILES[frm & 7]
+                    elif all(sq >> 3 != frm >> 3 for sq in others):
+                        hint = str((frm >> 3) + 1)
+                    else:
+                        hint = square_name(frm)
+                san = PIECE_CHARS[kind] + hint + ('x' if is_capture else '') + square_name(to)
+        child = self.make_move(move)
+        if child.in_check():
+            san += '#' if not child.legal_moves() else '+'
+        return san
+
+
+_UCI_RE = re.compile(r'^[a-h][1-8][a-h][1-8][nbrq]?$')
+_ZERO_CASTLE_RE = re.compile(r'^0-0(-0)?$')
+_SAN_RE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(=?[NBRQ])?$')
+
+
+def pack_fen(fen: str) -> bytes:
+    return Position.from_fen(fen).pack()
+
+
+def unpack_fen(data: bytes) -> str:
+    return Position.unpack(data).to_fen()
+
+
+def replay(notations: List[str], start_fen: str = START_FEN) -> List[Optional[str]]:
+    """FEN после каждого хода; после первого нераспознанного хода - None"""
+    pos: Optional[Position] = Position.from_fen(start_fen)
+    fens: List[Optional[str]] = []
+    for notation in notations:
+        if pos is not None:
+            try:
+                pos = pos.make_move(pos.parse_move(notation))
+            except (IllegalMoveError, ValueError):
+                pos = None
+        fens.append(pos.to_fen() if pos is not None else None)
+    return fens
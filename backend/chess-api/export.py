@@ -0,0 +1,204 @@
+"""
+Business: Выгрузка всех партий игрока или турнира в PGN или NDJSON
+Args: id игрока или турнира, формат, позиция продолжения (started_at, id)
+Returns: текст выгрузки порциями
+
+Партии читаются серверным (именованным) курсором порциями по EXPORT_FETCH_SIZE строк;
+ходы партии приходят одной строкой из string_agg. Каждая строка сразу форматируется
+и отбрасывается, поэтому память не растёт с числом партий.
+
+Полная выгрузка в файл: python export.py --player 42 [--format ndjson] [--output games.pgn]
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '500'))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+PGN_RESULTS = {'white_wins': '1-0', 'black_wins': '0-1', 'draw': '1/2-1/2', 'in_progress': '*'}
+CONTENT_TYPES = {'pgn': 'application/x-chess-pgn; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+
+# Колонки строки выгрузки
+ID, STARTED_AT, FINISHED_AT, RESULT, TIME_CONTROL, ROUND, BOARD, WHITE, BLACK, EVENT, MOVES = range(11)
+
+
+def iter_export_rows(conn, player_id: Optional[int] = None, tournament_id: Optional[int] = None,
+                     after: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None,
+                     fetch_size: int = EXPORT_FETCH_SIZE) -> Iterator[Tuple]:
+    """Партии в порядке (started_at, id) через именованный курсор"""
+    conditions: List[str] = []
+    params: List[Any] = []
+    source = 'games g'
+    if player_id is not None:
+        # Две ветки по индексам белых и чёрных вместо OR
+        source = """(
+            SELECT g.* FROM games g WHERE g.white_player_id = %s
+            UNION ALL
+            SELECT g.* FROM games g WHERE g.black_player_id = %s AND g.white_player_id IS DISTINCT FROM %s
+        ) g"""
+        params.extend([player_id, player_id, player_id])
+    if tournament_id is not None:
+        conditions.append('g.tournament_id = %s')
+        params.append(tournament_id)
+    if after:
+        conditions.append('(g.started_at, g.id) > (%s, %s)')
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    limit_sql = ''
+    if limit is not None:
+        limit_sql = 'LIMIT %s'
+        params.append(limit)
+
+    cursor = conn.cursor(name='games_export')
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(f"""
+            SELECT g.id, g.started_at, g.finished_at, g.result, g.time_control, g.round, g.board,
+                   pw.name, pb.name, t.name,
+                   (SELECT string_agg(m.move_notation, ' ' ORDER BY m.move_number)
+                    FROM moves m WHERE m.game_id = g.id)
+            FROM {source}
+            LEFT JOIN players pw ON g.white_player_id = pw.id
+            LEFT JOIN players pb ON g.black_player_id = pb.id
+            LEFT JOIN tournaments t ON g.tournament_id = t.id
+            {where}
+            ORDER BY g.started_at, g.id
+            {limit_sql}
+        """, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
+def _pgn_tag(name: str, value: Any) -> str:
+    text = '?' if value is None or value == '' else str(value)
+    text = text.replace('\\', '\\\\').replace('"', '\\"')
+    return f'[{name} "{text}"]'
+
+
+def _pgn_time_control(value: Optional[str]) -> str:
+    """"10+5" (минуты+секунды) -> "600+5" (секунды), как принято в PGN"""
+    if not value:
+        return '-'
+    base, _, increment = value.partition('+')
+    try:
+        return f"{int(float(base) * 60)}+{increment or 0}"
+    except ValueError:
+        return '-'
+
+
+def format_pgn(row: Tuple) -> str:
+    result = PGN_RESULTS.get(row[RESULT], '*')
+    tags = [
+        _pgn_tag('Event', row[EVENT] or 'Партия'),
+        _pgn_tag('Site', None),
+        _pgn_tag('Date', row[STARTED_AT].strftime('%Y.%m.%d') if row[STARTED_AT] else '????.??.??'),
+        _pgn_tag('Round', row[ROUND] if row[ROUND] is not None else '-'),
+        _pgn_tag('White', row[WHITE]),
+        _pgn_tag('Black', row[BLACK]),
+        _pgn_tag('Result', result),
+        _pgn_tag('TimeControl', _pgn_time_control(row[TIME_CONTROL])),
+        _pgn_tag('GameId', row[ID])
+    ]
+    if row[BOARD] is not None:
+        tags.append(_pgn_tag('Board', row[BOARD]))
+
+    # Строки ходов не длиннее 80 символов
+    lines, line = [], ''
+    tokens = (row[MOVES] or '').split()
+    for ply, move in enumerate(tokens):
+        token = f"{ply // 2 + 1}. {move}" if ply % 2 == 0 else move
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(f"{line} {result}" if line else result)
+    return '\n'.join(tags) + '\n\n' + '\n'.join(lines) + '\n\n'
+
+
+def format_ndjson(row: Tuple) -> str:
+    return json.dumps({
+        'id': row[ID],
+        'event': row[EVENT],
+        'round': row[ROUND],
+        'board': row[BOARD],
+        'white_player': row[WHITE],
+        'black_player': row[BLACK],
+        'result': row[RESULT],
+        'time_control': row[TIME_CONTROL],
+        'started_at': row[STARTED_AT].isoformat() if row[STARTED_AT] else None,
+        'finished_at': row[FINISHED_AT].isoformat() if row[FINISHED_AT] else None,
+        'moves': (row[MOVES] or '').split()
+    }, ensure_ascii=False) + '\n'
+
+
+FORMATTERS: Dict[str, Callable[[Tuple], str]] = {'pgn': format_pgn, 'ndjson': format_ndjson}
+
+
+def export_chunks(rows: Iterable[Tuple], fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """Текст выгрузки порциями примерно по chunk_size символов"""
+    formatter = FORMATTERS[fmt]
+    buffer: List[str] = []
+    size = 0
+    for row in rows:
+        text = formatter(row)
+        buffer.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_page(conn, fmt: str, player_id: Optional[int], tournament_id: Optional[int],
+                after: Optional[Tuple[datetime, int]], limit: int) -> Tuple[str, Optional[Tuple[datetime, int]], int]:
+    """
+    Одна страница выгрузки для HTTP, где ответ отдаётся целиком:
+    (текст, позиция для следующей страницы или None, число партий)
+    """
+    rows = iter_export_rows(conn, player_id, tournament_id, after, limit + 1)
+    page = {'count': 0, 'last': None, 'more': False}
+
+    def page_rows():
+        for row in rows:
+            if page['count'] == limit:
+                page['more'] = True
+                return
+            page['count'] += 1
+            page['last'] = (row[STARTED_AT], row[ID])
+            yield row
+
+    try:
+        body = ''.join(export_chunks(page_rows(), fmt))
+    finally:
+        rows.close()
+    return body, page['last'] if page['more'] else None, page['count']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка партий в PGN или NDJSON')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--player', type=int)
+    target.add_argument('--tournament', type=int)
+    parser.add_argument('--format', choices=sorted(FORMATTERS), default='pgn')
+    parser.add_argument('--output', help='файл (по умолчанию stdout)')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in export_chunks(iter_export_rows(connection, args.player, args.tournament), args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        connection.close()
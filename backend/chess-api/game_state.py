@@ -0,0 +1,143 @@
+"""
+Business: Текущая позиция партии для проверки ходов: кэш по партиям и восстановление из moves
+Args: POSITION_CACHE_SIZE (число партий в кэше тёплого экземпляра) из окружения
+Returns: GameState - позиция после последнего хода и счётчики повторений
+
+Для проверки очередного хода нужна позиция после предыдущего. Она берётся из LRU-кэша,
+а при промахе - из упакованной позиции последнего хода и position_hash ходов с момента
+последнего необратимого хода (взятие или ход пешкой, не больше сотни строк).
+Партия целиком проигрывается, только если у старых ходов нет сохранённых позиций.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from chess_board import Position
+
+POSITION_CACHE_SIZE = int(os.environ.get('POSITION_CACHE_SIZE', '256'))
+
+# Ничья по требованию: троекратное повторение и правило 50 ходов (100 полуходов)
+REPETITION_DRAW = 3
+FIFTY_MOVE_PLIES = 100
+
+
+class GameState:
+    """Позиция после move_number полуходов и число повторений позиций с последнего необратимого хода"""
+
+    __slots__ = ('move_number', 'position', 'repetitions')
+
+    def __init__(self, move_number: int, position: Position, repetitions: Dict[int, int]):
+        self.move_number = move_number
+        self.position = position
+        self.repetitions = repetitions
+
+    def play(self, notation: str) -> Tuple['GameState', int]:
+        """Следующее состояние и код хода; IllegalMoveError, если ход невозможен"""
+        move = self.position.parse_move(notation)
+        position = self.position.make_move(move)
+        # Необратимый ход обнуляет halfmove: прежние позиции повториться уже не могут
+        repetitions = {} if position.halfmove == 0 else dict(self.repetitions)
+        repetitions[position.key] = repetitions.get(position.key, 0) + 1
+        return GameState(self.move_number + 1, position, repetitions), move
+
+    def status(self) -> Dict[str, Any]:
+        position = self.position
+        in_check = position.in_check()
+        has_moves = bool(position.legal_moves())
+        return {
+            'position_hash': position.position_hash,
+            'fen': position.to_fen(),
+            'check': in_check,
+            'checkmate': in_check and not has_moves,
+            'stalemate': not in_check and not has_moves,
+            'threefold_repetition': self.repetitions.get(position.key, 0) >= REPETITION_DRAW,
+            'fifty_move_rule': position.halfmove >= FIFTY_MOVE_PLIES
+        }
+
+
+_cache: 'OrderedDict[int, GameState]' = OrderedDict()
+
+
+def remember(game_id: int, state: GameState) -> None:
+    """Кладёт состояние в кэш; вызывать только после коммита ходов"""
+    _cache[game_id] = state
+    _cache.move_to_end(game_id)
+    while len(_cache) > POSITION_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def forget(game_id: int) -> None:
+    _cache.pop(game_id, None)
+
+
+def initial_state() -> GameState:
+    position = Position.start()
+    return GameState(0, position, {position.key: 1})
+
+
+def get_state(cursor, game_id: int, move_number: int) -> Optional[GameState]:
+    """Состояние после move_number полуходов: из кэша или из moves; None, если ходов в базе не хватает"""
+    cached = _cache.get(game_id)
+    if cached is not None and cached.move_number == move_number:
+        _cache.move_to_end(game_id)
+        return cached
+    state = load_state(cursor, game_id, move_number)
+    if state is not None:
+        remember(game_id, state)
+    return state
+
+
+def load_state(cursor, game_id: int, move_number: int) -> Optional[GameState]:
+    if move_number == 0:
+        return initial_state()
+
+    cursor.execute("""
+        SELECT move_number, board_state_packed, position_hash
+        FROM moves
+        WHERE game_id = %s AND move_number <= %s
+        ORDER BY move_number DESC
+        LIMIT %s
+    """, (game_id, move_number, FIFTY_MOVE_PLIES + 1))
+    rows = cursor.fetchall()
+    if not rows or rows[0][0] != move_number:
+        return None
+
+    if rows[0][1] is not None:
+        position = Position.unpack(bytes(rows[0][1]))
+        # Позиции с последнего необратимого хода: сама позиция и halfmove предыдущих
+        window = rows[:position.halfmove + 1]
+        reaches_start = move_number - position.halfmove <= 0
+        complete = (len(window) == position.halfmove + 1 or reaches_start) and all(
+            row[2] is not None or row[1] is not None for row in window)
+        if complete:
+            repetitions: Dict[int, int] = {}
+            for number, packed, stored_hash in window:
+                key = _unsigned(stored_hash) if stored_hash is not None else Position.unpack(bytes(packed)).key
+                repetitions[key] = repetitions.get(key, 0) + 1
+            if reaches_start:
+                start_key = Position.start().key
+                repetitions[start_key] = repetitions.get(start_key, 0) + 1
+            return GameState(move_number, position, repetitions)
+
+    return replay_state(cursor, game_id, move_number)
+
+
+def replay_state(cursor, game_id: int, move_number: int) -> Optional[GameState]:
+    """Проигрывает нотацию партии с начала: для ходов, сохранённых без позиций"""
+    cursor.execute("""
+        SELECT move_notation FROM moves
+        WHERE game_id = %s AND move_number <= %s
+        ORDER BY move_number
+    """, (game_id, move_number))
+    notations: List[str] = [row[0] for row in cursor.fetchall()]
+    if len(notations) != move_number:
+        return None
+    state = initial_state()
+    for notation in notations:
+        state, _ = state.play(notation)
+    return state
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
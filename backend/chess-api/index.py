@@ -1,9 +1,21 @@
 import json
 import os
-import psycopg2
-from typing import Dict, Any, List, Optional
+import base64
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+from psycopg2.extras import execute_values
+
+from arena import load_board
+from chess_board import START_FEN, WHITE, IllegalMoveError, Position, replay
+from db_pool import acquire_connection, release_connection
+from export import CONTENT_TYPES, export_page
+from game_state import forget, get_state, remember
+from opening_explorer import drain_pending as drain_openings, lookup as lookup_opening
+from position_search import decode_position_cursor, search_games
+from rating import INITIAL_RATING, WHITE_SCORES, k_factor_sql
+from standings import get_standings
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     API для управления шахматными партиями и игроками
@@ -28,8 +40,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        # Подключение к БД
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        # Подключение из пула, живущего между тёплыми вызовами
+        conn = acquire_connection()
         cursor = conn.cursor()
         
         path = event.get('path', '/')
@@ -87,16 +99,67 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             elif action == 'save_move':
-                # Сохранение хода
+                # Сохранение хода с проверкой по позиции после предыдущего хода
                 game_id = body_data.get('game_id')
                 move_number = body_data.get('move_number')
                 player_color = body_data.get('player_color')
                 move_notation = body_data.get('move_notation')
-                board_state = body_data.get('board_state')
+                if not isinstance(move_number, int) or move_number < 1 or not move_notation:
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'Нужны move_number (положительное число) и move_notation'})
+                    }
+                
+                # Блокировка партии упорядочивает параллельные записи ходов
+                cursor.execute("SELECT moves_count FROM games WHERE id = %s FOR UPDATE", (game_id,))
+                game = cursor.fetchone()
+                if not game:
+                    conn.rollback()
+                    return {
+                        'statusCode': 404,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'Партия не найдена'})
+                    }
+                stored = game[0] or 0
+                if move_number != stored + 1:
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': f'Ожидается ход {stored + 1}, получен {move_number}'})
+                    }
+                
+                try:
+                    previous = get_state(cursor, game_id, stored)
+                    if previous is None:
+                        raise IllegalMoveError(f'В партии не хватает ходов до {stored}')
+                except IllegalMoveError as e:
+                    conn.rollback()
+                    forget(game_id)
+                    return {
+                        'statusCode': 409,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': f'История партии не проверяется: {e}'})
+                    }
+                
+                side = 'white' if previous.position.side == WHITE else 'black'
+                try:
+                    if player_color and player_color != side:
+                        raise IllegalMoveError(f'Сейчас ход {side}')
+                    state, move = previous.play(move_notation)
+                except IllegalMoveError as e:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': str(e)})
+                    }
                 
                 cursor.execute(
-                    "INSERT INTO moves (game_id, move_number, player_color, move_notation, board_state) VALUES (%s, %s, %s, %s, %s)",
-                    (game_id, move_number, player_color, move_notation, board_state)
+                    "INSERT INTO moves (game_id, move_number, player_color, move_notation, board_state, board_state_packed, position_hash) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (game_id, move_number, side, move_notation, None, stored_position(state.position),
+                     state.position.position_hash)
                 )
                 
                 # Обновляем количество ходов в партии
@@ -105,50 +168,241 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     (move_number, game_id)
                 )
                 conn.commit()
+                remember(game_id, state)
                 
                 return {
                     'statusCode': 200,
                     'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({'success': True})
+                    'body': json.dumps({'success': True, 'san': previous.position.move_to_san(move), **state.status()})
                 }
             
-            elif action == 'finish_game':
-                # Завершение партии
-                game_id = body_data.get('game_id')
-                result = body_data.get('result')  # 'white_wins', 'black_wins', 'draw'
+            elif action == 'save_moves':
+                # Пакетное сохранение ходов одной или нескольких партий одной транзакцией
+                moves_by_game, error = normalize_move_batch(body_data.get('moves'))
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': error})
+                    }
                 
+                # Блокируем партии в порядке id, чтобы параллельные пакеты не дублировали ходы
                 cursor.execute(
-                    "UPDATE games SET result = %s, finished_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    (result, game_id)
+                    "SELECT id, moves_count FROM games WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+                    (sorted(moves_by_game.keys()),)
                 )
+                stored_counts = {row[0]: row[1] or 0 for row in cursor.fetchall()}
                 
-                # Обновляем статистику игроков
-                cursor.execute("""
-                    UPDATE players 
-                    SET games_played = games_played + 1,
-                        games_won = games_won + CASE WHEN (
-                            (id = (SELECT white_player_id FROM games WHERE id = %s) AND %s = 'white_wins') OR
-                            (id = (SELECT black_player_id FROM games WHERE id = %s) AND %s = 'black_wins')
-                        ) THEN 1 ELSE 0 END,
-                        games_lost = games_lost + CASE WHEN (
-                            (id = (SELECT white_player_id FROM games WHERE id = %s) AND %s = 'black_wins') OR
-                            (id = (SELECT black_player_id FROM games WHERE id = %s) AND %s = 'white_wins')
-                        ) THEN 1 ELSE 0 END,
-                        games_drawn = games_drawn + CASE WHEN %s = 'draw' THEN 1 ELSE 0 END,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id IN (
-                        SELECT white_player_id FROM games WHERE id = %s
-                        UNION
-                        SELECT black_player_id FROM games WHERE id = %s
+                missing = sorted(set(moves_by_game) - set(stored_counts))
+                if missing:
+                    conn.rollback()
+                    return {
+                        'statusCode': 404,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': f'Партии не найдены: {missing}'})
+                    }
+                
+                # Уже сохранённые номера ходов сверяем с записанными одним запросом
+                resent = [(game_id, m['move_number']) for game_id, game_moves in moves_by_game.items()
+                          for m in game_moves if m['move_number'] <= stored_counts[game_id]]
+                stored_moves = {}
+                if resent:
+                    cursor.execute("""
+                        SELECT m.game_id, m.move_number, m.player_color, m.move_notation
+                        FROM moves m
+                        JOIN unnest(%s::int[], %s::int[]) AS r(game_id, move_number)
+                          ON m.game_id = r.game_id AND m.move_number = r.move_number
+                    """, ([game_id for game_id, _ in resent], [number for _, number in resent]))
+                    stored_moves = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+                
+                move_rows = []
+                count_rows = []
+                games_summary = []
+                new_states = {}
+                for game_id, game_moves in moves_by_game.items():
+                    stored = stored_counts[game_id]
+                    # Совпадающий с записанным ход - повтор пакета, он пропускается; другой ход - конфликт
+                    conflicts = [m['move_number'] for m in game_moves if m['move_number'] <= stored
+                                 and stored_moves.get((game_id, m['move_number'])) != (m['player_color'], m['move_notation'])]
+                    if conflicts:
+                        conn.rollback()
+                        return {
+                            'statusCode': 409,
+                            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                            'body': json.dumps({
+                                'success': False,
+                                'error': f"Партия {game_id}: ходы {', '.join(map(str, conflicts))} уже сохранены с другой нотацией"
+                            })
+                        }
+                    fresh = [m for m in game_moves if m['move_number'] > stored]
+                    if fresh and fresh[0]['move_number'] != stored + 1:
+                        conn.rollback()
+                        return {
+                            'statusCode': 409,
+                            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                            'body': json.dumps({
+                                'success': False,
+                                'error': f'Партия {game_id}: ожидается ход {stored + 1}, получен {fresh[0]["move_number"]}'
+                            })
+                        }
+                    
+                    state = None
+                    try:
+                        state = get_state(cursor, game_id, stored) if fresh else None
+                        if fresh and state is None:
+                            raise IllegalMoveError(f'в партии не хватает ходов до {stored}')
+                        for m in fresh:
+                            side = 'white' if state.position.side == WHITE else 'black'
+                            if m['player_color'] != side:
+                                raise IllegalMoveError(f'ход {m["move_number"]}: сейчас ход {side}')
+                            try:
+                                state, _ = state.play(m['move_notation'])
+                            except IllegalMoveError as e:
+                                raise IllegalMoveError(f'ход {m["move_number"]}: {e}')
+                            move_rows.append((game_id, m['move_number'], m['player_color'], m['move_notation'],
+                                              None, stored_position(state.position), state.position.position_hash))
+                    except IllegalMoveError as e:
+                        conn.rollback()
+                        return {
+                            'statusCode': 400,
+                            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                            'body': json.dumps({'success': False, 'error': f'Партия {game_id}: {e}'})
+                        }
+                    if state is not None:
+                        new_states[game_id] = state
+                    if fresh:
+                        count_rows.append((game_id, fresh[-1]['move_number']))
+                    games_summary.append({
+                        'game_id': game_id,
+                        'inserted': len(fresh),
+                        'skipped': len(game_moves) - len(fresh),
+                        'moves_count': fresh[-1]['move_number'] if fresh else stored
+                    })
+                
+                if move_rows:
+                    execute_values(
+                        cursor,
+                        "INSERT INTO moves (game_id, move_number, player_color, move_notation, board_state, board_state_packed, position_hash) VALUES %s",
+                        move_rows,
+                        page_size=len(move_rows)
+                    )
+                    execute_values(
+                        cursor,
+                        """
+                        UPDATE games SET moves_count = v.moves_count
+                        FROM (VALUES %s) AS v(id, moves_count)
+                        WHERE games.id = v.id
+                        """,
+                        count_rows,
+                        page_size=len(count_rows)
                     )
-                """, (game_id, result, game_id, result, game_id, result, game_id, result, result, game_id, game_id))
+                conn.commit()
+                for game_id, state in new_states.items():
+                    remember(game_id, state)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({
+                        'success': True,
+                        'inserted': len(move_rows),
+                        'games': games_summary
+                    })
+                }
+            
+            elif action == 'berserk':
+                # Берсерк в арене: только до первого хода своей стороны
+                game_id = body_data.get('game_id')
+                color = body_data.get('color')
+                if color not in ('white', 'black'):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'color должен быть white или black'})
+                    }
                 
+                cursor.execute(f"""
+                    UPDATE games g
+                    SET {color}_berserk = TRUE
+                    FROM tournaments t
+                    WHERE g.id = %s AND t.id = g.tournament_id AND t.tournament_type = 'arena'
+                      AND g.result = 'in_progress' AND g.moves_count < %s
+                    RETURNING g.id
+                """, (game_id, 1 if color == 'white' else 2))
+                updated = cursor.fetchone()
                 conn.commit()
                 
+                if not updated:
+                    return {
+                        'statusCode': 409,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'Берсерк возможен только в партии арены до первого хода'})
+                    }
+                
                 return {
                     'statusCode': 200,
                     'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({'success': True})
+                    'body': json.dumps({'success': True, 'game_id': updated[0], 'color': color})
+                }
+            
+            elif action == 'finish_game':
+                # Завершение партии: один оператор переводит партию из in_progress
+                # и обновляет счётчики и рейтинги обоих игроков
+                game_id = body_data.get('game_id')
+                result = body_data.get('result')
+                if result not in WHITE_SCORES:
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'result должен быть white_wins, black_wins или draw'})
+                    }
+                
+                cursor.execute(FINISH_GAME_SQL, {
+                    'game_id': game_id,
+                    'result': result,
+                    'white_score': WHITE_SCORES[result],
+                    'initial_rating': INITIAL_RATING
+                })
+                rows = cursor.fetchall()
+                
+                if not rows:
+                    conn.rollback()
+                    cursor.execute("SELECT result FROM games WHERE id = %s", (game_id,))
+                    existing = cursor.fetchone()
+                    if not existing:
+                        return {
+                            'statusCode': 404,
+                            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                            'body': json.dumps({'success': False, 'error': 'Партия не найдена'})
+                        }
+                    return {
+                        'statusCode': 409,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': f'Партия уже завершена: {existing[0]}'})
+                    }
+                conn.commit()
+                # Очередь дебютного справочника разбирается уже после коммита, без блокировок партии и игроков
+                drain_explorer_queue(conn)
+                
+                players = {}
+                for row in rows:
+                    if row[0] is None:
+                        continue
+                    players[row[0]] = {
+                        'id': row[1],
+                        'name': row[2],
+                        'rating': row[3],
+                        'rating_change': row[3] - row[4] if row[3] is not None and row[4] is not None else 0,
+                        'games_played': row[5],
+                        'games_won': row[6],
+                        'games_lost': row[7],
+                        'games_drawn': row[8]
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({'success': True, 'players': players})
                 }
         
         elif method == 'GET':
@@ -175,20 +429,184 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'players': players_list})
                 }
             
+            elif 'arena' in path:
+                # Таблица арены: первые N и место игрока из skip list в памяти
+                try:
+                    tournament_id = int(query_params.get('tournament_id'))
+                    top = min(max(int(query_params.get('top', ARENA_TOP_DEFAULT)), 1), ARENA_TOP_MAX)
+                    offset = max(int(query_params.get('offset', 0)), 0)
+                    player_id = int(query_params['player_id']) if query_params.get('player_id') else None
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Некорректные tournament_id, top, offset или player_id'})
+                    }
+                
+                board = load_board(conn, cursor, tournament_id)
+                if board is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Арена не найдена'})
+                    }
+                
+                leaders = board.top(top, offset)
+                player_row = board.rank_of(player_id) if player_id else None
+                ids = [row['player_id'] for row in leaders] + ([player_id] if player_row else [])
+                names = {}
+                if ids:
+                    cursor.execute("SELECT id, name FROM players WHERE id = ANY(%s)", (ids,))
+                    names = dict(cursor.fetchall())
+                for row in leaders + ([player_row] if player_row else []):
+                    row['name'] = names.get(row['player_id'])
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({
+                        'tournament_id': tournament_id,
+                        'players_total': len(board.players),
+                        'leaders': leaders,
+                        'player': player_row
+                    })
+                }
+            
+            elif 'export' in path:
+                # Выгрузка партий игрока или турнира в PGN/NDJSON страницами по (started_at, id);
+                # ответ функции отдаётся целиком, поэтому страница ограничена EXPORT_PAGE_SIZE_MAX
+                fmt = query_params.get('format', 'pgn')
+                try:
+                    limit = min(max(int(query_params.get('limit', EXPORT_PAGE_SIZE)), 1), EXPORT_PAGE_SIZE_MAX)
+                    player_id = int(query_params['player_id']) if query_params.get('player_id') else None
+                    tournament_id = int(query_params['tournament_id']) if query_params.get('tournament_id') else None
+                    after = decode_games_cursor(query_params.get('cursor'))
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Некорректные limit, player_id, tournament_id или cursor'})
+                    }
+                if fmt not in CONTENT_TYPES or (player_id is None) == (tournament_id is None):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Нужен ровно один из player_id и tournament_id, format - pgn или ndjson'})
+                    }
+                
+                body, last, count = export_page(conn, fmt, player_id, tournament_id, after, limit)
+                next_cursor = encode_games_cursor(*last) if last else ''
+                filename = f"{'player' if player_id else 'tournament'}-{player_id or tournament_id}.{fmt}"
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        **cors_headers,
+                        'Content-Type': CONTENT_TYPES[fmt],
+                        'Content-Disposition': f'attachment; filename="{filename}"',
+                        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Games-Count',
+                        'X-Next-Cursor': next_cursor,
+                        'X-Games-Count': str(count)
+                    },
+                    'body': body
+                }
+            
+            elif 'positions' in path:
+                # Партии, в которых встречалась позиция (FEN), страницами по id партии
+                try:
+                    position = Position.from_fen(query_params.get('fen') or '')
+                    limit = min(max(int(query_params.get('limit', POSITIONS_PAGE_SIZE)), 1), POSITIONS_PAGE_SIZE_MAX)
+                    before = decode_position_cursor(query_params.get('cursor'))
+                except (TypeError, ValueError, IndexError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Некорректные fen, limit или cursor'})
+                    }
+                
+                games, next_cursor = search_games(cursor, position, before, limit)
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({'games': games, 'next_cursor': next_cursor})
+                }
+            
+            elif 'explorer' in path:
+                # Дебютный справочник: ходы из позиции, заданной FEN, одним запросом по ключу
+                try:
+                    position_hash = Position.from_fen(query_params.get('fen') or START_FEN).position_hash
+                except (ValueError, IndexError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Некорректный FEN'})
+                    }
+                
+                drain_explorer_queue(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({'position_hash': str(position_hash), 'moves': lookup_opening(cursor, position_hash)})
+                }
+            
+            elif 'standings' in path:
+                # Турнирная таблица с дополнительными показателями (кэшируется по версии результатов)
+                try:
+                    tournament_id = int(query_params.get('tournament_id'))
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Не указан tournament_id'})
+                    }
+                
+                table = get_standings(cursor, tournament_id)
+                if table is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Турнир не найден'})
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({
+                        'tournament_id': tournament_id,
+                        'version': table['version'],
+                        'standings': table['standings']
+                    })
+                }
+            
             elif 'games' in path:
-                # Получение списка партий
-                limit = int(query_params.get('limit', 50))
-                cursor.execute("""
-                    SELECT g.id, g.result, g.moves_count, g.started_at, g.finished_at,
-                           pw.name as white_name, pb.name as black_name
-                    FROM games g
-                    LEFT JOIN players pw ON g.white_player_id = pw.id
-                    LEFT JOIN players pb ON g.black_player_id = pb.id
-                    ORDER BY g.started_at DESC
-                    LIMIT %s
-                """, (limit,))
+                # Получение страницы партий: keyset-пагинация по (started_at, id)
+                try:
+                    limit = min(max(int(query_params.get('limit', GAMES_PAGE_SIZE)), 1), GAMES_PAGE_SIZE_MAX)
+                    player_id = int(query_params['player_id']) if query_params.get('player_id') else None
+                    after = decode_games_cursor(query_params.get('cursor'))
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Некорректные limit, player_id или cursor'})
+                    }
+                result_filter = query_params.get('result')
+                if result_filter and result_filter not in GAME_RESULTS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': f'result должен быть одним из: {", ".join(GAME_RESULTS)}'})
+                    }
+                
+                query, params = build_games_page_query(player_id, result_filter, after, limit + 1)
+                cursor.execute(query, params)
                 games = cursor.fetchall()
                 
+                next_cursor = None
+                if len(games) > limit:
+                    games = games[:limit]
+                    next_cursor = encode_games_cursor(games[-1][3], games[-1][0])
+                
                 games_list = []
                 for g in games:
                     games_list.append({
@@ -204,7 +622,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 200,
                     'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({'games': games_list})
+                    'body': json.dumps({'games': games_list, 'next_cursor': next_cursor})
                 }
             
             elif 'game' in path and query_params.get('id'):
@@ -212,7 +630,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 game_id = query_params.get('id')
                 
                 cursor.execute("""
-                    SELECT g.*, pw.name as white_name, pb.name as black_name
+                    SELECT g.id, pw.name as white_name, pb.name as black_name, g.result, g.moves_count,
+                           g.started_at, g.finished_at, g.tournament_id, g.round, g.board
                     FROM games g
                     LEFT JOIN players pw ON g.white_player_id = pw.id
                     LEFT JOIN players pb ON g.black_player_id = pb.id
@@ -221,29 +640,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 game = cursor.fetchone()
                 
                 cursor.execute("""
-                    SELECT move_number, player_color, move_notation, board_state
+                    SELECT move_number, player_color, move_notation, board_state, board_state_packed
                     FROM moves
                     WHERE game_id = %s
                     ORDER BY move_number
                 """, (game_id,))
                 moves = cursor.fetchall()
+                board_states = decode_board_states(moves)
                 
                 if game:
                     game_data = {
                         'id': game[0],
-                        'white_player': game[11],
-                        'black_player': game[12],
+                        'white_player': game[1],
+                        'black_player': game[2],
                         'result': game[3],
                         'moves_count': game[4],
-                        'started_at': game[6].isoformat() if game[6] else None,
-                        'finished_at': game[7].isoformat() if game[7] else None,
+                        'started_at': game[5].isoformat() if game[5] else None,
+                        'finished_at': game[6].isoformat() if game[6] else None,
+                        'tournament_id': game[7],
+                        'round': game[8],
+                        'board': game[9],
                         'moves': [
                             {
                                 'move_number': m[0],
                                 'player_color': m[1],
                                 'notation': m[2],
-                                'board_state': m[3]
-                            } for m in moves
+                                'board_state': board_states[i]
+                            } for i, m in enumerate(moves)
                         ]
                     }
                     
@@ -270,4 +693,251 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
+
+
+MAX_MOVES_PER_BATCH = 2000
+
+
+def drain_explorer_queue(conn) -> None:
+    """Пачка очереди дебютного справочника; ошибка разбора не мешает ответу"""
+    try:
+        drain_openings(conn)
+    except Exception as e:
+        print(f"opening explorer drain failed: {str(e)}")
+
+# Завершение партии одним оператором. Партия переходит из in_progress ровно один раз:
+# повторный вызов не находит строку в finished и ничего не меняет. Игроки блокируются
+# в порядке id (CTE locked), рейтинг считается от рейтингов до партии.
+# Строка турнира не обновляется: кэш турнирной таблицы (standings.py) замечает новую
+# партию по числу завершённых партий, и параллельные завершения не ждут друг друга.
+# Партия арены попадает в журнал arena_game_log без номера: номер по порядку коммитов
+# присваивает arena.py, и таблицы арены на всех экземплярах применяют партии одинаково.
+# Дебютный справочник получает партию через очередь opening_explorer_pending
+# (средний рейтинг игроков до партии), а не upsert общих горячих строк под блокировками
+FINISH_GAME_SQL = f"""
+    WITH finished AS (
+        UPDATE games
+        SET result = %(result)s, finished_at = CURRENT_TIMESTAMP
+        WHERE id = %(game_id)s AND result = 'in_progress'
+        RETURNING id, white_player_id, black_player_id, tournament_id
+    ),
+    arena_logged AS (
+        INSERT INTO arena_game_log (game_id, tournament_id)
+        SELECT f.id, f.tournament_id
+        FROM finished f
+        JOIN tournaments t ON t.id = f.tournament_id
+        WHERE t.tournament_type = 'arena'
+    ),
+    sides AS (
+        SELECT 'white' AS color, white_player_id AS player_id, black_player_id AS opponent_id,
+               %(white_score)s::float8 AS score
+        FROM finished
+        UNION ALL
+        SELECT 'black', black_player_id, white_player_id, 1 - %(white_score)s::float8
+        FROM finished
+    ),
+    -- Рейтинги и число партий берутся из заблокированных строк: FOR UPDATE возвращает
+    -- последнюю версию, а не снимок оператора, в котором могло не быть параллельного завершения
+    locked AS (
+        SELECT id, rating, rated_games FROM players
+        WHERE id IN (SELECT player_id FROM sides)
+        ORDER BY id
+        FOR UPDATE
+    ),
+    rated AS (
+        SELECT s.color, s.player_id, s.score, l.rating AS old_rating, l.rated_games AS old_games,
+               o.id IS NOT NULL AND o.id <> l.id AS has_opponent,
+               1.0 / (1.0 + power(10.0, (COALESCE(o.rating, %(initial_rating)s) - COALESCE(l.rating, %(initial_rating)s)) / 400.0)) AS expected
+        FROM sides s
+        JOIN locked l ON l.id = s.player_id
+        LEFT JOIN locked o ON o.id = s.opponent_id
+    ),
+    explorer_queued AS (
+        INSERT INTO opening_explorer_pending (game_id, rating)
+        SELECT f.id, (SELECT avg(r.old_rating) FROM rated r)
+        FROM finished f
+    ),
+    updated AS (
+        UPDATE players p
+        SET games_played = p.games_played + 1,
+            rated_games = p.rated_games + r.has_opponent::int,
+            games_won = p.games_won + (r.score = 1)::int,
+            games_lost = p.games_lost + (r.score = 0)::int,
+            games_drawn = p.games_drawn + (r.score = 0.5)::int,
+            rating = CASE WHEN r.has_opponent
+                THEN round((COALESCE(r.old_rating, %(initial_rating)s)
+                            + {k_factor_sql('COALESCE(r.old_rating, %(initial_rating)s)', 'r.old_games')}
+                              * (r.score - r.expected))::float8)
+                ELSE p.rating END,
+            updated_at = CURRENT_TIMESTAMP
+        FROM rated r
+        WHERE p.id = r.player_id
+        RETURNING r.color, p.id, p.name, p.rating, r.old_rating,
+                  p.games_played, p.games_won, p.games_lost, p.games_drawn
+    )
+    SELECT u.color, u.id, u.name, u.rating, u.old_rating,
+           u.games_played, u.games_won, u.games_lost, u.games_drawn
+    FROM finished f
+    LEFT JOIN updated u ON true
+"""
+
+ARENA_TOP_DEFAULT = 10
+ARENA_TOP_MAX = 100
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_PAGE_SIZE_MAX = 5000
+
+POSITIONS_PAGE_SIZE = 50
+POSITIONS_PAGE_SIZE_MAX = 200
+
+GAMES_PAGE_SIZE = 50
+GAMES_PAGE_SIZE_MAX = 100
+GAME_RESULTS = ('in_progress', 'white_wins', 'black_wins', 'draw')
+
+# packed - позиция хранится в 37 байтах board_state_packed (по умолчанию),
+# notation - хранится только нотация, позиции восстанавливаются при чтении
+BOARD_STATE_MODE = os.environ.get('MOVES_BOARD_STATE_MODE', 'packed')
+
+
+def normalize_move_batch(raw_moves: Any) -> Tuple[Dict[int, List[Dict[str, Any]]], Optional[str]]:
+    """
+    Проверяет пакет ходов для save_moves и группирует его по партиям.
+    Ходы каждой партии сортируются по move_number, точные повторы отбрасываются,
+    разные ходы с одним номером и пропуски в нумерации считаются ошибкой.
+    """
+    if not isinstance(raw_moves, list) or not raw_moves:
+        return {}, 'Поле moves должно быть непустым массивом'
+    if len(raw_moves) > MAX_MOVES_PER_BATCH:
+        return {}, f'Не больше {MAX_MOVES_PER_BATCH} ходов за запрос'
+    
+    by_game: Dict[int, Dict[int, Dict[str, Any]]] = {}
+    for index, raw in enumerate(raw_moves):
+        if not isinstance(raw, dict):
+            return {}, f'Ход #{index}: ожидается объект'
+        try:
+            game_id = int(raw.get('game_id'))
+            move_number = int(raw.get('move_number'))
+        except (TypeError, ValueError):
+            return {}, f'Ход #{index}: game_id и move_number должны быть числами'
+        if move_number < 1:
+            return {}, f'Ход #{index}: move_number должен быть положительным'
+        if raw.get('player_color') not in ('white', 'black'):
+            return {}, f'Ход #{index}: player_color должен быть white или black'
+        if not raw.get('move_notation'):
+            return {}, f'Ход #{index}: не указан move_notation'
+        
+        move = {
+            'move_number': move_number,
+            'player_color': raw['player_color'],
+            'move_notation': raw['move_notation'],
+            'board_state': raw.get('board_state')
+        }
+        game_moves = by_game.setdefault(game_id, {})
+        existing = game_moves.get(move_number)
+        if existing is not None and existing != move:
+            return {}, f'Партия {game_id}: разные ходы с номером {move_number}'
+        game_moves[move_number] = move
+    
+    result: Dict[int, List[Dict[str, Any]]] = {}
+    for game_id, game_moves in by_game.items():
+        ordered = [game_moves[n] for n in sorted(game_moves)]
+        for prev, cur in zip(ordered, ordered[1:]):
+            if cur['move_number'] != prev['move_number'] + 1:
+                return {}, f'Партия {game_id}: пропущен ход {prev["move_number"] + 1}'
+        result[game_id] = ordered
+    return result, None
+
+
+def stored_position(position: Position) -> Optional[bytes]:
+    """Упакованная позиция для board_state_packed; в режиме notation позиция не хранится"""
+    return None if BOARD_STATE_MODE == 'notation' else position.pack()
+
+
+def decode_board_states(moves: List[Tuple]) -> List[Optional[str]]:
+    """
+    Возвращает board_state в прежнем виде для строк (номер, цвет, нотация, текст, bytea).
+    Если позиция не сохранена, она восстанавливается проигрыванием нотации партии.
+    """
+    states: List[Optional[str]] = []
+    replayed: Optional[List[Optional[str]]] = None
+    for i, m in enumerate(moves):
+        if m[4] is not None:
+            states.append(Position.unpack(bytes(m[4])).to_fen())
+        elif m[3] is not None:
+            states.append(m[3])
+        else:
+            if replayed is None:
+                replayed = replay([row[2] for row in moves])
+            states.append(replayed[i])
+    return states
+
+
+def encode_games_cursor(started_at: datetime, game_id: int) -> str:
+    """Непрозрачный курсор: позиция последней партии страницы в base64url"""
+    raw = json.dumps([started_at.isoformat(), game_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_games_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Разбирает курсор страницы; ValueError - курсор повреждён"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        started_at, game_id = json.loads(raw)
+        return datetime.fromisoformat(started_at), int(game_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+
+
+def build_games_page_query(player_id: Optional[int], result: Optional[str],
+                           after: Optional[Tuple[datetime, int]], limit: int) -> Tuple[str, List[Any]]:
+    """
+    Запрос страницы партий в порядке (started_at DESC, id DESC).
+    Фильтр по игроку собирается из двух веток UNION ALL (белые и чёрные),
+    чтобы каждая шла по своему составному индексу, а не по OR.
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if result:
+        conditions.append('g.result = %s')
+        params.append(result)
+    if after:
+        conditions.append('(g.started_at, g.id) < (%s, %s)')
+        params.extend(after)
+    
+    if player_id is None:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        query = f"""
+            SELECT g.id, g.result, g.moves_count, g.started_at, g.finished_at,
+                   pw.name as white_name, pb.name as black_name
+            FROM games g
+            LEFT JOIN players pw ON g.white_player_id = pw.id
+            LEFT JOIN players pb ON g.black_player_id = pb.id
+            {where}
+            ORDER BY g.started_at DESC, g.id DESC
+            LIMIT %s
+        """
+        return query, params + [limit]
+    
+    extra = ''.join(f' AND {c}' for c in conditions)
+    query = f"""
+        SELECT g.id, g.result, g.moves_count, g.started_at, g.finished_at,
+               pw.name as white_name, pb.name as black_name
+        FROM (
+            (SELECT g.id FROM games g
+             WHERE g.white_player_id = %s{extra}
+             ORDER BY g.started_at DESC, g.id DESC LIMIT %s)
+            UNION ALL
+            (SELECT g.id FROM games g
+             WHERE g.black_player_id = %s AND g.white_player_id IS DISTINCT FROM %s{extra}
+             ORDER BY g.started_at DESC, g.id DESC LIMIT %s)
+        ) page
+        JOIN games g ON g.id = page.id
+        LEFT JOIN players pw ON g.white_player_id = pw.id
+        LEFT JOIN players pb ON g.black_player_id = pb.id
+        ORDER BY g.started_at DESC, g.id DESC
+        LIMIT %s
+    """
+    return query, [player_id, *params, limit, player_id, player_id, *params, limit, limit]
@@ -0,0 +1,253 @@
+"""
+Business: Дебютный справочник: какие ходы играли из позиции и с каким результатом
+Args: OPENING_EXPLORER_MAX_PLY (сколько первых полуходов партии учитывать) из окружения
+Returns: ходы из позиции с числом побед белых, ничьих, побед чёрных и средним рейтингом
+
+Таблица opening_explorer агрегирована по (Zobrist-хеш позиции до хода, ход в SAN).
+finish_game не трогает её строки (у начальной позиции и первых ходов они общие для
+всех партий): он ставит партию в очередь opening_explorer_pending той же транзакцией.
+Очередь разбирается пачками после коммита, отдельной транзакцией и одним процессом
+за раз (drain_pending). Импорт PGN пишет суммы пачки в транзакции пачки. Каждая
+партия учитывается ровно один раз. Запрос справочника - одно обращение к первичному ключу.
+
+Полная пересборка по истории: python opening_explorer.py --rebuild
+Разбор очереди вручную: python opening_explorer.py --drain
+"""
+
+import os
+import sys
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from chess_board import IllegalMoveError, Position
+
+OPENING_EXPLORER_MAX_PLY = int(os.environ.get('OPENING_EXPLORER_MAX_PLY', '40'))
+EXPLORER_MOVES_LIMIT = 50
+
+# Пересборка: сброс накопленных сумм в таблицу
+REBUILD_FLUSH_ENTRIES = 200000
+# Сколько партий очереди разбирается одной транзакцией
+EXPLORER_DRAIN_BATCH = int(os.environ.get('OPENING_EXPLORER_DRAIN_BATCH', '500'))
+
+# Ключ рекомендательной блокировки записи в справочник: пересборка держит его исключительно
+# на всё время, разбор очереди - исключительно на транзакцию (без ожидания), пачки импорта
+# PGN - разделяемо на транзакцию
+EXPLORER_LOCK_KEY = 0x0E8F_0001
+
+# Индексы результата в счётчиках (white_wins, draws, black_wins)
+RESULT_SLOT = {'white_wins': 0, 'draw': 1, 'black_wins': 2}
+
+UPSERT_SQL = """
+    INSERT INTO {table} AS e (position_hash, move, white_wins, draws, black_wins, rating_sum, rating_games)
+    VALUES %s
+    ON CONFLICT (position_hash, move) DO UPDATE
+    SET white_wins = e.white_wins + EXCLUDED.white_wins,
+        draws = e.draws + EXCLUDED.draws,
+        black_wins = e.black_wins + EXCLUDED.black_wins,
+        rating_sum = e.rating_sum + EXCLUDED.rating_sum,
+        rating_games = e.rating_games + EXCLUDED.rating_games
+"""
+
+
+def game_entries(notations: Iterable[str], max_ply: int = OPENING_EXPLORER_MAX_PLY) -> List[Tuple[int, str]]:
+    """(хеш позиции до хода, ход в SAN) для первых max_ply полуходов; обрывается на недопустимом ходе"""
+    position = Position.start()
+    entries = []
+    for ply, notation in enumerate(notations):
+        if ply >= max_ply:
+            break
+        try:
+            move = position.parse_move(notation)
+        except IllegalMoveError:
+            break
+        entries.append((position.position_hash, position.move_to_san(move)))
+        position = position.make_move(move)
+    return entries
+
+
+def accumulate(totals: Dict[Tuple[int, str], List[int]], entries: List[Tuple[int, str]],
+                result: str, rating: Optional[float]) -> None:
+    slot = RESULT_SLOT[result]
+    for entry in set(entries):
+        counters = totals.get(entry)
+        if counters is None:
+            counters = totals[entry] = [0, 0, 0, 0, 0]
+        counters[slot] += 1
+        if rating is not None:
+            counters[3] += int(round(rating))
+            counters[4] += 1
+
+
+def flush(cursor, totals: Dict[Tuple[int, str], List[int]], table: str = 'opening_explorer') -> None:
+    if not totals:
+        return
+    # Порядок ключей одинаковый во всех транзакциях: параллельные upsert не взаимоблокируются
+    rows = [(position_hash, move, *counters) for (position_hash, move), counters in sorted(totals.items())]
+    execute_values(cursor, UPSERT_SQL.format(table=table), rows, page_size=1000)
+    totals.clear()
+
+
+def record_batch(cursor, totals: Dict[Tuple[int, str], List[int]]) -> None:
+    """Записывает суммы пачки импорта в транзакции пачки; ждёт идущую пересборку"""
+    if not totals:
+        return
+    cursor.execute('SELECT pg_advisory_xact_lock_shared(%s)', (EXPLORER_LOCK_KEY,))
+    flush(cursor, totals)
+
+
+def drain_pending(conn, limit: int = EXPLORER_DRAIN_BATCH) -> int:
+    """
+    Разбирает до limit партий очереди одной транзакцией; возвращает их число.
+    Если очередь уже разбирает другой процесс или идёт пересборка, сразу возвращает 0
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', (EXPLORER_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            conn.commit()
+            return 0
+        cursor.execute("""
+            WITH taken AS (
+                DELETE FROM opening_explorer_pending
+                WHERE game_id IN (SELECT game_id FROM opening_explorer_pending ORDER BY game_id LIMIT %s)
+                RETURNING game_id, rating
+            )
+            SELECT g.result, t.rating,
+                   ARRAY(SELECT m.move_notation FROM moves m
+                         WHERE m.game_id = t.game_id AND m.move_number <= %s
+                         ORDER BY m.move_number)
+            FROM taken t
+            JOIN games g ON g.id = t.game_id
+        """, (limit, OPENING_EXPLORER_MAX_PLY))
+        rows = cursor.fetchall()
+        totals: Dict[Tuple[int, str], List[int]] = {}
+        for result, rating, notations in rows:
+            if result in RESULT_SLOT:
+                accumulate(totals, game_entries(notations), result, rating)
+        flush(cursor, totals)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def lookup(cursor, position_hash: int) -> List[Dict[str, Any]]:
+    cursor.execute("""
+        SELECT move, white_wins, draws, black_wins, rating_sum, rating_games
+        FROM opening_explorer
+        WHERE position_hash = %s
+        ORDER BY white_wins + draws + black_wins DESC, move
+        LIMIT %s
+    """, (position_hash, EXPLORER_MOVES_LIMIT))
+    moves = []
+    for move, white_wins, draws, black_wins, rating_sum, rating_games in cursor.fetchall():
+        games = white_wins + draws + black_wins
+        moves.append({
+            'move': move,
+            'games': games,
+            'white_wins': white_wins,
+            'draws': draws,
+            'black_wins': black_wins,
+            'white_score': round((white_wins + draws * 0.5) / games, 4) if games else None,
+            'average_rating': round(rating_sum / rating_games) if rating_games else None
+        })
+    return moves
+
+
+def _replay_history(conn, cursor, totals: Dict[Tuple[int, str], List[int]],
+                    table: str = 'opening_explorer_rebuild') -> int:
+    """Проходит завершённые партии именованным курсором и копит суммы, сбрасывая их порциями"""
+    history = conn.cursor(name='explorer_rebuild')
+    history.itersize = 2000
+    history.execute("""
+        SELECT g.result,
+               (COALESCE(pw.rating, 0) + COALESCE(pb.rating, 0)) / 2.0,
+               ARRAY(SELECT m.move_notation FROM moves m
+                     WHERE m.game_id = g.id AND m.move_number <= %s
+                     ORDER BY m.move_number)
+        FROM games g
+        LEFT JOIN players pw ON pw.id = g.white_player_id
+        LEFT JOIN players pb ON pb.id = g.black_player_id
+        WHERE g.result IN ('white_wins', 'black_wins', 'draw')
+        ORDER BY g.id
+    """, (OPENING_EXPLORER_MAX_PLY,))
+    games = 0
+    for result, rating, notations in history:
+        accumulate(totals, game_entries(notations), result, float(rating) if rating else None)
+        games += 1
+        if len(totals) >= REBUILD_FLUSH_ENTRIES:
+            flush(cursor, totals, table)
+    history.close()
+    flush(cursor, totals, table)
+    return games
+
+
+def rebuild(conn) -> Dict[str, Any]:
+    """
+    Пересобирает справочник по всей истории в отдельной таблице и подменяет ею рабочую.
+    Средний рейтинг берётся по текущим рейтингам игроков.
+
+    Разбор очереди и импорт PGN на время пересборки приостанавливаются (EXPLORER_LOCK_KEY).
+    Основной проход идёт в одном снимке REPEATABLE READ: партии из очереди, видимые в нём,
+    уже учтены и при подмене удаляются из очереди, остальные разберутся после подмены.
+    """
+    started = time.monotonic()
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_lock(%s)', (EXPLORER_LOCK_KEY,))
+    conn.commit()
+    try:
+        return _rebuild_locked(conn, cursor, started)
+    finally:
+        conn.rollback()
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (EXPLORER_LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+
+
+def _rebuild_locked(conn, cursor, started: float) -> Dict[str, Any]:
+    cursor.execute("DROP TABLE IF EXISTS opening_explorer_rebuild")
+    cursor.execute("CREATE TABLE opening_explorer_rebuild (LIKE opening_explorer INCLUDING ALL)")
+    conn.commit()
+
+    # Очередь и история читаются в одном снимке
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("SELECT game_id FROM opening_explorer_pending")
+    counted_pending = [row[0] for row in cursor.fetchall()]
+    totals: Dict[Tuple[int, str], List[int]] = {}
+    games = _replay_history(conn, cursor, totals)
+    conn.commit()
+
+    cursor.execute("LOCK TABLE opening_explorer IN EXCLUSIVE MODE")
+    cursor.execute("DELETE FROM opening_explorer_pending WHERE game_id = ANY(%s)", (counted_pending,))
+    cursor.execute("DROP TABLE opening_explorer")
+    cursor.execute("ALTER TABLE opening_explorer_rebuild RENAME TO opening_explorer")
+    cursor.execute("ALTER INDEX opening_explorer_rebuild_pkey RENAME TO opening_explorer_pkey")
+    conn.commit()
+    return {'games': games, 'seconds': round(time.monotonic() - started, 3)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in ('--rebuild', '--drain'):
+        print('Использование: python opening_explorer.py --rebuild | --drain')
+        sys.exit(1)
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if sys.argv[1] == '--rebuild':
+            print(rebuild(connection))
+        else:
+            drained = 0
+            while True:
+                batch = drain_pending(connection)
+                if not batch:
+                    break
+                drained += batch
+            print({'games': drained})
+    finally:
+        connection.close()
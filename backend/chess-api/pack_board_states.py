@@ -0,0 +1,70 @@
+"""
+Business: Перенос текстовых FEN из moves.board_state в компактный board_state_packed для старых ходов
+Args: размер пачки, пауза между пачками, id, после которого продолжить
+Returns: последний обработанный id, число упакованных строк и время работы
+
+Упаковка выполняется функцией pack_fen_board_state из V0015 пачками по диапазонам id.
+Каждая пачка - отдельная короткая транзакция, поэтому блокировки строк и WAL не
+копятся до конца переноса. Строки, которые не удалось разобрать как FEN, остаются
+в текстовом board_state. Прерванный запуск продолжается с --from-id.
+
+Запуск: python pack_board_states.py --backfill [--batch 5000] [--sleep 0.2] [--from-id 0]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Any
+
+
+def backfill(conn, batch_size: int = 5000, pause: float = 0.2, from_id: int = 0, log=sys.stderr) -> Dict[str, Any]:
+    """Упаковывает board_state пачками по id; каждая пачка коммитится отдельно"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM moves")
+    max_id = cursor.fetchone()[0]
+    conn.commit()
+
+    last_id = from_id
+    packed = 0
+    started = time.monotonic()
+    while last_id < max_id:
+        cursor.execute("""
+            UPDATE moves m
+            SET board_state_packed = c.packed,
+                board_state = NULL
+            FROM (
+                SELECT id, pack_fen_board_state(board_state) AS packed
+                FROM moves
+                WHERE id > %s AND id <= %s
+                  AND board_state IS NOT NULL AND board_state_packed IS NULL
+            ) c
+            WHERE m.id = c.id AND c.packed IS NOT NULL
+        """, (last_id, last_id + batch_size))
+        packed += cursor.rowcount
+        conn.commit()
+        last_id += batch_size
+
+        elapsed = time.monotonic() - started
+        print(f"до id {min(last_id, max_id)} из {max_id}: упаковано {packed}, {elapsed:.1f} с", file=log)
+        if pause:
+            time.sleep(pause)
+
+    cursor.close()
+    return {'last_id': min(last_id, max_id), 'packed': packed, 'seconds': round(time.monotonic() - started, 3)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Перенос moves.board_state в board_state_packed для старых ходов')
+    parser.add_argument('--backfill', action='store_true', required=True)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--sleep', type=float, default=0.2, help='пауза между пачками, с')
+    parser.add_argument('--from-id', type=int, default=0, help='продолжить после этого moves.id')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(backfill(connection, args.batch, args.sleep, args.from_id))
+    finally:
+        connection.close()
@@ -0,0 +1,440 @@
+"""
+Business: Потоковый импорт PGN-архивов в games и moves
+Args: путь к .pgn (или .pgn.gz), размер пачки, имя источника для контрольной точки
+Returns: число импортированных и пропущенных партий, скорость в партиях в секунду
+
+Файл читается построчно генератором, партии проходят конвейер генераторов
+(чтение -> разбор -> пачки), поэтому в памяти находится не больше одной пачки.
+Игроки находятся или создаются по имени одним запросом на пачку, партии и ходы
+загружаются через COPY, дебютный справочник пополняется той же транзакцией.
+Недоигранные партии (результат *) пропускаются и считаются в пропущенных.
+После каждой пачки в той же транзакции сохраняется смещение в файле
+(pgn_import_checkpoints), и повторный запуск продолжает с него.
+Один источник импортирует один процесс: запуск держит рекомендательную блокировку
+сессии на имя источника, второй запуск сразу завершается с ошибкой.
+
+Запуск: python pgn_import.py archive.pgn [--batch 500] [--workers 4] [--source club-2019] [--restart]
+Рейтинги импорт не меняет; после крупного импорта: python rating.py --recompute
+"""
+
+import argparse
+import gzip
+import io
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from chess_board import START_FEN, WHITE, IllegalMoveError, Position
+from opening_explorer import OPENING_EXPLORER_MAX_PLY, RESULT_SLOT, accumulate, record_batch
+
+PGN_RESULTS = {'1-0': 'white_wins', '0-1': 'black_wins', '1/2-1/2': 'draw', '*': 'in_progress'}
+BOARD_STATE_MODE = os.environ.get('MOVES_BOARD_STATE_MODE', 'packed')
+
+_HEADER_RE = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+_COMMENT_RE = re.compile(r'\{[^}]*\}|;[^\n]*')
+_MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+
+# Время партии без даты в заголовках
+IMPORTED_AT = datetime.now()
+
+# Первый ключ pg_try_advisory_lock(класс, hashtext(источник)) импорта
+PGN_IMPORT_LOCK_CLASS = 0x5067
+
+
+class PgnGame:
+    """Разобранная партия, готовая к записи"""
+
+    __slots__ = ('white', 'black', 'result', 'started_at', 'time_control', 'moves', 'explorer', 'end_offset')
+
+    def __init__(self, white: str, black: str, result: str, started_at: datetime,
+                 time_control: Optional[str], moves: List[Tuple[str, str, Optional[bytes], int]],
+                 explorer: List[Tuple[int, str]], end_offset: int):
+        self.white = white
+        self.black = black
+        self.result = result
+        self.started_at = started_at
+        self.time_control = time_control
+        self.moves = moves
+        self.explorer = explorer
+        self.end_offset = end_offset
+
+
+def read_pgn(stream, offset: int = 0) -> Iterator[Tuple[Dict[str, str], str, int]]:
+    """
+    Партии из бинарного потока: (заголовки, текст ходов, смещение конца партии).
+    Смещение конца - начало следующей партии, с него можно продолжить чтение.
+    """
+    headers: Dict[str, str] = {}
+    movetext: List[str] = []
+    position = offset
+    for raw in stream:
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line.startswith('[') and movetext:
+            yield headers, '\n'.join(movetext), position
+            headers, movetext = {}, []
+        position += len(raw)
+        if not line or line.startswith('%'):
+            continue
+        match = _HEADER_RE.match(line) if line.startswith('[') else None
+        if match:
+            headers[match.group(1)] = match.group(2)
+        else:
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, '\n'.join(movetext), position
+
+
+def movetext_tokens(text: str) -> List[str]:
+    """Ходы основной линии: без комментариев, вариантов, номеров ходов, NAG и результата"""
+    text = _COMMENT_RE.sub(' ', text)
+    if '(' in text:
+        depth, kept = 0, []
+        for ch in text:
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                kept.append(ch)
+        text = ''.join(kept)
+    tokens = []
+    for token in text.split():
+        token = _MOVE_NUMBER_RE.sub('', token)
+        if not token or token.startswith('$') or token in PGN_RESULTS:
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def parse_date(headers: Dict[str, str]) -> Optional[datetime]:
+    for date_key, time_key in (('UTCDate', 'UTCTime'), ('Date', 'Time')):
+        value = headers.get(date_key, '')
+        try:
+            parsed = datetime.strptime(value, '%Y.%m.%d')
+        except ValueError:
+            continue
+        try:
+            clock = datetime.strptime(headers.get(time_key, ''), '%H:%M:%S')
+            parsed = parsed.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+        except ValueError:
+            pass
+        return parsed
+    return None
+
+
+def parse_time_control(value: Optional[str]) -> Optional[str]:
+    """"600+5" (секунды) -> "10+5" (минуты+секунды), как в games.time_control"""
+    if not value or value in ('-', '?'):
+        return None
+    base, _, increment = value.partition('+')
+    try:
+        minutes = int(base) / 60
+    except ValueError:
+        return None
+    return f"{minutes:g}+{increment or 0}"
+
+
+def parse_game(raw: Tuple[Dict[str, str], str, int]) -> Tuple[Optional[PgnGame], int]:
+    """
+    Проверяет ходы партии по правилам; (None, смещение конца), если партия с ошибкой
+    или не доиграна (результат '*'): незавершённая партия без игроков за доской так и
+    осталась бы в статусе in_progress
+    """
+    headers, movetext, end_offset = raw
+    result = PGN_RESULTS.get(headers.get('Result', '*'), 'in_progress')
+    if result == 'in_progress':
+        return None, end_offset
+    tokens = movetext_tokens(movetext)
+    # (ход, цвет ходящего, упакованная позиция, position_hash)
+    moves: List[Tuple[str, str, Optional[bytes], int]] = []
+    # Дебютный справочник - только партии из начальной позиции, как в finish_game
+    explorer: List[Tuple[int, str]] = []
+    start_fen = headers.get('FEN') or START_FEN
+    try:
+        # Позиция проигрывается и в режиме notation: без неё нет position_hash для поиска по позиции
+        position = Position.from_fen(start_fen)
+        for ply, token in enumerate(tokens):
+            # Цвет - по очереди хода в позиции: в партии из FEN первыми могут ходить чёрные
+            color = 'white' if position.side == WHITE else 'black'
+            move = position.parse_move(token)
+            if start_fen == START_FEN and ply < OPENING_EXPLORER_MAX_PLY:
+                explorer.append((position.position_hash, position.move_to_san(move)))
+            position = position.make_move(move)
+            packed = None if BOARD_STATE_MODE == 'notation' else position.pack()
+            moves.append((token, color, packed, position.position_hash))
+    except (IllegalMoveError, ValueError, IndexError):
+        return None, end_offset
+    return PgnGame(
+        white=(headers.get('White') or '?')[:255],
+        black=(headers.get('Black') or '?')[:255],
+        result=result,
+        started_at=parse_date(headers) or IMPORTED_AT,
+        time_control=parse_time_control(headers.get('TimeControl')),
+        moves=moves,
+        explorer=explorer,
+        end_offset=end_offset
+    ), end_offset
+
+
+def parse_games(raw_games: Iterable[Tuple[Dict[str, str], str, int]], stats: Dict[str, int],
+                workers: int = 1) -> Iterator[PgnGame]:
+    """
+    Разбор партий; ошибочные пропускаются и считаются в stats.
+    С workers > 1 проверка ходов идёт в пуле процессов порциями, порядок партий сохраняется.
+    """
+    if workers > 1:
+        from multiprocessing import Pool
+
+        pool = Pool(workers)
+        chunk_size = workers * 64
+
+        def parsed():
+            chunk = []
+            for raw in raw_games:
+                chunk.append(raw)
+                if len(chunk) >= chunk_size:
+                    yield from pool.map(parse_game, chunk, chunksize=16)
+                    chunk = []
+            if chunk:
+                yield from pool.map(parse_game, chunk, chunksize=16)
+    else:
+        pool = None
+
+        def parsed():
+            return map(parse_game, raw_games)
+
+    try:
+        for game, end_offset in parsed():
+            if game is None:
+                stats['skipped'] += 1
+                stats['offset'] = end_offset
+                continue
+            yield game
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def batched(items: Iterable[PgnGame], size: int) -> Iterator[List[PgnGame]]:
+    batch: List[PgnGame] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_value(value: Any) -> str:
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return '\\\\x' + value.hex()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_rows(cursor, table: str, columns: Tuple[str, ...], rows: Iterable[Tuple]) -> None:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+class PlayerResolver:
+    """id игроков по имени: кэш процесса, затем один SELECT и один INSERT на пачку"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def resolve(self, cursor, names: Iterable[str]) -> Dict[str, int]:
+        missing = sorted({name for name in names if name not in self.ids})
+        if missing:
+            cursor.execute("""
+                SELECT DISTINCT ON (name) name, id FROM players
+                WHERE name = ANY(%s)
+                ORDER BY name, id
+            """, (missing,))
+            self.ids.update(dict(cursor.fetchall()))
+            new_names = [name for name in missing if name not in self.ids]
+            if new_names:
+                created = execute_values(cursor, "INSERT INTO players (name) VALUES %s RETURNING name, id",
+                                         [(name,) for name in new_names], page_size=len(new_names), fetch=True)
+                self.ids.update(dict(created))
+        return self.ids
+
+
+def write_batch(cursor, resolver: PlayerResolver, batch: List[PgnGame]) -> int:
+    """Записывает пачку партий, ходы и счётчики игроков; возвращает число ходов"""
+    ids = resolver.resolve(cursor, [name for game in batch for name in (game.white, game.black)])
+    cursor.execute("SELECT nextval(pg_get_serial_sequence('games', 'id')) FROM generate_series(1, %s)",
+                   (len(batch),))
+    game_ids = [row[0] for row in cursor.fetchall()]
+
+    _copy_rows(cursor, 'games',
+               ('id', 'white_player_id', 'black_player_id', 'result', 'moves_count', 'time_control',
+                'started_at', 'finished_at'),
+               ((game_id, ids[game.white], ids[game.black], game.result, len(game.moves), game.time_control,
+                 game.started_at, game.started_at)
+                for game_id, game in zip(game_ids, batch)))
+
+    moves_total = sum(len(game.moves) for game in batch)
+    _copy_rows(cursor, 'moves',
+               ('game_id', 'move_number', 'player_color', 'move_notation', 'board_state_packed', 'position_hash'),
+               ((game_id, ply, color, notation, packed, position_hash)
+                for game_id, game in zip(game_ids, batch)
+                for ply, (notation, color, packed, position_hash) in enumerate(game.moves, start=1)))
+
+    # Счётчики партий игроков: одна строка (игрок, сыграно, побед, поражений, ничьих) на игрока
+    deltas: Dict[int, List[int]] = {}
+    for game in batch:
+        if ids[game.white] == ids[game.black]:
+            continue
+        for player_id, won in ((ids[game.white], 'white_wins'), (ids[game.black], 'black_wins')):
+            delta = deltas.setdefault(player_id, [0, 0, 0, 0])
+            delta[0] += 1
+            if game.result == 'draw':
+                delta[3] += 1
+            elif game.result == won:
+                delta[1] += 1
+            else:
+                delta[2] += 1
+    if deltas:
+        execute_values(cursor, """
+            UPDATE players p
+            SET games_played = p.games_played + v.played, games_won = p.games_won + v.won,
+                games_lost = p.games_lost + v.lost, games_drawn = p.games_drawn + v.drawn,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, played, won, lost, drawn)
+            WHERE p.id = v.id
+        """, [(player_id, *delta) for player_id, delta in deltas.items()], page_size=len(deltas))
+
+    # Дебютный справочник в той же транзакции; рейтинг - средний текущий, как при пересборке
+    finished = [game for game in batch if game.result in RESULT_SLOT and game.explorer]
+    if finished:
+        cursor.execute("SELECT id, rating FROM players WHERE id = ANY(%s)",
+                       (sorted({ids[name] for game in finished for name in (game.white, game.black)}),))
+        ratings = dict(cursor.fetchall())
+        totals: Dict[Tuple[int, str], List[int]] = {}
+        for game in finished:
+            rating = ((ratings.get(ids[game.white]) or 0) + (ratings.get(ids[game.black]) or 0)) / 2.0
+            accumulate(totals, game.explorer, game.result, rating or None)
+        record_batch(cursor, totals)
+    return moves_total
+
+
+class ImportLockedError(Exception):
+    """Импорт этого источника уже идёт в другом процессе"""
+
+
+def import_pgn(conn, path: str, source: str, batch_size: int = 500, restart: bool = False,
+               workers: int = 1, log=sys.stderr) -> Dict[str, Any]:
+    """Импортирует файл пачками с контрольной точкой после каждой пачки"""
+    cursor = conn.cursor()
+    # Сессионная рекомендательная блокировка на весь запуск: коммиты пачек её не снимают,
+    # поэтому второй импорт того же источника не стартует с той же контрольной точки
+    cursor.execute('SELECT pg_try_advisory_lock(%s, hashtext(%s))', (PGN_IMPORT_LOCK_CLASS, source))
+    locked = cursor.fetchone()[0]
+    conn.commit()
+    if not locked:
+        cursor.close()
+        raise ImportLockedError(f'Импорт источника {source} уже запущен')
+
+    try:
+        return _import_locked(conn, cursor, path, source, batch_size, restart, workers, log)
+    finally:
+        conn.rollback()
+        cursor.execute('SELECT pg_advisory_unlock(%s, hashtext(%s))', (PGN_IMPORT_LOCK_CLASS, source))
+        conn.commit()
+        cursor.close()
+
+
+def _import_locked(conn, cursor, path: str, source: str, batch_size: int, restart: bool,
+                   workers: int, log) -> Dict[str, Any]:
+    cursor.execute("""
+        INSERT INTO pgn_import_checkpoints (source, byte_offset) VALUES (%s, 0)
+        ON CONFLICT (source) DO NOTHING
+    """, (source,))
+    if restart:
+        cursor.execute("""
+            UPDATE pgn_import_checkpoints
+            SET byte_offset = 0, games_imported = 0, games_skipped = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE source = %s
+        """, (source,))
+    cursor.execute("""
+        SELECT byte_offset, games_imported, games_skipped FROM pgn_import_checkpoints
+        WHERE source = %s
+    """, (source,))
+    offset, imported_before, skipped_before = cursor.fetchone()
+    conn.commit()
+
+    stats = {'imported': 0, 'skipped': 0, 'moves': 0, 'offset': offset}
+    started = time.monotonic()
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as stream:
+        stream.seek(offset)
+        resolver = PlayerResolver()
+        for batch in batched(parse_games(read_pgn(stream, offset), stats, workers), batch_size):
+            stats['moves'] += write_batch(cursor, resolver, batch)
+            stats['imported'] += len(batch)
+            stats['offset'] = max(stats['offset'], batch[-1].end_offset)
+            cursor.execute("""
+                UPDATE pgn_import_checkpoints
+                SET byte_offset = %s, games_imported = %s, games_skipped = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE source = %s
+            """, (stats['offset'], imported_before + stats['imported'],
+                  skipped_before + stats['skipped'], source))
+            conn.commit()
+
+            elapsed = time.monotonic() - started
+            print(f"{stats['imported']} партий, {stats['moves']} ходов, пропущено {stats['skipped']}, "
+                  f"{stats['imported'] / elapsed:.0f} партий/с", file=log)
+
+    # Пропущенные партии в самом конце файла тоже сдвигают контрольную точку
+    cursor.execute("""
+        UPDATE pgn_import_checkpoints
+        SET byte_offset = GREATEST(byte_offset, %s), games_skipped = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE source = %s
+    """, (stats['offset'], skipped_before + stats['skipped'], source))
+    conn.commit()
+
+    elapsed = time.monotonic() - started
+    return {
+        'source': source,
+        'imported': stats['imported'],
+        'skipped': stats['skipped'],
+        'moves': stats['moves'],
+        'seconds': round(elapsed, 3),
+        'games_per_second': round(stats['imported'] / elapsed, 1) if elapsed else None
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Импорт PGN в games и moves')
+    parser.add_argument('path')
+    parser.add_argument('--batch', type=int, default=500, help='партий в одной транзакции')
+    parser.add_argument('--source', help='имя контрольной точки (по умолчанию имя файла)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='процессов для проверки ходов (по умолчанию по числу ядер)')
+    parser.add_argument('--restart', action='store_true', help='начать файл заново, игнорируя контрольную точку')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(import_pgn(connection, args.path, args.source or os.path.basename(args.path),
+                         args.batch, args.restart, args.workers))
+    except ImportLockedError as e:
+        sys.exit(str(e))
+    finally:
+        connection.close()
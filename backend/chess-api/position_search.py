@@ -0,0 +1,183 @@
+"""
+Business: Поиск партий, в которых встречалась позиция, и заполнение moves.position_hash для старых ходов
+Args: FEN позиции и курсор страницы; для заполнения - размер пачки и пауза между пачками
+Returns: страница партий (новые первыми) с номером хода, на котором позиция возникла
+
+Поиск идёт по индексу (position_hash, game_id). Совпадение хеша дополнительно сверяется
+с расстановкой фигур, очередью хода и правами рокировки из board_state_packed, поэтому
+коллизия Zobrist-ключей не даёт ложных результатов. Счётчики ходов в FEN не учитываются.
+
+Заполнение хешей: python position_search.py --backfill [--batch 5000] [--sleep 0.2] [--from-id 0]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from chess_board import START_FEN, IllegalMoveError, Position
+
+# Расстановка (32 байта) и байт очереди хода с правами рокировки упакованной позиции
+PLACEMENT_BYTES = 33
+
+
+def encode_position_cursor(game_id: int) -> str:
+    raw = json.dumps([game_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_position_cursor(token: Optional[str]) -> Optional[int]:
+    """id последней партии предыдущей страницы; ValueError - курсор повреждён"""
+    if not token:
+        return None
+    try:
+        (game_id,) = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return int(game_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+
+
+def search_games(cursor, position: Position, before_game_id: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Партии с позицией в порядке id по убыванию; возвращает страницу и курсор следующей"""
+    placement = position.pack()[:PLACEMENT_BYTES]
+    params: List[Any] = [position.position_hash, placement]
+    before = ''
+    if before_game_id is not None:
+        before = 'AND m.game_id < %s'
+        params.append(before_game_id)
+    params.append(limit + 1)
+
+    cursor.execute(f"""
+        WITH hits AS (
+            SELECT m.game_id, MIN(m.move_number) AS move_number
+            FROM moves m
+            WHERE m.position_hash = %s
+              AND (m.board_state_packed IS NULL OR substring(m.board_state_packed FROM 1 FOR {PLACEMENT_BYTES}) = %s)
+              {before}
+            GROUP BY m.game_id
+            ORDER BY m.game_id DESC
+            LIMIT %s
+        )
+        SELECT h.game_id, h.move_number, g.result, g.started_at, g.tournament_id,
+               pw.name, pb.name
+        FROM hits h
+        JOIN games g ON g.id = h.game_id
+        LEFT JOIN players pw ON pw.id = g.white_player_id
+        LEFT JOIN players pb ON pb.id = g.black_player_id
+        ORDER BY h.game_id DESC
+    """, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_position_cursor(rows[-1][0])
+    games = [{
+        'game_id': row[0],
+        'move_number': row[1],
+        'result': row[2],
+        'started_at': row[3].isoformat() if row[3] else None,
+        'tournament_id': row[4],
+        'white_player': row[5],
+        'black_player': row[6]
+    } for row in rows]
+    return games, next_cursor
+
+
+def _replayed_hashes(cursor, game_id: int) -> Dict[int, int]:
+    """Хеши позиций партии, восстановленные по нотации: номер хода -> хеш"""
+    cursor.execute("SELECT move_number, move_notation FROM moves WHERE game_id = %s ORDER BY move_number", (game_id,))
+    position = Position.from_fen(START_FEN)
+    hashes = {}
+    for move_number, notation in cursor.fetchall():
+        try:
+            position = position.make_move(position.parse_move(notation))
+        except IllegalMoveError:
+            break
+        hashes[move_number] = position.position_hash
+    return hashes
+
+
+def backfill(conn, batch_size: int = 5000, pause: float = 0.2, from_id: int = 0, log=sys.stderr) -> Dict[str, Any]:
+    """
+    Заполняет position_hash у ходов без него пачками по id с паузой между пачками.
+    Хеш берётся из board_state_packed, иначе из FEN в board_state, иначе партия проигрывается.
+    Каждая пачка - отдельная короткая транзакция; прерванный запуск продолжается с --from-id.
+    """
+    cursor = conn.cursor()
+    last_id = from_id
+    scanned = updated = 0
+    started = time.monotonic()
+    while True:
+        cursor.execute("""
+            SELECT id, game_id, move_number, board_state, board_state_packed, position_hash
+            FROM moves
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+        values = []
+        replay_games: Dict[int, Dict[int, int]] = {}
+        for move_id, game_id, move_number, board_state, packed, stored_hash in rows:
+            if stored_hash is not None:
+                continue
+            position_hash = None
+            try:
+                if packed is not None:
+                    position_hash = Position.unpack(bytes(packed)).position_hash
+                elif board_state:
+                    position_hash = Position.from_fen(board_state).position_hash
+            except (ValueError, IndexError):
+                position_hash = None
+            if position_hash is None:
+                if game_id not in replay_games:
+                    replay_games[game_id] = _replayed_hashes(cursor, game_id)
+                position_hash = replay_games[game_id].get(move_number)
+            if position_hash is not None:
+                values.append((move_id, position_hash))
+
+        if values:
+            execute_values(cursor, """
+                UPDATE moves SET position_hash = v.position_hash
+                FROM (VALUES %s) AS v(id, position_hash)
+                WHERE moves.id = v.id AND moves.position_hash IS NULL
+            """, values, page_size=len(values))
+            updated += cursor.rowcount
+        conn.commit()
+
+        elapsed = time.monotonic() - started
+        print(f"до id {last_id}: просмотрено {scanned}, заполнено {updated}, {scanned / elapsed:.0f} строк/с",
+              file=log)
+        if pause:
+            time.sleep(pause)
+
+    cursor.close()
+    return {'last_id': last_id, 'scanned': scanned, 'updated': updated,
+            'seconds': round(time.monotonic() - started, 3)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Заполнение moves.position_hash для старых ходов')
+    parser.add_argument('--backfill', action='store_true', required=True)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--sleep', type=float, default=0.2, help='пауза между пачками, с')
+    parser.add_argument('--from-id', type=int, default=0, help='продолжить после этого moves.id')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(backfill(connection, args.batch, args.sleep, args.from_id))
+    finally:
+        connection.close()
@@ -0,0 +1,188 @@
+"""
+Business: Рейтинг Эло игроков: обновление по завершённой партии и полный пересчёт истории
+Args: ELO_INITIAL_RATING, ELO_K_TIERS ("2400:10,0:20"), ELO_PROVISIONAL_GAMES, ELO_PROVISIONAL_K из окружения
+Returns: новые рейтинги игроков
+
+Провизорный K-фактор зависит от players.rated_games - числа рейтинговых партий
+(оба игрока указаны и различны). finish_game и полный пересчёт ведут его одинаково.
+
+Полный пересчёт запускается вручную: python rating.py --recompute
+"""
+
+import os
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+from psycopg2.extras import execute_values
+
+
+def parse_k_tiers(spec: str) -> List[Tuple[float, float]]:
+    """"2400:10,0:20" -> [(2400, 10), (0, 20)]: K для рейтинга не ниже порога"""
+    tiers = []
+    for chunk in spec.split(','):
+        threshold, k = chunk.split(':')
+        tiers.append((float(threshold), float(k)))
+    return sorted(tiers, reverse=True)
+
+
+INITIAL_RATING = int(os.environ.get('ELO_INITIAL_RATING', '1200'))
+K_TIERS = parse_k_tiers(os.environ.get('ELO_K_TIERS', '2400:10,0:20'))
+PROVISIONAL_GAMES = int(os.environ.get('ELO_PROVISIONAL_GAMES', '30'))
+PROVISIONAL_K = float(os.environ.get('ELO_PROVISIONAL_K', '40'))
+
+WHITE_SCORES = {'white_wins': 1.0, 'draw': 0.5, 'black_wins': 0.0}
+
+
+def k_factor(rating: float, games_played: int) -> float:
+    """K-фактор: повышенный в провизорный период, дальше - по ступеням рейтинга"""
+    if games_played < PROVISIONAL_GAMES:
+        return PROVISIONAL_K
+    for threshold, k in K_TIERS:
+        if rating >= threshold:
+            return k
+    return K_TIERS[-1][1]
+
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+
+def rate_game(white_rating: float, white_games: int, black_rating: float, black_games: int,
+              result: str) -> Tuple[int, int]:
+    """Новые рейтинги белых и чёрных после партии с результатом result"""
+    score = WHITE_SCORES[result]
+    expected = expected_score(white_rating, black_rating)
+    new_white = white_rating + k_factor(white_rating, white_games) * (score - expected)
+    new_black = black_rating + k_factor(black_rating, black_games) * (expected - score)
+    return int(round(new_white)), int(round(new_black))
+
+
+def k_factor_sql(rating_expr: str, games_expr: str) -> str:
+    """SQL-выражение K-фактора с теми же ступенями, что и k_factor"""
+    branches = [f"WHEN {games_expr} < {PROVISIONAL_GAMES} THEN {PROVISIONAL_K}"]
+    branches += [f"WHEN {rating_expr} >= {threshold} THEN {k}" for threshold, k in K_TIERS]
+    return f"(CASE {' '.join(branches)} ELSE {K_TIERS[-1][1]} END)"
+
+
+def recompute_all_ratings(conn, fetch_size: int = 50000) -> Dict[str, Any]:
+    """
+    Пересчитывает рейтинги всех игроков с нуля по истории партий в порядке завершения.
+
+    Партии раскладываются на «волны»: номер волны партии на единицу больше последней
+    волны любого из её игроков. Внутри волны у каждого игрока не больше одной партии,
+    поэтому волна считается векторно массивами numpy, а порядок партий каждого
+    игрока сохраняется. Таблица players блокируется от записи на время пересчёта.
+    """
+    import numpy as np
+
+    started = time.monotonic()
+    cursor = conn.cursor()
+    cursor.execute("LOCK TABLE players IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("SELECT id FROM players ORDER BY id")
+    player_ids = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+    cursor.close()
+
+    # Именованный курсор: история читается порциями, а не одним списком кортежей
+    history = conn.cursor(name='rating_replay')
+    history.itersize = fetch_size
+    history.execute("""
+        SELECT white_player_id, black_player_id, result
+        FROM games
+        WHERE result IN ('white_wins', 'black_wins', 'draw')
+          AND white_player_id IS NOT NULL AND black_player_id IS NOT NULL
+          AND white_player_id <> black_player_id
+        ORDER BY finished_at, id
+    """)
+    white_chunks, black_chunks, score_chunks = [], [], []
+    while True:
+        rows = history.fetchmany(fetch_size)
+        if not rows:
+            break
+        white_chunks.append(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)))
+        black_chunks.append(np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows)))
+        score_chunks.append(np.fromiter((WHITE_SCORES[r[2]] for r in rows), dtype=np.float64, count=len(rows)))
+    history.close()
+
+    ratings = np.full(len(player_ids), float(INITIAL_RATING))
+    rated_games = np.zeros(len(player_ids), dtype=np.int64)
+    games_total = sum(len(c) for c in white_chunks)
+
+    if games_total:
+        white = np.searchsorted(player_ids, np.concatenate(white_chunks))
+        black = np.searchsorted(player_ids, np.concatenate(black_chunks))
+        scores = np.concatenate(score_chunks)
+
+        waves = _assign_waves(white.tolist(), black.tolist(), len(player_ids))
+        order = np.argsort(waves, kind='stable')
+        white, black, scores = white[order], black[order], scores[order]
+        bounds = np.flatnonzero(np.diff(waves[order])) + 1
+
+        thresholds = np.array([t for t, _ in K_TIERS])
+        tier_k = np.array([k for _, k in K_TIERS])
+        for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [games_total]))):
+            w, b, s = white[start:end], black[start:end], scores[start:end]
+            rw, rb = ratings[w], ratings[b]
+            expected = 1.0 / (1.0 + 10.0 ** ((rb - rw) / 400.0))
+            ratings[w] = np.rint(rw + _k_vector(rw, rated_games[w], thresholds, tier_k) * (s - expected))
+            ratings[b] = np.rint(rb + _k_vector(rb, rated_games[b], thresholds, tier_k) * (expected - s))
+            rated_games[w] += 1
+            rated_games[b] += 1
+
+    cursor = conn.cursor()
+    rows = list(zip(player_ids.tolist(), ratings.astype(np.int64).tolist(), rated_games.tolist()))
+    changed = 0
+    if rows:
+        # RETURNING вместо rowcount: rowcount после execute_values - только последней страницы
+        changed = len(execute_values(cursor, """
+            UPDATE players SET rating = v.rating, rated_games = v.rated_games, updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, rating, rated_games)
+            WHERE players.id = v.id
+              AND (players.rating IS DISTINCT FROM v.rating OR players.rated_games <> v.rated_games)
+            RETURNING players.id
+        """, rows, page_size=10000, fetch=True))
+    cursor.close()
+    conn.commit()
+
+    return {
+        'players': len(player_ids),
+        'games': games_total,
+        'changed': changed,
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+
+def _assign_waves(white: List[int], black: List[int], players: int):
+    import numpy as np
+
+    last_wave = [0] * players
+    waves = np.empty(len(white), dtype=np.int64)
+    for i, (w, b) in enumerate(zip(white, black)):
+        wave = max(last_wave[w], last_wave[b]) + 1
+        last_wave[w] = last_wave[b] = wave
+        waves[i] = wave
+    return waves
+
+
+def _k_vector(ratings, rated_games, thresholds, tier_k):
+    """Векторный аналог k_factor"""
+    import numpy as np
+
+    # Ступени отсортированы по убыванию порога: берём первую, порог которой не выше рейтинга
+    tier = np.argmax(ratings[:, None] >= thresholds[None, :], axis=1)
+    below_all = ratings < thresholds[-1]
+    k = np.where(below_all, tier_k[-1], tier_k[tier])
+    return np.where(rated_games < PROVISIONAL_GAMES, PROVISIONAL_K, k)
+
+
+if __name__ == '__main__':
+    if '--recompute' not in sys.argv:
+        print('Использование: python rating.py --recompute')
+        sys.exit(1)
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(recompute_all_ratings(connection))
+    finally:
+        connection.close()
@@ -0,0 +1,164 @@
+"""
+Business: Турнирная таблица с дополнительными показателями (Бухгольц, усечённый Бухгольц, Зоннеборн-Бергер, прогрессивный счёт)
+Args: id турнира; результаты партий и bye читаются одним набором запросов
+Returns: участники в порядке мест с очками и дополнительными показателями
+
+Все показатели считаются векторно по массивам numpy: одна партия - один элемент массива.
+Таблица кэшируется в памяти тёплого экземпляра функции по турниру. Версия таблицы -
+results_version (увеличивается при жеребьёвке и bye), число завершённых партий турнира
+и время последнего завершения. Партии считаются по частичному индексу
+idx_games_tournament_finished без чтения таблицы, поэтому завершение партии
+не обновляет строку турнира и не блокирует её.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from rating import WHITE_SCORES
+
+STANDINGS_CACHE_SIZE = int(os.environ.get('STANDINGS_CACHE_SIZE', '64'))
+
+# Порядок дополнительных показателей по системе турнира: в круговом главный - Зоннеборн-Бергер
+TIEBREAK_ORDER = {
+    'round_robin': ('sonneborn_berger', 'progressive'),
+    'default': ('median_buchholz', 'buchholz', 'sonneborn_berger', 'progressive')
+}
+
+_cache: 'OrderedDict[int, Tuple[str, List[Dict[str, Any]]]]' = OrderedDict()
+
+
+def get_standings(cursor, tournament_id: int) -> Optional[Dict[str, Any]]:
+    """Таблица турнира из кэша или из базы; None, если турнира нет"""
+    cursor.execute("""
+        SELECT t.tournament_type, t.results_version, g.finished, g.last_finished_at
+        FROM tournaments t
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS finished, max(finished_at) AS last_finished_at
+            FROM games
+            WHERE tournament_id = t.id AND result <> 'in_progress'
+        ) g
+        WHERE t.id = %s
+    """, (tournament_id,))
+    tournament = cursor.fetchone()
+    if not tournament:
+        return None
+    tournament_type, results_version, finished, last_finished_at = tournament
+    version = f"{results_version}.{finished}.{last_finished_at.timestamp() if last_finished_at else 0:.6f}"
+
+    cached = _cache.get(tournament_id)
+    if cached and cached[0] == version:
+        _cache.move_to_end(tournament_id)
+        return {'version': version, 'cached': True, 'standings': cached[1]}
+
+    standings = compute_standings(*load_results(cursor, tournament_id), tournament_type=tournament_type)
+    _cache[tournament_id] = (version, standings)
+    _cache.move_to_end(tournament_id)
+    while len(_cache) > STANDINGS_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return {'version': version, 'cached': False, 'standings': standings}
+
+
+def load_results(cursor, tournament_id: int):
+    """Завершённые партии, bye и участники турнира в виде массивов"""
+    import numpy as np
+
+    cursor.execute("""
+        SELECT white_player_id, black_player_id, result, COALESCE(round, 0)
+        FROM games
+        WHERE tournament_id = %s AND result IN ('white_wins', 'black_wins', 'draw')
+          AND white_player_id IS NOT NULL AND black_player_id IS NOT NULL
+    """, (tournament_id,))
+    games = cursor.fetchall()
+    cursor.execute("""
+        SELECT player_id, round, points FROM tournament_round_byes WHERE tournament_id = %s
+    """, (tournament_id,))
+    byes = cursor.fetchall()
+
+    count = len(games)
+    white = np.fromiter((g[0] for g in games), dtype=np.int64, count=count)
+    black = np.fromiter((g[1] for g in games), dtype=np.int64, count=count)
+    white_score = np.fromiter((WHITE_SCORES[g[2]] for g in games), dtype=np.float64, count=count)
+    rounds = np.fromiter((g[3] for g in games), dtype=np.int64, count=count)
+    bye_player = np.fromiter((b[0] for b in byes), dtype=np.int64, count=len(byes))
+    bye_round = np.fromiter((b[1] for b in byes), dtype=np.int64, count=len(byes))
+    bye_points = np.fromiter((float(b[2]) for b in byes), dtype=np.float64, count=len(byes))
+
+    player_ids = np.unique(np.concatenate((white, black, bye_player)))
+    cursor.execute("SELECT id, name, rating FROM players WHERE id = ANY(%s)", (player_ids.tolist(),))
+    info = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    return player_ids, info, (white, black, white_score, rounds), (bye_player, bye_round, bye_points)
+
+
+def compute_standings(player_ids, info: Dict[int, Tuple[str, Optional[int]]], games, byes,
+                      tournament_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Очки и дополнительные показатели всех участников; игроки - индексы в отсортированном player_ids"""
+    import numpy as np
+
+    n = len(player_ids)
+    if n == 0:
+        return []
+    white_id, black_id, white_score, rounds = games
+    bye_id, bye_round, bye_points = byes
+    white = np.searchsorted(player_ids, white_id)
+    black = np.searchsorted(player_ids, black_id)
+    bye = np.searchsorted(player_ids, bye_id)
+    black_score = 1.0 - white_score
+
+    score = (np.bincount(white, white_score, n) + np.bincount(black, black_score, n)
+             + np.bincount(bye, bye_points, n))
+    played = np.bincount(white, minlength=n) + np.bincount(black, minlength=n)
+
+    # Каждая партия даёт две записи «игрок - соперник» (за белых и за чёрных)
+    player = np.concatenate((white, black))
+    opponent_score = np.concatenate((score[black], score[white]))
+    own_result = np.concatenate((white_score, black_score))
+
+    buchholz = np.bincount(player, opponent_score, n)
+    sonneborn_berger = np.bincount(player, own_result * opponent_score, n)
+
+    # Усечённый (медианный) Бухгольц: без лучшего и худшего соперника, если партий хотя бы три
+    best = np.full(n, -np.inf)
+    worst = np.full(n, np.inf)
+    np.maximum.at(best, player, opponent_score)
+    np.minimum.at(worst, player, opponent_score)
+    median_buchholz = np.where(played >= 3, buchholz - best - worst, buchholz)
+
+    # Прогрессивный счёт: сумма набранных очков после каждого тура
+    total_rounds = int(max(rounds.max(initial=0), bye_round.max(initial=0), 1))
+    cells = np.concatenate((player * total_rounds + np.concatenate((rounds, rounds)).clip(1) - 1,
+                            bye * total_rounds + bye_round.clip(1) - 1))
+    per_round = np.bincount(cells, np.concatenate((own_result, bye_points)), n * total_rounds)
+    progressive = per_round.reshape(n, total_rounds).cumsum(axis=1).sum(axis=1)
+
+    metrics = {
+        'buchholz': buchholz,
+        'median_buchholz': median_buchholz,
+        'sonneborn_berger': sonneborn_berger,
+        'progressive': progressive
+    }
+    order_keys = TIEBREAK_ORDER.get(tournament_type, TIEBREAK_ORDER['default'])
+    # lexsort: последний ключ главный; при полном равенстве выше меньший id
+    order = np.lexsort([player_ids] + [-metrics[key] for key in reversed(order_keys)] + [-score])
+
+    # Столбцы переводятся в списки Python целиком: поэлементное обращение к numpy медленнее
+    columns = zip(player_ids[order].tolist(), played[order].tolist(), score[order].tolist(),
+                  buchholz[order].tolist(), median_buchholz[order].tolist(),
+                  sonneborn_berger[order].tolist(), progressive[order].tolist())
+    standings = []
+    for place, (player_id, games_played, points, bh, median_bh, sb, prog) in enumerate(columns, start=1):
+        name, rating = info.get(player_id, (None, None))
+        standings.append({
+            'place': place,
+            'player_id': player_id,
+            'name': name,
+            'rating': rating,
+            'games_played': games_played,
+            'score': points,
+            'buchholz': bh,
+            'median_buchholz': median_bh,
+            'sonneborn_berger': sb,
+            'progressive': prog
+        })
+    return standings
@@ -0,0 +1,213 @@
+"""
+Business: Каталог турниров с фильтрами и постраничной выдачей по ключу (start_date, id)
+Args: параметры запроса status, tournament_type, age_category, time_control, location,
+      date_from, date_to, upcoming, order, limit, cursor
+Returns: страница турниров, курсор следующей страницы и оценка общего числа
+
+status и tournament_type принимают несколько значений через запятую. Без date_from
+и date_to показываются только предстоящие турниры (upcoming=1), как раньше;
+upcoming=0 снимает это ограничение, order=desc выдаёт турниры от поздних к ранним.
+Общее число считается только для первой страницы: точно, если план запроса
+обещает не больше TOURNAMENTS_EXACT_COUNT_LIMIT строк, иначе берётся оценка планировщика.
+"""
+
+import base64
+import json
+import os
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+TOURNAMENTS_PAGE_SIZE = 10
+TOURNAMENTS_PAGE_MAX = 100
+TOURNAMENTS_EXACT_COUNT_LIMIT = int(os.environ.get('TOURNAMENTS_EXACT_COUNT_LIMIT', '1000'))
+
+STATUSES = {'planned', 'registration', 'active', 'completed', 'cancelled'}
+TOURNAMENT_TYPES = {'swiss', 'round_robin', 'knockout', 'arena'}
+
+# Фильтры точного совпадения: параметр запроса -> выражение колонки
+EQUALITY_FILTERS = {
+    'age_category': 't.age_category',
+    'time_control': 't.time_control',
+    'location': 'lower(t.location)'
+}
+
+
+def encode_cursor(start_date: date, tournament_id: int) -> str:
+    raw = json.dumps([start_date.isoformat(), tournament_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[date, int]]:
+    """(start_date, id) последнего турнира предыдущей страницы; ValueError - курсор повреждён"""
+    if not token:
+        return None
+    try:
+        start_date, tournament_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return date.fromisoformat(start_date), int(tournament_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def _values(params: Dict[str, str], name: str, allowed: set) -> Optional[List[str]]:
+    raw = params.get(name)
+    if not raw:
+        return None
+    values = sorted({value.strip() for value in raw.split(',') if value.strip()})
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return values or None
+
+
+def _date(params: Dict[str, str], name: str) -> Optional[date]:
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def parse_filters(params: Dict[str, str]) -> Dict[str, Any]:
+    """Нормализованные фильтры из query string; ValueError с текстом для ответа 400"""
+    filters: Dict[str, Any] = {
+        'status': _values(params, 'status', STATUSES),
+        'tournament_type': _values(params, 'tournament_type', TOURNAMENT_TYPES),
+        'date_from': _date(params, 'date_from'),
+        'date_to': _date(params, 'date_to')
+    }
+    for name in EQUALITY_FILTERS:
+        value = (params.get(name) or '').strip()
+        filters[name] = (value.lower() if name == 'location' else value) or None
+
+    upcoming = params.get('upcoming')
+    if upcoming is None:
+        filters['upcoming'] = filters['date_from'] is None and filters['date_to'] is None
+    elif upcoming in ('0', '1', 'true', 'false'):
+        filters['upcoming'] = upcoming in ('1', 'true')
+    else:
+        raise ValueError('upcoming must be 0 or 1')
+
+    order = params.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    filters['order'] = order
+
+    try:
+        limit = int(params.get('limit', TOURNAMENTS_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    filters['limit'] = max(1, min(limit, TOURNAMENTS_PAGE_MAX))
+    filters['after'] = decode_cursor(params.get('cursor'))
+    return filters
+
+
+def cache_key(filters: Dict[str, Any]) -> str:
+    """Ключ кэша ответа: одинаковые по смыслу запросы дают один ключ"""
+    return json.dumps(filters, sort_keys=True, default=str)
+
+
+def _where(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    conditions: List[str] = []
+    params: List[Any] = []
+    for name in ('status', 'tournament_type'):
+        if filters[name]:
+            conditions.append(f't.{name} = ANY(%s)')
+            params.append(filters[name])
+    for name, column in EQUALITY_FILTERS.items():
+        if filters[name] is not None:
+            conditions.append(f'{column} = %s')
+            params.append(filters[name])
+    if filters['upcoming']:
+        conditions.append('t.start_date >= CURRENT_DATE')
+    if filters['date_from'] is not None:
+        conditions.append('t.start_date >= %s')
+        params.append(filters['date_from'])
+    if filters['date_to'] is not None:
+        conditions.append('t.start_date <= %s')
+        params.append(filters['date_to'])
+    return conditions, params
+
+
+def load_page(cursor, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Страница каталога: турниры, курсор следующей страницы и (на первой странице) общее число"""
+    conditions, params = _where(filters)
+    base_conditions, base_params = list(conditions), list(params)
+    descending = filters['order'] == 'desc'
+    if filters['after'] is not None:
+        conditions.append(f"(t.start_date, t.id) {'<' if descending else '>'} (%s, %s)")
+        params.extend(filters['after'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = 'DESC' if descending else 'ASC'
+    limit = filters['limit']
+
+    cursor.execute(f'''
+        SELECT t.id, t.name, t.description, t.start_date, t.end_date,
+               t.max_participants, t.entry_fee, t.prize_fund,
+               t.tournament_type, t.status, t.location, t.created_at,
+               t.time_control, t.age_category, t.start_time_msk, t.rounds,
+               t.registered_count
+        FROM t_p67413675_chess_tournament_org.tournaments t
+        {where}
+        ORDER BY t.start_date {direction}, t.id {direction}
+        LIMIT %s
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows[-1][3] is not None:
+            next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+    tournaments = [{
+        'id': row[0],
+        'name': row[1] or 'Турнир',
+        'description': row[2] or '',
+        'start_date': row[3].isoformat() if row[3] else None,
+        'end_date': row[4].isoformat() if row[4] else None,
+        'max_participants': row[5] or 100,
+        'registered_count': row[16],
+        'current_participants': row[16],
+        'entry_fee': float(row[6]) if row[6] else 0,
+        'prize_fund': float(row[7]) if row[7] else 0,
+        'tournament_type': row[8] or 'swiss',
+        'status': row[9] or 'planned',
+        'location': row[10] or 'Онлайн',
+        'created_at': row[11].isoformat() if row[11] else None,
+        'time_control': row[12] or '90+30',
+        'age_category': row[13] or 'открытая',
+        'start_time_msk': str(row[14]) if row[14] else '10:00',
+        'rounds': row[15] or 9
+    } for row in rows]
+
+    page: Dict[str, Any] = {
+        'tournaments': tournaments,
+        'count': len(tournaments),
+        'next_cursor': next_cursor
+    }
+    if filters['after'] is None:
+        if next_cursor is None:
+            # Вся выборка поместилась на страницу - число известно без запросов
+            total, exact = len(tournaments), True
+        else:
+            total, exact = count_tournaments(cursor, base_conditions, base_params)
+        page['total'] = total
+        page['total_exact'] = exact
+    return page
+
+
+def count_tournaments(cursor, conditions: List[str], params: List[Any]) -> Tuple[int, bool]:
+    """Оценка числа строк из плана запроса; точный COUNT, только если строк заведомо немного"""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f'SELECT 1 FROM t_p67413675_chess_tournament_org.tournaments t {where}'
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate > TOURNAMENTS_EXACT_COUNT_LIMIT:
+        return estimate, False
+    cursor.execute(f'SELECT COUNT(*) FROM ({sql}) filtered', params)
+    return cursor.fetchone()[0], True
@@ -1,11 +1,16 @@
 import json
 import os
+import time
+
+import response_cache
+from catalogue import cache_key, load_page, parse_filters
+from db_pool import acquire_connection, release_connection
 
 def handler(event, context):
     '''
     Business: Get tournaments from database
     Args: event, context
-    Returns: HTTP response with tournaments list
+    Returns: HTTP response with a page of the tournament catalogue (cached in memory, ETag / 304 Not Modified)
     '''
     method = event.get('httpMethod', 'GET')
     
@@ -16,7 +21,7 @@ def handler(event, context):
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,75 +37,66 @@ def handler(event, context):
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
+    started = time.perf_counter()
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
     try:
-        import psycopg2
-        
-        print(f"Connecting to database...")
-        # Connect to database
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor()
-        print(f"Connected successfully")
-        
-        # Query tournaments with real registration count
-        cursor.execute('''
-            SELECT t.id, t.name, t.description, t.start_date, t.end_date, 
-                   t.max_participants, t.entry_fee, t.prize_fund, 
-                   t.tournament_type, t.status, t.location, t.created_at,
-                   t.time_control, t.age_category, t.start_time_msk, t.rounds,
-                   COALESCE(reg_count.registered_count, 0) as registered_count
-            FROM t_p67413675_chess_tournament_org.tournaments t
-            LEFT JOIN (
-                SELECT tournament_id, COUNT(*) as registered_count
-                FROM t_p67413675_chess_tournament_org.tournament_registrations
-                WHERE status = 'registered'
-                GROUP BY tournament_id
-            ) reg_count ON t.id = reg_count.tournament_id
-            WHERE t.start_date >= CURRENT_DATE
-            ORDER BY t.start_date ASC 
-            LIMIT 10
-        ''')
-        
-        rows = cursor.fetchall()
-        print(f"Found {len(rows)} tournaments")
-        
-        # Convert to list of dictionaries
-        tournaments = []
-        for row in rows:
-            tournament = {
-                'id': row[0],
-                'name': row[1] or 'Турнир',
-                'description': row[2] or '',
-                'start_date': row[3].isoformat() if row[3] else None,
-                'end_date': row[4].isoformat() if row[4] else None,
-                'max_participants': row[5] or 100,
-                'registered_count': row[16],  # Real count from database
-                'current_participants': row[16],  # Same as registered_count
-                'entry_fee': float(row[6]) if row[6] else 0,
-                'prize_fund': float(row[7]) if row[7] else 0,
-                'tournament_type': row[8] or 'swiss',
-                'status': row[9] or 'planned',
-                'location': row[10] or 'Онлайн',
-                'created_at': row[11].isoformat() if row[11] else None,
-                'time_control': row[12] or '90+30',
-                'age_category': row[13] or 'открытая',
-                'start_time_msk': str(row[14]) if row[14] else '10:00',
-                'rounds': row[15] or 9
-            }
-            tournaments.append(tournament)
-        
-        cursor.close()
-        conn.close()
-        
+        filters = parse_filters(event.get('queryStringParameters') or {})
+    except ValueError as e:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'tournaments': tournaments,
-                'count': len(tournaments)
-            })
+            'body': json.dumps({'error': str(e)})
+        }
+    key = cache_key(filters)
+    conn = None
+    cursor = None
+    
+    try:
+        # Fresh in-memory response: no database round trip at all
+        entry = response_cache.fresh_entry(key)
+        outcome = response_cache.HIT
+        if entry is None:
+            # Connection from the module-level pool, reused across warm invocations
+            conn = acquire_connection()
+            cursor = conn.cursor()
+            
+            # Version is read before the data, so a concurrent change is never cached as current
+            version, day = response_cache.current_version(cursor)
+            entry = response_cache.revalidate(key, version, day)
+            outcome = response_cache.REVALIDATED
+            if entry is None:
+                page = load_page(cursor, filters)
+                print(f"Found {page['count']} tournaments")
+                entry = response_cache.store(key, json.dumps(page), version, day)
+                outcome = response_cache.MISS
+        
+        not_modified = response_cache.etag_matches(if_none_match, entry.etag)
+        elapsed = time.perf_counter() - started
+        response_cache.record(outcome, not_modified, elapsed)
+        response_headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag, X-Cache, Server-Timing',
+            'Cache-Control': 'no-cache',
+            'ETag': entry.etag,
+            'X-Cache': outcome,
+            'Server-Timing': f'cache;desc="{outcome}";dur={elapsed * 1000:.3f}'
+        }
+        if not_modified:
+            return {
+                'statusCode': 304,
+                'headers': response_headers,
+                'body': ''
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'body': entry.body
         }
         
     except Exception as e:
@@ -112,4 +108,11 @@ def handler(event, context):
                 'Access-Control-Allow-Origin': '*'
             },
             'body': json.dumps({'error': f'Database error: {str(e)}'})
-        }
\ No newline at end of file
+        }
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            release_connection(conn)
+
@@ -0,0 +1,133 @@
+"""
+Business: Кэш ответов каталога турниров в памяти тёплого экземпляра с ETag
+Args: TOURNAMENTS_CACHE_TTL (секунды без обращения к БД), TOURNAMENTS_CACHE_SIZE (число разных
+      запросов в кэше), TOURNAMENTS_CACHE_STATS_LOG_EVERY из окружения
+Returns: тело ответа, его ETag и статистика попаданий
+
+Ответы хранятся по ключу нормализованных параметров запроса (LRU).
+Первые TOURNAMENTS_CACHE_TTL секунд ответ отдаётся без БД. Потом проверяется версия
+в cache_versions (её увеличивает триггер на tournaments, в том числе при смене registered_count)
+и текущая дата: если обе не изменились, ответ продлевается без повторного запроса турниров.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+TOURNAMENTS_CACHE_TTL = float(os.environ.get('TOURNAMENTS_CACHE_TTL', '5'))
+TOURNAMENTS_CACHE_SIZE = int(os.environ.get('TOURNAMENTS_CACHE_SIZE', '128'))
+TOURNAMENTS_CACHE_STATS_LOG_EVERY = int(os.environ.get('TOURNAMENTS_CACHE_STATS_LOG_EVERY', '100'))
+
+CACHE_NAME = 'tournaments'
+
+# Исходы запроса: из памяти, из памяти после сверки версии, заново из БД
+HIT, REVALIDATED, MISS = 'HIT', 'REVALIDATED', 'MISS'
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'version', 'day', 'stored_at')
+
+    def __init__(self, body: str, version: Optional[int], day: Any):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+        self.version = version
+        self.day = day
+        self.stored_at = time.monotonic()
+
+
+_entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+
+_stats: Dict[str, Any] = {
+    'requests': 0,
+    'hits': 0,
+    'revalidated': 0,
+    'misses': 0,
+    'not_modified': 0,
+    'cached_seconds_total': 0.0,
+    'cached_seconds_max': 0.0,
+    'miss_seconds_total': 0.0,
+}
+
+
+def fresh_entry(key: str) -> Optional[CachedResponse]:
+    """Ответ, которому меньше TOURNAMENTS_CACHE_TTL секунд: отдаётся без обращения к БД"""
+    entry = _entries.get(key)
+    if entry is not None and time.monotonic() - entry.stored_at < TOURNAMENTS_CACHE_TTL:
+        _entries.move_to_end(key)
+        return entry
+    return None
+
+
+def current_version(cursor) -> Tuple[Optional[int], Any]:
+    """Версия списка турниров и дата БД (список зависит от CURRENT_DATE)"""
+    cursor.execute('''
+        SELECT (SELECT version FROM t_p67413675_chess_tournament_org.cache_versions WHERE name = %s),
+               CURRENT_DATE
+    ''', (CACHE_NAME,))
+    return cursor.fetchone()
+
+
+def revalidate(key: str, version: Optional[int], day: Any) -> Optional[CachedResponse]:
+    """Устаревший по TTL ответ продлевается, если версия и дата не изменились"""
+    entry = _entries.get(key)
+    if entry is None or version is None or entry.version != version or entry.day != day:
+        return None
+    entry.stored_at = time.monotonic()
+    _entries.move_to_end(key)
+    return entry
+
+
+def store(key: str, body: str, version: Optional[int], day: Any) -> CachedResponse:
+    """Запоминает ответ; версию нужно прочитать до запроса данных, иначе можно пропустить изменение"""
+    entry = CachedResponse(body, version, day)
+    if version is not None:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > TOURNAMENTS_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return entry
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение If-None-Match по RFC 7232: список тегов или *, префикс W/ не учитывается"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def record(outcome: str, not_modified: bool, seconds: float) -> None:
+    _stats['requests'] += 1
+    _stats['not_modified'] += not_modified
+    if outcome == MISS:
+        _stats['misses'] += 1
+        _stats['miss_seconds_total'] += seconds
+    else:
+        _stats['hits' if outcome == HIT else 'revalidated'] += 1
+        _stats['cached_seconds_total'] += seconds
+        _stats['cached_seconds_max'] = max(_stats['cached_seconds_max'], seconds)
+    if TOURNAMENTS_CACHE_STATS_LOG_EVERY > 0 and _stats['requests'] % TOURNAMENTS_CACHE_STATS_LOG_EVERY == 0:
+        print(f"Tournaments cache stats: {stats()}")
+
+
+def stats() -> Dict[str, Any]:
+    """Доля ответов из памяти и время их выдачи в сравнении с запросом к БД"""
+    snapshot = dict(_stats)
+    requests = snapshot['requests']
+    cached = snapshot['hits'] + snapshot['revalidated']
+    snapshot['hit_ratio'] = round(cached / requests, 4) if requests else 0.0
+    snapshot['cached_ms_avg'] = round(snapshot['cached_seconds_total'] * 1000 / cached, 3) if cached else 0.0
+    snapshot['cached_ms_max'] = round(snapshot['cached_seconds_max'] * 1000, 3)
+    snapshot['miss_ms_avg'] = round(snapshot['miss_seconds_total'] * 1000 / snapshot['misses'], 3) if snapshot['misses'] else 0.0
+    snapshot['ttl_seconds'] = TOURNAMENTS_CACHE_TTL
+    snapshot['entries'] = len(_entries)
+    return snapshot
@@ -0,0 +1,74 @@
+"""
+Business: Бенчмарк жеребьёвки швейцарской системы на синтетических турнирах
+Args: размеры полей и число туров в командной строке (по умолчанию 100, 1000, 5000 и 11 туров)
+Returns: время жеребьёвки каждого тура и проверка отсутствия повторных встреч
+
+Запуск: python bench_swiss_pairing.py [--rounds 11] [100 1000 5000]
+"""
+
+import random
+import sys
+import time
+from typing import Dict, List
+
+from swiss_pairing import SwissPlayer, pair_round
+
+
+def simulate(field_size: int, rounds: int, seed: int = 2024) -> List[float]:
+    """Играет турнир со случайными результатами (с учётом рейтинга) и возвращает время жеребьёвки туров"""
+    rnd = random.Random(seed)
+    players: Dict[int, SwissPlayer] = {
+        player_id: SwissPlayer(player_id, rnd.randint(1000, 2700))
+        for player_id in range(1, field_size + 1)
+    }
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        boards, bye = pair_round(list(players.values()))
+        timings.append(time.perf_counter() - started)
+
+        seen = set()
+        for white_id, black_id in boards:
+            white, black = players[white_id], players[black_id]
+            assert white_id not in seen and black_id not in seen, 'игрок в двух парах'
+            assert black_id not in white.opponents, 'повторная встреча'
+            seen.update((white_id, black_id))
+            white.opponents.add(black_id)
+            black.opponents.add(white_id)
+            white.colors.append('w')
+            black.colors.append('b')
+
+            expected = 1.0 / (1.0 + 10 ** ((black.rating - white.rating) / 400.0))
+            roll = rnd.random()
+            if roll < expected * 0.8:
+                white.score += 1.0
+            elif roll < expected * 0.8 + 0.2:
+                white.score += 0.5
+                black.score += 0.5
+            else:
+                black.score += 1.0
+        if bye:
+            players[bye].score += 1.0
+            players[bye].had_bye = True
+            seen.add(bye)
+        assert len(seen) == field_size, 'не все участники получили пару или bye'
+    return timings
+
+
+def main(argv: List[str]) -> None:
+    rounds = 11
+    if '--rounds' in argv:
+        index = argv.index('--rounds')
+        rounds = int(argv[index + 1])
+        argv = argv[:index] + argv[index + 2:]
+    sizes = [int(arg) for arg in argv] or [100, 1000, 5000]
+
+    print(f"{'участников':>10} {'туров':>6} {'среднее, мс':>12} {'худшее, мс':>12} {'всего, с':>9}")
+    for size in sizes:
+        timings = simulate(size, rounds)
+        print(f"{size:>10} {rounds:>6} {sum(timings) / len(timings) * 1000:>12.1f} "
+              f"{max(timings) * 1000:>12.1f} {sum(timings):>9.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
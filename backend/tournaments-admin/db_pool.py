@@ -0,0 +1,218 @@
+"""
+Business: Пул подключений к PostgreSQL, переживающий тёплые вызовы функции
+Args: DATABASE_URL, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_HEALTHCHECK_IDLE из окружения
+Returns: подключения psycopg2, которые возвращаются в пул вместо закрытия
+
+Модуль одинаков во всех функциях backend/: каждая функция деплоится
+отдельно, поэтому файл лежит рядом с index.py каждой из них.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolExhaustedError(Exception):
+    """Все подключения заняты дольше допустимого времени ожидания"""
+
+
+class ConnectionPool:
+    """Ограниченный пул подключений с проверкой здоровья и сбросом транзакций"""
+
+    def __init__(self, dsn: str, max_size: int = 4, acquire_timeout: float = 5.0,
+                 healthcheck_idle: float = 30.0):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_idle = healthcheck_idle
+
+        self._idle: List[Any] = []
+        self._idle_since: Dict[int, float] = {}
+        self._in_use = 0
+        self._lock = threading.Condition()
+
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'rollbacks': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def acquire(self) -> Any:
+        """Выдаёт живое подключение: из пула или новое, если лимит позволяет"""
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+
+        with self._lock:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError('Пул подключений к БД исчерпан')
+                self._lock.wait(remaining)
+
+            conn = self._idle.pop() if self._idle else None
+            idle_since = self._idle_since.pop(id(conn), None) if conn is not None else None
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = psycopg2.connect(self.dsn)
+                self._stats['created'] += 1
+            else:
+                self._stats['reused'] += 1
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        waited = time.monotonic() - started
+        self._stats['acquired'] += 1
+        self._stats['wait_seconds_total'] += waited
+        self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Возвращает подключение в пул, откатывая незавершённую транзакцию"""
+        if conn is None:
+            return
+
+        if not discard:
+            discard = not self._reset(conn)
+
+        with self._lock:
+            self._in_use -= 1
+            if discard or len(self._idle) >= self.max_size:
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append(conn)
+                self._idle_since[id(conn)] = time.monotonic()
+                conn = None
+            self._lock.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Подключение на время блока with; при ошибке транзакция откатывается"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Снимок статистики: ожидание выдачи и доля повторно использованных подключений"""
+        with self._lock:
+            in_use = self._in_use
+            idle = len(self._idle)
+        snapshot = dict(self._stats)
+        acquired = snapshot['acquired']
+        snapshot['reuse_ratio'] = round(snapshot['reused'] / acquired, 4) if acquired else 0.0
+        snapshot['wait_ms_avg'] = round(snapshot['wait_seconds_total'] * 1000 / acquired, 3) if acquired else 0.0
+        snapshot['wait_ms_max'] = round(snapshot['wait_seconds_max'] * 1000, 3)
+        snapshot['in_use'] = in_use
+        snapshot['idle'] = idle
+        snapshot['max_size'] = self.max_size
+        return snapshot
+
+    def _is_healthy(self, conn: Any, idle_since: Optional[float]) -> bool:
+        """Закрытые подключения отбрасываем, долго простоявшие проверяем SELECT 1"""
+        if conn.closed:
+            return False
+        if idle_since is not None and time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reset(self, conn: Any) -> bool:
+        """Приводит подключение в исходное состояние; False - подключение надо закрыть"""
+        if conn.closed:
+            return False
+        try:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+                self._stats['rollbacks'] += 1
+            if conn.autocommit:
+                conn.autocommit = False
+            conn.cursor_factory = None
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: Any) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_STATS_LOG_EVERY = int(os.environ.get('DB_POOL_STATS_LOG_EVERY', '100'))
+
+
+def get_pool() -> ConnectionPool:
+    """Пул уровня модуля: создаётся при первом вызове и живёт, пока жив контейнер"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                database_url = os.environ.get('DATABASE_URL')
+                if not database_url:
+                    raise Exception('DATABASE_URL не настроен')
+                _pool = ConnectionPool(
+                    database_url,
+                    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '4')),
+                    acquire_timeout=float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '5')),
+                    healthcheck_idle=float(os.environ.get('DB_POOL_HEALTHCHECK_IDLE', '30')),
+                )
+    return _pool
+
+
+def acquire_connection() -> Any:
+    """Берёт подключение из общего пула"""
+    pool = get_pool()
+    conn = pool.acquire()
+    if _STATS_LOG_EVERY > 0 and pool.stats()['acquired'] % _STATS_LOG_EVERY == 0:
+        print(f"DB pool stats: {pool.stats()}")
+    return conn
+
+
+def release_connection(conn: Any, discard: bool = False) -> None:
+    """Возвращает подключение в общий пул"""
+    if conn is not None:
+        get_pool().release(conn, discard=discard)
+
+
+@contextmanager
+def pooled_connection() -> Iterator[Any]:
+    """with pooled_connection() as conn: ... - подключение вернётся в пул само"""
+    conn = acquire_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
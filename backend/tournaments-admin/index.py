@@ -7,11 +7,21 @@ Returns: HTTP response dict
 
 import json
 import os
-import psycopg2
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from datetime import datetime, date
 
+from psycopg2.extras import execute_values
+
+from db_pool import acquire_connection, release_connection
+from session_tokens import is_session_active, verify_token
+from schedules import knockout_first_round, knockout_next_round, round_robin_schedule
+from swiss_pairing import SwissPlayer, pair_round
+from text_search import match_sql, next_cursor, parse_search
+
+# Роли, которым доступна функция (администратор или модератор)
+ADMIN_ROLES = ('admin', 'moderator')
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -32,24 +42,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     headers = event.get('headers', {})
     session_token = headers.get('X-Session-Token') or headers.get('x-session-token')
     
-    # Проверяем права администратора
-    admin_user = check_admin_rights(session_token)
-    if not admin_user:
-        return {
-            'statusCode': 403,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Доступ запрещен. Требуются права администратора'})
-        }
-    
+    forbidden_response = {
+        'statusCode': 403,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Доступ запрещен. Требуются права администратора'})
+    }
+    conn = None
     try:
+        # Подпись, срок и роль проверяются по токену без обращения к БД
+        claims = verify_token(session_token)
+        if not claims or claims.get('role') not in ADMIN_ROLES:
+            return forbidden_response
+        
+        # Одно подключение из пула на весь запрос: и на проверку отзыва сессии, и на работу
+        conn = get_db_connection()
+        
+        # Проверяем, что сессия не отозвана
+        admin_user = check_admin_rights(conn, claims)
+        if not admin_user:
+            return forbidden_response
+        
         if method == 'GET':
-            return get_tournaments()
+            query_params = event.get('queryStringParameters', {}) or {}
+            if query_params.get('q'):
+                return search_tournaments(conn, query_params)
+            return get_tournaments(conn)
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
-            return create_tournament(body_data, admin_user['id'])
+            if body_data.get('action') == 'pair_round':
+                return pair_swiss_round(conn, body_data)
+            if body_data.get('action') == 'generate_schedule':
+                return generate_schedule(conn, body_data)
+            if body_data.get('action') == 'advance_knockout':
+                return advance_knockout(conn, body_data)
+            return create_tournament(conn, body_data, admin_user['id'])
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
-            return update_tournament(body_data)
+            return update_tournament(conn, body_data)
         elif method == 'DELETE':
             query_params = event.get('queryStringParameters', {}) or {}
             tournament_id = query_params.get('id')
@@ -59,7 +88,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'headers': {'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({'error': 'Не указан ID турнира'})
                 }
-            return delete_tournament(int(tournament_id))
+            return delete_tournament(conn, int(tournament_id))
         else:
             return {
                 'statusCode': 405,
@@ -72,115 +101,87 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': f'Ошибка сервера: {str(e)}'})
         }
+    finally:
+        release_db_connection(conn)
 
 def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise Exception('DATABASE_URL не настроен')
-    
-    return psycopg2.connect(database_url)
+    """Получение подключения к базе данных из пула, живущего между тёплыми вызовами"""
+    conn = acquire_connection()
+    return conn
 
-def check_admin_rights(session_token: Optional[str]) -> Optional[Dict[str, Any]]:
-    """Проверка прав администратора по токену сессии"""
-    if not session_token:
-        return None
-    
+def release_db_connection(conn) -> None:
+    """Возврат подключения в пул (незавершённая транзакция откатывается)"""
+    release_connection(conn)
+
+def check_admin_rights(conn, claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Проверка, что сессия подписанного токена не отозвана (кэш, при промахе - запрос)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Получаем пользователя по токену сессии
-        cursor.execute("""
-            SELECT u.id, u.username, u.email, u.full_name, u.role, u.user_type
-            FROM t_p67413675_chess_tournament_org.users u
-            JOIN t_p67413675_chess_tournament_org.user_sessions s ON u.id = s.user_id
-            WHERE s.session_token = %s AND s.expires_at > NOW()
-        """, (session_token,))
-        
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        # Проверяем, что пользователь администратор или модератор
-        if user and user[4] in ['admin', 'moderator']:  # role is at index 4
-            return {
-                'id': user[0],
-                'username': user[1], 
-                'email': user[2],
-                'full_name': user[3],
-                'role': user[4],
-                'user_type': user[5]
-            }
-        
-        return None
+        if not is_session_active(conn, claims):
+            return None
+        return {'id': claims['uid'], 'role': claims['role']}
     except Exception:
+        conn.rollback()
         return None
 
-def get_tournaments() -> Dict[str, Any]:
-    """Получение списка всех турниров с реальным подсчётом регистраций"""
-    conn = get_db_connection()
+TOURNAMENT_LIST_COLUMNS = """
+    t.id,
+    t.name,
+    t.description,
+    t.start_date,
+    t.end_date,
+    t.location,
+    t.max_participants,
+    t.registration_deadline,
+    t.entry_fee,
+    t.prize_fund,
+    t.tournament_type,
+    t.time_control,
+    t.rounds,
+    t.status,
+    t.created_at,
+    t.updated_at,
+    u.full_name as created_by_name,
+    t.registered_count
+"""
+
+def serialize_tournament(row) -> Dict[str, Any]:
+    """Строка с колонками TOURNAMENT_LIST_COLUMNS в dict для ответа"""
+    return {
+        'id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'start_date': row[3].isoformat() if row[3] else None,
+        'end_date': row[4].isoformat() if row[4] else None,
+        'location': row[5],
+        'max_participants': row[6],
+        'registration_deadline': row[7].isoformat() if row[7] else None,
+        'entry_fee': float(row[8]) if row[8] else 0,
+        'prize_fund': float(row[9]) if row[9] else 0,
+        'tournament_type': row[10],
+        'time_control': row[11],
+        'rounds': row[12],
+        'status': row[13],
+        'created_at': row[14].isoformat() if row[14] else None,
+        'updated_at': row[15].isoformat() if row[15] else None,
+        'created_by_name': row[16],
+        'registered_count': row[17]
+    }
+
+def get_tournaments(conn) -> Dict[str, Any]:
+    """Получение списка всех турниров; registered_count поддерживает триггер на регистрациях"""
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT 
-            t.id,
-            t.name,
-            t.description,
-            t.start_date,
-            t.end_date,
-            t.location,
-            t.max_participants,
-            t.registration_deadline,
-            t.entry_fee,
-            t.prize_fund,
-            t.tournament_type,
-            t.time_control,
-            t.rounds,
-            t.status,
-            t.created_at,
-            t.updated_at,
-            u.full_name as created_by_name,
-            COALESCE(reg_count.registered_count, 0) as registered_count
+    cursor.execute(f"""
+        SELECT {TOURNAMENT_LIST_COLUMNS}
         FROM t_p67413675_chess_tournament_org.tournaments t
         LEFT JOIN t_p67413675_chess_tournament_org.users u ON t.created_by = u.id
-        LEFT JOIN (
-            SELECT tournament_id, COUNT(*) as registered_count
-            FROM t_p67413675_chess_tournament_org.tournament_registrations
-            WHERE status = 'registered'
-            GROUP BY tournament_id
-        ) reg_count ON t.id = reg_count.tournament_id
         ORDER BY t.created_at DESC
     """)
     
     tournaments = cursor.fetchall()
     cursor.close()
-    conn.close()
     
-    # Преобразуем данные из tuple в dict
-    tournaments_list = []
-    for row in tournaments:
-        tournament_dict = {
-            'id': row[0],
-            'name': row[1],
-            'description': row[2],
-            'start_date': row[3].isoformat() if row[3] else None,
-            'end_date': row[4].isoformat() if row[4] else None,
-            'location': row[5],
-            'max_participants': row[6],
-            'registration_deadline': row[7].isoformat() if row[7] else None,
-            'entry_fee': float(row[8]) if row[8] else 0,
-            'prize_fund': float(row[9]) if row[9] else 0,
-            'tournament_type': row[10],
-            'time_control': row[11],
-            'rounds': row[12],
-            'status': row[13],
-            'created_at': row[14].isoformat() if row[14] else None,
-            'updated_at': row[15].isoformat() if row[15] else None,
-            'created_by_name': row[16],
-            'registered_count': row[17]
-        }
-        tournaments_list.append(tournament_dict)
+    tournaments_list = [serialize_tournament(row) for row in tournaments]
     
     return {
         'statusCode': 200,
@@ -192,7 +193,57 @@ def get_tournaments() -> Dict[str, Any]:
         })
     }
 
-def create_tournament(data: Dict[str, Any], created_by: int) -> Dict[str, Any]:
+def search_tournaments(conn, params: Dict[str, str]) -> Dict[str, Any]:
+    """Поиск турниров по названию, месту и описанию с ранжированием и постраничной выдачей"""
+    try:
+        search = parse_search(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    condition, score = match_sql('t', ['name'])
+    query_params = {'q': search['q'], 'tsquery': search['tsquery'], 'limit': search['limit'] + 1}
+    after = ''
+    if search['after']:
+        after = 'WHERE (r.score, r.id) < (%(after_score)s, %(after_id)s)'
+        query_params['after_score'], query_params['after_id'] = search['after']
+    
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT r.* FROM (
+            SELECT {TOURNAMENT_LIST_COLUMNS}, {score} AS score
+            FROM t_p67413675_chess_tournament_org.tournaments t
+            LEFT JOIN t_p67413675_chess_tournament_org.users u ON t.created_by = u.id
+            WHERE {condition}
+        ) r
+        {after}
+        ORDER BY r.score DESC, r.id DESC
+        LIMIT %(limit)s
+    """, query_params)
+    rows, cursor_token = next_cursor(cursor.fetchall(), search['limit'], lambda row: row[18], lambda row: row[0])
+    cursor.close()
+    
+    tournaments_list = []
+    for row in rows:
+        tournament = serialize_tournament(row)
+        tournament['score'] = row[18]
+        tournaments_list.append(tournament)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'tournaments': tournaments_list,
+            'count': len(tournaments_list),
+            'next_cursor': cursor_token
+        })
+    }
+
+def create_tournament(conn, data: Dict[str, Any], created_by: int) -> Dict[str, Any]:
     """Создание нового турнира"""
     # Обязательные поля
     required_fields = ['name', 'start_date', 'end_date']
@@ -222,7 +273,6 @@ def create_tournament(data: Dict[str, Any], created_by: int) -> Dict[str, Any]:
         'created_by': created_by
     }
     
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Вставляем новый турнир
@@ -256,7 +306,6 @@ def create_tournament(data: Dict[str, Any], created_by: int) -> Dict[str, Any]:
     
     new_tournament = cursor.fetchone()
     cursor.close()
-    conn.close()
     
     if new_tournament:
         tournament_dict = {
@@ -296,7 +345,7 @@ def create_tournament(data: Dict[str, Any], created_by: int) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Ошибка при создании турнира'})
         }
 
-def update_tournament(data: Dict[str, Any]) -> Dict[str, Any]:
+def update_tournament(conn, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обновление данных турнира"""
     tournament_id = data.get('id')
     if not tournament_id:
@@ -342,7 +391,6 @@ def update_tournament(data: Dict[str, Any]) -> Dict[str, Any]:
     update_fields.append("updated_at = NOW()")
     update_values.append(tournament_id)  # для WHERE условия
     
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Обновляем турнир
@@ -358,7 +406,6 @@ def update_tournament(data: Dict[str, Any]) -> Dict[str, Any]:
     
     conn.commit()
     cursor.close()
-    conn.close()
     
     if updated_tournament:
         tournament_dict = {
@@ -384,9 +431,8 @@ def update_tournament(data: Dict[str, Any]) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Турнир не найден'})
         }
 
-def delete_tournament(tournament_id: int) -> Dict[str, Any]:
+def delete_tournament(conn, tournament_id: int) -> Dict[str, Any]:
     """Удаление турнира"""
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Проверяем, существует ли турнир
@@ -398,7 +444,6 @@ def delete_tournament(tournament_id: int) -> Dict[str, Any]:
     tournament = cursor.fetchone()
     if not tournament:
         cursor.close()
-        conn.close()
         return {
             'statusCode': 404,
             'headers': {'Access-Control-Allow-Origin': '*'},
@@ -408,7 +453,6 @@ def delete_tournament(tournament_id: int) -> Dict[str, Any]:
     # Запрещаем удаление активных турниров
     if tournament[2] == 'active':  # status is at index 2
         cursor.close()
-        conn.close()
         return {
             'statusCode': 403,
             'headers': {'Access-Control-Allow-Origin': '*'},
@@ -424,7 +468,6 @@ def delete_tournament(tournament_id: int) -> Dict[str, Any]:
     
     conn.commit()
     cursor.close()
-    conn.close()
     
     return {
         'statusCode': 200,
@@ -433,4 +476,427 @@ def delete_tournament(tournament_id: int) -> Dict[str, Any]:
             'success': True,
             'message': f'Турнир "{tournament[1]}" отменен'  # name is at index 1
         })
-    }
\ No newline at end of file
+    }
+
+def load_tournament_entrants(cursor, tournament_id: int) -> List[Tuple[int, int]]:
+    """Игроки (id в players, рейтинг) зарегистрированных участников в порядке посева"""
+    # Зарегистрированным пользователям без записи в players создаём её одним запросом
+    cursor.execute("""
+        INSERT INTO t_p67413675_chess_tournament_org.players (name, user_id)
+        SELECT u.full_name, u.id
+        FROM t_p67413675_chess_tournament_org.tournament_registrations r
+        JOIN t_p67413675_chess_tournament_org.users u ON u.id = r.user_id
+        WHERE r.tournament_id = %s AND r.status = 'registered'
+          AND NOT EXISTS (
+              SELECT 1 FROM t_p67413675_chess_tournament_org.players p WHERE p.user_id = u.id
+          )
+    """, (tournament_id,))
+    
+    cursor.execute("""
+        SELECT DISTINCT ON (r.user_id) p.id, p.rating
+        FROM t_p67413675_chess_tournament_org.tournament_registrations r
+        JOIN t_p67413675_chess_tournament_org.players p ON p.user_id = r.user_id
+        WHERE r.tournament_id = %s AND r.status = 'registered'
+        ORDER BY r.user_id, p.id
+    """, (tournament_id,))
+    return sorted(((row[0], row[1] or 0) for row in cursor.fetchall()), key=lambda e: (-e[1], e[0]))
+
+def load_swiss_players(cursor, tournament_id: int) -> Dict[int, SwissPlayer]:
+    """Участники турнира с очками, цветами и соперниками по уже сыгранным турам"""
+    players = {player_id: SwissPlayer(player_id, rating)
+               for player_id, rating in load_tournament_entrants(cursor, tournament_id)}
+    
+    cursor.execute("""
+        SELECT white_player_id, black_player_id, result
+        FROM t_p67413675_chess_tournament_org.games
+        WHERE tournament_id = %s
+        ORDER BY round, board
+    """, (tournament_id,))
+    for white_id, black_id, result in cursor.fetchall():
+        white, black = players.get(white_id), players.get(black_id)
+        if white:
+            white.colors.append('w')
+            white.opponents.add(black_id)
+            white.score += 1.0 if result == 'white_wins' else 0.5 if result == 'draw' else 0.0
+        if black:
+            black.colors.append('b')
+            black.opponents.add(white_id)
+            black.score += 1.0 if result == 'black_wins' else 0.5 if result == 'draw' else 0.0
+    
+    cursor.execute("""
+        SELECT player_id, points FROM t_p67413675_chess_tournament_org.tournament_round_byes
+        WHERE tournament_id = %s
+    """, (tournament_id,))
+    for player_id, points in cursor.fetchall():
+        if player_id in players:
+            players[player_id].score += float(points)
+            players[player_id].had_bye = True
+    
+    return players
+
+def pair_swiss_round(conn, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Жеребьёвка следующего тура швейцарского турнира с записью партий одним INSERT"""
+    tournament_id = data.get('tournament_id')
+    if not tournament_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Не указан ID турнира'})
+        }
+    
+    cursor = conn.cursor()
+    
+    # Блокировка строки турнира не даёт двум администраторам жеребить тур одновременно
+    cursor.execute("""
+        SELECT id, tournament_type, rounds, time_control
+        FROM t_p67413675_chess_tournament_org.tournaments
+        WHERE id = %s
+        FOR UPDATE
+    """, (tournament_id,))
+    tournament = cursor.fetchone()
+    if not tournament:
+        cursor.close()
+        return {
+            'statusCode': 404,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Турнир не найден'})
+        }
+    if tournament[1] != 'swiss':
+        cursor.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Жеребьёвка по швейцарской системе доступна только для турниров swiss'})
+        }
+    
+    cursor.execute("""
+        SELECT GREATEST(
+                   (SELECT COALESCE(MAX(round), 0) FROM t_p67413675_chess_tournament_org.games WHERE tournament_id = %s),
+                   (SELECT COALESCE(MAX(round), 0) FROM t_p67413675_chess_tournament_org.tournament_round_byes WHERE tournament_id = %s)
+               ),
+               (SELECT COUNT(*) FROM t_p67413675_chess_tournament_org.games
+                WHERE tournament_id = %s AND result = 'in_progress')
+    """, (tournament_id, tournament_id, tournament_id))
+    last_round, unfinished = cursor.fetchone()
+    if unfinished:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'В туре {last_round} ещё идут партии: {unfinished}'})
+        }
+    next_round = last_round + 1
+    if tournament[2] and next_round > tournament[2]:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Все {tournament[2]} туров уже сыграны'})
+        }
+    
+    players = load_swiss_players(cursor, tournament_id)
+    if len(players) < 2:
+        conn.rollback()
+        cursor.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Для жеребьёвки нужно не меньше двух участников'})
+        }
+    
+    try:
+        boards, bye_player_id = pair_round(list(players.values()))
+    except ValueError as e:
+        conn.rollback()
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    persist_schedule(
+        cursor, tournament_id, tournament[3],
+        [(next_round, board, white_id, black_id) for board, (white_id, black_id) in enumerate(boards, start=1)],
+        [(next_round, bye_player_id, None)] if bye_player_id else [],
+        bye_points=1
+    )
+    conn.commit()
+    cursor.close()
+    
+    return {
+        'statusCode': 201,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'round': next_round,
+            'pairings': [
+                {'board': board, 'white_player_id': white_id, 'black_player_id': black_id}
+                for board, (white_id, black_id) in enumerate(boards, start=1)
+            ],
+            'bye_player_id': bye_player_id,
+            'message': f'Тур {next_round}: {len(boards)} пар'
+        })
+    }
+
+def persist_schedule(cursor, tournament_id: int, time_control: Optional[str],
+                     games: List[Tuple[int, int, int, int]], byes: List[Tuple[int, int, Optional[int]]],
+                     bye_points: float) -> None:
+    """
+    Записывает партии (тур, доска, белые, чёрные) одним многострочным INSERT,
+    bye (тур, игрок, место в сетке) - вторым, переводит турнир в статус active и увеличивает results_version
+    (bye сразу приносят очки, кэш турнирной таблицы должен сброситься)
+    """
+    if games:
+        execute_values(cursor, """
+            INSERT INTO t_p67413675_chess_tournament_org.games
+                (white_player_id, black_player_id, time_control, result, tournament_id, round, board)
+            VALUES %s
+        """, [
+            (white_id, black_id, time_control or '90+30', 'in_progress', tournament_id, round_number, board)
+            for round_number, board, white_id, black_id in games
+        ], page_size=len(games))
+    
+    if byes:
+        execute_values(cursor, """
+            INSERT INTO t_p67413675_chess_tournament_org.tournament_round_byes
+                (tournament_id, round, player_id, points, board)
+            VALUES %s
+        """, [(tournament_id, round_number, player_id, bye_points, board) for round_number, player_id, board in byes],
+            page_size=len(byes))
+    
+    cursor.execute("""
+        UPDATE t_p67413675_chess_tournament_org.tournaments
+        SET status = CASE WHEN status IN ('planned', 'registration') THEN 'active' ELSE status END,
+            results_version = results_version + 1,
+            updated_at = NOW()
+        WHERE id = %s
+    """, (tournament_id,))
+
+def generate_schedule(conn, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Полное расписание кругового турнира или первый тур олимпийской системы одной транзакцией"""
+    tournament_id = data.get('tournament_id')
+    if not tournament_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Не указан ID турнира'})
+        }
+    
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, tournament_type, time_control
+        FROM t_p67413675_chess_tournament_org.tournaments
+        WHERE id = %s
+        FOR UPDATE
+    """, (tournament_id,))
+    tournament = cursor.fetchone()
+    if not tournament:
+        cursor.close()
+        return {
+            'statusCode': 404,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Турнир не найден'})
+        }
+    if tournament[1] not in ('round_robin', 'knockout'):
+        cursor.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Расписание строится только для турниров round_robin и knockout'})
+        }
+    
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM t_p67413675_chess_tournament_org.games WHERE tournament_id = %s)
+    """, (tournament_id,))
+    if cursor.fetchone()[0]:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Расписание турнира уже создано'})
+        }
+    
+    entrants = [player_id for player_id, _ in load_tournament_entrants(cursor, tournament_id)]
+    if len(entrants) < 2:
+        conn.rollback()
+        cursor.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Для расписания нужно не меньше двух участников'})
+        }
+    
+    if tournament[1] == 'round_robin':
+        cycles = 2 if data.get('double_round') else 1
+        games, byes = round_robin_schedule(entrants, cycles)
+        total_rounds = max(round_number for round_number, _, _, _ in games)
+        # В круговом турнире пропуск тура очков не приносит
+        bye_points = 0
+    else:
+        games, byes, total_rounds = knockout_first_round(entrants)
+        # В олимпийской системе bye означает проход в следующий тур
+        bye_points = 1
+    
+    persist_schedule(cursor, tournament_id, tournament[2], games, byes, bye_points)
+    cursor.execute("""
+        UPDATE t_p67413675_chess_tournament_org.tournaments SET rounds = %s WHERE id = %s
+    """, (total_rounds, tournament_id))
+    conn.commit()
+    cursor.close()
+    
+    return {
+        'statusCode': 201,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'tournament_type': tournament[1],
+            'rounds': total_rounds,
+            'games_created': len(games),
+            'byes': [{'round': round_number, 'player_id': player_id} for round_number, player_id, _ in byes],
+            'message': f'Создано партий: {len(games)}'
+        })
+    }
+
+def advance_knockout(conn, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Следующий тур олимпийской системы по результатам и bye предыдущего одной транзакцией.
+    Ничья в партии требует победителя тай-брейка: tiebreak_winners {доска: id игрока}
+    """
+    tournament_id = data.get('tournament_id')
+    if not tournament_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Не указан ID турнира'})
+        }
+    tiebreak_winners = data.get('tiebreak_winners') or {}
+    try:
+        tiebreak_winners = {int(board): int(player_id) for board, player_id in tiebreak_winners.items()}
+    except (AttributeError, TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'tiebreak_winners должен быть объектом {доска: id игрока}'})
+        }
+    
+    cursor = conn.cursor()
+    # Блокировка строки турнира не даёт двум администраторам создать тур одновременно
+    cursor.execute("""
+        SELECT id, tournament_type, rounds, time_control
+        FROM t_p67413675_chess_tournament_org.tournaments
+        WHERE id = %s
+        FOR UPDATE
+    """, (tournament_id,))
+    tournament = cursor.fetchone()
+    if not tournament:
+        cursor.close()
+        return {
+            'statusCode': 404,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Турнир не найден'})
+        }
+    if tournament[1] != 'knockout':
+        cursor.close()
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Следующий тур по сетке строится только для турниров knockout'})
+        }
+    
+    cursor.execute("""
+        SELECT GREATEST(
+                   (SELECT COALESCE(MAX(round), 0) FROM t_p67413675_chess_tournament_org.games WHERE tournament_id = %s),
+                   (SELECT COALESCE(MAX(round), 0) FROM t_p67413675_chess_tournament_org.tournament_round_byes WHERE tournament_id = %s)
+               ),
+               (SELECT COUNT(*) FROM t_p67413675_chess_tournament_org.games
+                WHERE tournament_id = %s AND result = 'in_progress')
+    """, (tournament_id, tournament_id, tournament_id))
+    last_round, unfinished = cursor.fetchone()
+    if not last_round:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Сначала создайте первый тур (generate_schedule)'})
+        }
+    if unfinished:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'В туре {last_round} ещё идут партии: {unfinished}'})
+        }
+    # Число туров записывает generate_schedule; без него размер сетки неизвестен
+    total_rounds = tournament[2] or last_round
+    if last_round >= total_rounds:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Все {total_rounds} туров уже сыграны'})
+        }
+    
+    # Место в сетке предыдущего тура -> прошедший дальше игрок
+    advancers: Dict[int, int] = {}
+    undecided: List[int] = []
+    cursor.execute("""
+        SELECT board, white_player_id, black_player_id, result
+        FROM t_p67413675_chess_tournament_org.games
+        WHERE tournament_id = %s AND round = %s
+        ORDER BY board
+    """, (tournament_id, last_round))
+    for board, white_id, black_id, result in cursor.fetchall():
+        if result == 'white_wins':
+            advancers[board] = white_id
+        elif result == 'black_wins':
+            advancers[board] = black_id
+        elif tiebreak_winners.get(board) in (white_id, black_id):
+            advancers[board] = tiebreak_winners[board]
+        else:
+            undecided.append(board)
+    cursor.execute("""
+        SELECT board, player_id FROM t_p67413675_chess_tournament_org.tournament_round_byes
+        WHERE tournament_id = %s AND round = %s
+    """, (tournament_id, last_round))
+    for board, player_id in cursor.fetchall():
+        if board is None:
+            # bye без места в сетке: тур создан до появления tournament_round_byes.board
+            cursor.close()
+            return {
+                'statusCode': 409,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'У bye тура {last_round} нет места в сетке, следующий тур нужно создать вручную'})
+            }
+        advancers[board] = player_id
+    if undecided:
+        cursor.close()
+        return {
+            'statusCode': 409,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': f"Ничья без победителя тай-брейка на досках: {', '.join(map(str, undecided))}",
+                'undecided_boards': undecided
+            })
+        }
+    
+    next_round = last_round + 1
+    games, byes = knockout_next_round(next_round, 2 ** (total_rounds - last_round), advancers)
+    persist_schedule(cursor, tournament_id, tournament[3], games, byes, bye_points=1)
+    conn.commit()
+    cursor.close()
+    
+    return {
+        'statusCode': 201,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'round': next_round,
+            'pairings': [
+                {'board': board, 'white_player_id': white_id, 'black_player_id': black_id}
+                for _, board, white_id, black_id in games
+            ],
+            'byes': [{'board': board, 'player_id': player_id} for _, player_id, board in byes],
+            'message': f'Тур {next_round}: {len(games)} пар'
+        })
+    }
@@ -0,0 +1,105 @@
+"""
+Business: Сверка tournaments.registered_count с фактическими регистрациями и исправление расхождений
+Args: --repair - исправить найденные расхождения (без флага только отчёт), --tournament - один турнир
+Returns: список турниров, где счётчик расходится с числом регистраций registered
+
+Счётчик поддерживает триггер на tournament_registrations; расхождение возможно только
+после ручной правки данных с отключёнными триггерами. Исправление идёт по одному турниру:
+строка турнира блокируется (незакоммиченные регистрации держат ту же блокировку
+из триггера), число пересчитывается и записывается в той же короткой транзакции.
+
+Запуск: python registration_counts.py [--repair] [--tournament 42]
+"""
+
+import argparse
+import os
+from typing import Dict, Any, List, Optional
+
+DRIFT_SQL = """
+    SELECT t.id, t.registered_count, COALESCE(r.registered_count, 0)
+    FROM t_p67413675_chess_tournament_org.tournaments t
+    LEFT JOIN (
+        SELECT tournament_id, COUNT(*) AS registered_count
+        FROM t_p67413675_chess_tournament_org.tournament_registrations
+        WHERE status = 'registered' {tournament_filter}
+        GROUP BY tournament_id
+    ) r ON r.tournament_id = t.id
+    WHERE t.registered_count <> COALESCE(r.registered_count, 0) {tournament_filter_t}
+    ORDER BY t.id
+"""
+
+
+def find_drift(cursor, tournament_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Турниры, у которых сохранённый счётчик не равен числу регистраций"""
+    params: List[Any] = []
+    tournament_filter = tournament_filter_t = ''
+    if tournament_id is not None:
+        tournament_filter = 'AND tournament_id = %s'
+        tournament_filter_t = 'AND t.id = %s'
+        params = [tournament_id, tournament_id]
+    cursor.execute(DRIFT_SQL.format(tournament_filter=tournament_filter,
+                                    tournament_filter_t=tournament_filter_t), params)
+    return [{'tournament_id': row[0], 'stored': row[1], 'actual': row[2]} for row in cursor.fetchall()]
+
+
+def repair_tournament(conn, tournament_id: int) -> Optional[Dict[str, Any]]:
+    """Пересчитывает счётчик турнира под блокировкой строки; None, если расхождения уже нет"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT registered_count FROM t_p67413675_chess_tournament_org.tournaments
+            WHERE id = %s FOR UPDATE
+        """, (tournament_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            return None
+        cursor.execute("""
+            SELECT COUNT(*) FROM t_p67413675_chess_tournament_org.tournament_registrations
+            WHERE tournament_id = %s AND status = 'registered'
+        """, (tournament_id,))
+        actual = cursor.fetchone()[0]
+        if actual == row[0]:
+            conn.rollback()
+            return None
+        cursor.execute("""
+            UPDATE t_p67413675_chess_tournament_org.tournaments
+            SET registered_count = %s WHERE id = %s
+        """, (actual, tournament_id))
+        conn.commit()
+        return {'tournament_id': tournament_id, 'stored': row[0], 'actual': actual}
+    finally:
+        cursor.close()
+
+
+def reconcile(conn, repair: bool = False, tournament_id: Optional[int] = None) -> Dict[str, Any]:
+    """Отчёт о расхождениях; с repair=True каждое найденное расхождение исправляется"""
+    cursor = conn.cursor()
+    drift = find_drift(cursor, tournament_id)
+    cursor.close()
+    conn.rollback()
+
+    repaired = []
+    if repair:
+        for entry in drift:
+            fixed = repair_tournament(conn, entry['tournament_id'])
+            if fixed is not None:
+                repaired.append(fixed)
+    return {'drift': drift, 'repaired': repaired}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сверка счётчиков регистраций турниров')
+    parser.add_argument('--repair', action='store_true', help='исправить расхождения')
+    parser.add_argument('--tournament', type=int, help='проверить только этот турнир')
+    args = parser.parse_args()
+    import psycopg2
+
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        report = reconcile(connection, args.repair, args.tournament)
+    finally:
+        connection.close()
+    for entry in report['drift']:
+        print(f"турнир {entry['tournament_id']}: сохранено {entry['stored']}, фактически {entry['actual']}")
+    print(f"расхождений: {len(report['drift'])}, исправлено: {len(report['repaired'])}")
@@ -0,0 +1,121 @@
+"""
+Business: Расписания круговых турниров по таблицам Бергера и сетки олимпийской системы
+Args: id участников в порядке посева (сильнейший первым)
+Returns: партии (тур, доска, белые, чёрные) и bye (тур, игрок, место в сетке)
+
+В олимпийской системе доска партии и bye - это место в сетке тура (с единицы):
+победители мест 2k-1 и 2k встречаются в следующем туре на месте k.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# (тур, доска, id белых, id чёрных)
+ScheduledGame = Tuple[int, int, int, int]
+# (тур, id игрока, место в сетке олимпийской системы или None)
+ScheduledBye = Tuple[int, int, Optional[int]]
+
+
+def berger_rounds(size: int) -> List[List[Tuple[int, int]]]:
+    """
+    Таблицы Бергера для чётного size: номера участников 1..size, пары (белые, чёрные).
+    Каждый следующий тур получается сдвигом номеров на size/2 по модулю size-1,
+    участник size остаётся на месте и меняет цвет.
+    """
+    rounds = [[(board, size + 1 - board) for board in range(1, size // 2 + 1)]]
+    for _ in range(size - 2):
+        shifted = []
+        for white, black in rounds[-1]:
+            if size in (white, black):
+                other = white if black == size else black
+                other = (other - 1 + size // 2) % (size - 1) + 1
+                # Участник size чередует цвета
+                shifted.append((size, other) if black == size else (other, size))
+            else:
+                shifted.append(((white - 1 + size // 2) % (size - 1) + 1,
+                                (black - 1 + size // 2) % (size - 1) + 1))
+        rounds.append(shifted)
+    return rounds
+
+
+def round_robin_schedule(player_ids: List[int], cycles: int = 1) -> Tuple[List[ScheduledGame], List[ScheduledBye]]:
+    """Полное расписание кругового турнира; во втором круге цвета меняются местами"""
+    numbers: List[Optional[int]] = list(player_ids)
+    if len(numbers) % 2:
+        # Фиктивный участник: кто играет с ним, пропускает тур
+        numbers.append(None)
+    table = berger_rounds(len(numbers))
+
+    games: List[ScheduledGame] = []
+    byes: List[ScheduledBye] = []
+    round_number = 0
+    for cycle in range(cycles):
+        for pairs in table:
+            round_number += 1
+            board = 0
+            for white_no, black_no in pairs:
+                white, black = numbers[white_no - 1], numbers[black_no - 1]
+                if cycle % 2:
+                    white, black = black, white
+                if white is None or black is None:
+                    byes.append((round_number, white if white is not None else black, None))
+                    continue
+                board += 1
+                games.append((round_number, board, white, black))
+    return games, byes
+
+
+def bracket_order(size: int) -> List[int]:
+    """Порядок посевов в сетке размера 2^k: 1 и 2 встречаются только в финале"""
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def knockout_first_round(player_ids: List[int]) -> Tuple[List[ScheduledGame], List[ScheduledBye], int]:
+    """
+    Первый тур олимпийской системы. Сетка дополняется до степени двойки,
+    недостающие посевы - это bye для сильнейших. Возвращает партии, bye и число туров.
+    Номера досок идут по местам в сетке, поэтому там, где bye, номер пропущен.
+    """
+    size = 1
+    while size < len(player_ids):
+        size *= 2
+    total_rounds = max(size.bit_length() - 1, 1)
+    order = bracket_order(size)
+
+    games: List[ScheduledGame] = []
+    byes: List[ScheduledBye] = []
+    for i in range(0, size, 2):
+        top_seed, bottom_seed = sorted((order[i], order[i + 1]))
+        top = player_ids[top_seed - 1] if top_seed <= len(player_ids) else None
+        bottom = player_ids[bottom_seed - 1] if bottom_seed <= len(player_ids) else None
+        slot = i // 2 + 1
+        if top is None and bottom is None:
+            continue
+        if top is None or bottom is None:
+            byes.append((1, top if top is not None else bottom, slot))
+            continue
+        games.append((1, slot, top, bottom))
+    return games, byes, total_rounds
+
+
+def knockout_next_round(round_number: int, slots: int,
+                        advancers: Dict[int, int]) -> Tuple[List[ScheduledGame], List[ScheduledBye]]:
+    """
+    Тур round_number олимпийской системы по итогам предыдущего: advancers - место в сетке
+    предыдущего тура -> прошедший дальше игрок, slots - число мест в предыдущем туре.
+    Победитель места 2k-1 играет белыми; если соперника нет, это bye.
+    """
+    games: List[ScheduledGame] = []
+    byes: List[ScheduledBye] = []
+    for slot in range(1, slots // 2 + 1):
+        top, bottom = advancers.get(2 * slot - 1), advancers.get(2 * slot)
+        if top is None and bottom is None:
+            continue
+        if top is None or bottom is None:
+            byes.append((round_number, top if top is not None else bottom, slot))
+            continue
+        games.append((round_number, slot, top, bottom))
+    return games, byes
@@ -0,0 +1,244 @@
+"""
+Business: Жеребьёвка тура по швейцарской системе в духе голландской системы ФИДЕ
+Args: участники с очками, рейтингом, историей цветов и соперников
+Returns: пары (белые, чёрные) в порядке досок и игрок, получающий bye
+
+Участники делятся на очковые группы сверху вниз. В каждой группе верхняя половина
+S1 сопоставляется нижней S2 поиском увеличивающих путей (алгоритм Куна), причём
+соперники для S1[i] перебираются в голландском порядке: S2[i], S2[i+1], ..., затем
+S2[i-1], ... Недопаренные игроки спускаются в следующую группу. Если внизу остаются
+непаренные, нижние пары возвращаются в пул и пул переспаривается с ослабленными
+цветовыми ограничениями.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+WHITE, BLACK = 'w', 'b'
+
+# Полный перебор включается только для небольших пулов внизу таблицы
+EXHAUSTIVE_POOL_LIMIT = 40
+
+
+class SwissPlayer:
+    """Участник тура: очки, рейтинг, сыгранные цвета и соперники"""
+
+    __slots__ = ('id', 'rating', 'score', 'colors', 'opponents', 'had_bye', 'rank')
+
+    def __init__(self, player_id: int, rating: int = 0, score: float = 0.0,
+                 colors: Optional[List[str]] = None, opponents: Optional[Set[int]] = None,
+                 had_bye: bool = False):
+        self.id = player_id
+        self.rating = rating or 0
+        self.score = score
+        self.colors = colors if colors is not None else []
+        self.opponents = opponents if opponents is not None else set()
+        self.had_bye = had_bye
+        self.rank = 0
+
+    def color_preference(self) -> Tuple[Optional[str], int]:
+        """Желаемый цвет и сила желания: 3 - абсолютное, 2 - сильное, 1 - слабое, 0 - нет"""
+        if not self.colors:
+            return None, 0
+        diff = self.colors.count(WHITE) - self.colors.count(BLACK)
+        last_two = self.colors[-2:]
+        if diff < -1 or last_two == [BLACK, BLACK]:
+            return WHITE, 3
+        if diff > 1 or last_two == [WHITE, WHITE]:
+            return BLACK, 3
+        if diff == -1:
+            return WHITE, 2
+        if diff == 1:
+            return BLACK, 2
+        return (BLACK if self.colors[-1] == WHITE else WHITE), 1
+
+
+def _compatible(a: SwissPlayer, b: SwissPlayer, strict_colors: bool) -> bool:
+    if b.id in a.opponents:
+        return False
+    if strict_colors:
+        pref_a, strength_a = a.color_preference()
+        pref_b, strength_b = b.color_preference()
+        if strength_a == 3 and strength_b == 3 and pref_a == pref_b:
+            return False
+    return True
+
+
+def _dutch_order(i: int, size: int):
+    yield from range(i, size)
+    yield from range(i - 1, -1, -1)
+
+
+def _bipartite_match(s1: List[SwissPlayer], s2: List[SwissPlayer],
+                     strict_colors: bool) -> List[Optional[int]]:
+    """Максимальное паросочетание S1-S2 (Кун, итеративно); для S1[i] - индекс в S2 или None"""
+    match_s1: List[Optional[int]] = [None] * len(s1)
+    match_s2: List[Optional[int]] = [None] * len(s2)
+
+    for root in range(len(s1)):
+        visited = [False] * len(s2)
+        frames = [root]
+        iterators = [_dutch_order(min(root, len(s2) - 1), len(s2))]
+        via: Dict[int, int] = {}
+        while frames:
+            u = frames[-1]
+            advanced = False
+            for v in iterators[-1]:
+                if visited[v] or not _compatible(s1[u], s2[v], strict_colors):
+                    continue
+                visited[v] = True
+                owner = match_s2[v]
+                if owner is None:
+                    # Увеличивающий путь найден: переназначаем пары вдоль стека
+                    free = v
+                    for k in range(len(frames) - 1, -1, -1):
+                        node = frames[k]
+                        previous = via.get(node)
+                        match_s2[free] = node
+                        match_s1[node] = free
+                        free = previous
+                    frames = []
+                else:
+                    via[owner] = v
+                    frames.append(owner)
+                    iterators.append(_dutch_order(min(owner, len(s2) - 1), len(s2)))
+                advanced = True
+                break
+            if frames and not advanced:
+                frames.pop()
+                iterators.pop()
+    return match_s1
+
+
+def _pair_bracket(players: List[SwissPlayer], strict_colors: bool) -> Tuple[List[Tuple[SwissPlayer, SwissPlayer]], List[SwissPlayer]]:
+    """Пары внутри очковой группы и список спускающихся вниз игроков"""
+    players = sorted(players, key=lambda p: p.rank)
+    half = len(players) // 2
+    s1, s2 = players[:half], players[half:]
+    matched = _bipartite_match(s1, s2, strict_colors)
+
+    pairs = []
+    used_s2 = set()
+    leftovers = []
+    for i, j in enumerate(matched):
+        if j is None:
+            leftovers.append(s1[i])
+        else:
+            pairs.append((s1[i], s2[j]))
+            used_s2.add(j)
+    leftovers.extend(p for j, p in enumerate(s2) if j not in used_s2)
+
+    # Остаток группы пробуем спарить между собой (например, S1 с S1)
+    leftovers.sort(key=lambda p: p.rank)
+    floaters = []
+    while leftovers:
+        top = leftovers.pop(0)
+        partner = next((p for p in leftovers if _compatible(top, p, strict_colors)), None)
+        if partner is None:
+            floaters.append(top)
+        else:
+            leftovers.remove(partner)
+            pairs.append((top, partner))
+    return pairs, floaters
+
+
+def _pair_exhaustive(players: List[SwissPlayer], strict_colors: bool,
+                     budget: int = 20000) -> Optional[List[Tuple[SwissPlayer, SwissPlayer]]]:
+    """Полный перебор для небольшого пула, когда паросочетание S1-S2 не нашло решения"""
+    pool = sorted(players, key=lambda p: p.rank)
+    steps = [0]
+
+    def search(rest: List[SwissPlayer]) -> Optional[List[Tuple[SwissPlayer, SwissPlayer]]]:
+        if not rest:
+            return []
+        steps[0] += 1
+        if steps[0] > budget:
+            return None
+        top = rest[0]
+        for i in range(1, len(rest)):
+            if _compatible(top, rest[i], strict_colors):
+                tail = search(rest[1:i] + rest[i + 1:])
+                if tail is not None:
+                    return [(top, rest[i])] + tail
+        return None
+
+    if len(pool) % 2:
+        return None
+    return search(pool)
+
+
+def _allocate_colors(a: SwissPlayer, b: SwissPlayer, board: int) -> Tuple[SwissPlayer, SwissPlayer]:
+    """Возвращает (белые, чёрные): удовлетворяется более сильное желание, при равенстве - старший по рангу"""
+    higher, lower = (a, b) if a.rank < b.rank else (b, a)
+    pref_h, strength_h = higher.color_preference()
+    pref_l, strength_l = lower.color_preference()
+    if pref_h is None and pref_l is None:
+        # Первый тур: старший на нечётных досках играет белыми
+        return (higher, lower) if board % 2 == 1 else (lower, higher)
+    if pref_h != pref_l or strength_h >= strength_l:
+        if pref_h is not None:
+            return (higher, lower) if pref_h == WHITE else (lower, higher)
+        return (lower, higher) if pref_l == WHITE else (higher, lower)
+    return (lower, higher) if pref_l == WHITE else (higher, lower)
+
+
+def _select_bye(ranked: List[SwissPlayer]) -> Optional[SwissPlayer]:
+    for player in reversed(ranked):
+        if not player.had_bye:
+            return player
+    return ranked[-1] if ranked else None
+
+
+def pair_round(players: List[SwissPlayer]) -> Tuple[List[Tuple[int, int]], Optional[int]]:
+    """
+    Жеребьёвка очередного тура.
+    Возвращает список пар (id белых, id чёрных) по доскам и id игрока с bye (или None).
+    """
+    ranked = sorted(players, key=lambda p: (-p.score, -p.rating, p.id))
+    for rank, player in enumerate(ranked):
+        player.rank = rank
+
+    bye = None
+    if len(ranked) % 2 == 1:
+        bye = _select_bye(ranked)
+        ranked = [p for p in ranked if p is not bye]
+
+    brackets: List[List[SwissPlayer]] = []
+    for player in ranked:
+        if brackets and brackets[-1][0].score == player.score:
+            brackets[-1].append(player)
+        else:
+            brackets.append([player])
+
+    pairs: List[Tuple[SwissPlayer, SwissPlayer]] = []
+    floaters: List[SwissPlayer] = []
+    for bracket in brackets:
+        bracket_pairs, floaters = _pair_bracket(floaters + bracket, strict_colors=True)
+        pairs.extend(bracket_pairs)
+
+    # Внизу остались непаренные: возвращаем нижние пары в пул, пока пул не спарится,
+    # а когда в пул ушло всё поле - ослабляем цветовые ограничения
+    pool = floaters
+    strict = True
+    while pool:
+        retry_pairs, left = _pair_bracket(pool, strict_colors=strict)
+        if left and len(pool) <= EXHAUSTIVE_POOL_LIMIT:
+            exhaustive = _pair_exhaustive(pool, strict_colors=strict)
+            if exhaustive is not None:
+                retry_pairs, left = exhaustive, []
+        if not left:
+            pairs.extend(retry_pairs)
+            break
+        if pairs:
+            for _ in range(min(len(pairs), max(1, len(left)))):
+                pool.extend(pairs.pop())
+        elif strict:
+            strict = False
+        else:
+            raise ValueError('Невозможно составить пары без повторных встреч')
+
+    pairs.sort(key=lambda pair: (-max(pair[0].score, pair[1].score), min(pair[0].rank, pair[1].rank)))
+    boards = []
+    for board, (a, b) in enumerate(pairs, start=1):
+        white, black = _allocate_colors(a, b, board)
+        boards.append((white.id, black.id))
+    return boards, (bye.id if bye else None)
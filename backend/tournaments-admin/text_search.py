@@ -0,0 +1,90 @@
+"""
+Business: Разбор поискового запроса админки и постраничная выдача результатов по релевантности
+Args: параметры q, limit, cursor из query string
+Returns: префиксный tsquery для русской конфигурации, строка для триграммного сравнения, курсор
+
+Модуль одинаков в tournaments-admin и admin-users: каждая функция деплоится отдельно.
+Совпадение - полнотекстовое (search_vector, слова запроса как префиксы) или нечёткое
+по триграммам (word_similarity), поэтому находятся и незаконченные слова, и опечатки.
+Результаты упорядочены по (score, id) по убыванию, курсор хранит эту пару.
+"""
+
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_MAX = 100
+SEARCH_QUERY_MAX_LENGTH = 100
+SEARCH_MAX_TERMS = 8
+# Однобуквенный префикс совпадает с большей частью словаря и не сужает выборку
+SEARCH_MIN_TERM_LENGTH = 2
+
+# Слово, логин или адрес почты; знаки операторов tsquery сюда не попадают
+TERM_PATTERN = re.compile(r'[\w@.\-]+')
+
+
+def search_terms(query: str) -> List[str]:
+    terms = []
+    for token in TERM_PATTERN.findall(query.lower()):
+        token = token.strip('.-@')
+        if not any(ch.isalnum() for ch in token):
+            continue
+        if len(token) >= SEARCH_MIN_TERM_LENGTH and token not in terms:
+            terms.append(token)
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def encode_search_cursor(score: float, row_id: int) -> str:
+    raw = json.dumps([score, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(token: Optional[str]) -> Optional[Tuple[float, int]]:
+    if not token:
+        return None
+    try:
+        score, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return float(score), int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+
+
+def parse_search(params: Dict[str, str]) -> Dict[str, Any]:
+    """Параметры поиска из query string; ValueError с текстом для ответа 400"""
+    query = (params.get('q') or '').strip()[:SEARCH_QUERY_MAX_LENGTH]
+    terms = search_terms(query)
+    if not terms:
+        raise ValueError(f'Запрос должен содержать слово не короче {SEARCH_MIN_TERM_LENGTH} символов')
+    try:
+        limit = int(params.get('limit', SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit должен быть числом')
+    return {
+        'q': ' '.join(terms),
+        'tsquery': ' & '.join(f'{term}:*' for term in terms),
+        'after': decode_search_cursor(params.get('cursor')),
+        'limit': max(1, min(limit, SEARCH_PAGE_MAX))
+    }
+
+
+def match_sql(alias: str, fuzzy_columns: List[str]) -> Tuple[str, str]:
+    """
+    Условие совпадения и выражение релевантности для SQL с именованными параметрами
+    %(tsquery)s и %(q)s. Оба условия обслуживаются GIN-индексами (BitmapOr).
+    """
+    tsquery = "to_tsquery('russian', %(tsquery)s)"
+    fuzzy = [f'%(q)s <%% {alias}.{column}' for column in fuzzy_columns]
+    condition = f"({alias}.search_vector @@ {tsquery} OR {' OR '.join(fuzzy)})"
+    similarity = ', '.join(f"word_similarity(%(q)s, coalesce({alias}.{column}, ''))" for column in fuzzy_columns)
+    score = f"(ts_rank_cd({alias}.search_vector, {tsquery}, 1) + GREATEST({similarity}))::float8"
+    return condition, score
+
+
+def next_cursor(rows: List[Any], limit: int, score_of, id_of) -> Tuple[List[Any], Optional[str]]:
+    """Обрезает лишнюю строку (запрашивается limit + 1) и строит курсор следующей страницы"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_search_cursor(score_of(rows[-1]), id_of(rows[-1]))
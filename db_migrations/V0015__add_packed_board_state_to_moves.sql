@@ -0,0 +1,80 @@
+-- Компактное хранение позиций ходов: 37 байт вместо текстового board_state
+ALTER TABLE moves ADD COLUMN IF NOT EXISTS board_state_packed BYTEA;
+ALTER TABLE moves ALTER COLUMN board_state DROP NOT NULL;
+
+-- Упаковка FEN в формат chess-api/chess_board.py (Position.pack):
+-- 32 байта полубайтов фигур a1..h8 (0 - пусто, 1..6 белые PNBRQK, 9..14 чёрные),
+-- байт очереди хода и рокировок, байт поля en passant (255 - нет),
+-- байт счётчика полуходов и два байта номера хода. NULL - строка не является FEN
+CREATE OR REPLACE FUNCTION pack_fen_board_state(fen TEXT) RETURNS BYTEA AS $$
+DECLARE
+    parts TEXT[];
+    nibbles INT[] := array_fill(0, ARRAY[64]);
+    packed BYTEA := decode(repeat('00', 37), 'hex');
+    ch TEXT;
+    code INT;
+    rank INT := 7;
+    file INT := 0;
+    flags INT;
+    ep INT := 255;
+    halfmove INT;
+    fullmove INT;
+BEGIN
+    parts := regexp_split_to_array(btrim(fen), '\s+');
+    IF fen IS NULL OR array_length(parts, 1) < 4 THEN
+        RETURN NULL;
+    END IF;
+
+    FOR i IN 1..length(parts[1]) LOOP
+        ch := substr(parts[1], i, 1);
+        IF ch = '/' THEN
+            rank := rank - 1;
+            file := 0;
+        ELSIF ch ~ '^[1-8]$' THEN
+            file := file + ch::INT;
+        ELSE
+            code := strpos('PNBRQK', upper(ch));
+            IF code = 0 OR file > 7 OR rank < 0 THEN
+                RETURN NULL;
+            END IF;
+            IF ch <> upper(ch) THEN
+                code := code + 8;
+            END IF;
+            nibbles[rank * 8 + file + 1] := code;
+            file := file + 1;
+        END IF;
+    END LOOP;
+
+    FOR i IN 0..31 LOOP
+        packed := set_byte(packed, i, nibbles[2 * i + 1] * 16 + nibbles[2 * i + 2]);
+    END LOOP;
+
+    flags := CASE parts[2] WHEN 'w' THEN 0 WHEN 'b' THEN 1 END;
+    IF flags IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF strpos(parts[3], 'K') > 0 THEN flags := flags | 2; END IF;
+    IF strpos(parts[3], 'Q') > 0 THEN flags := flags | 4; END IF;
+    IF strpos(parts[3], 'k') > 0 THEN flags := flags | 8; END IF;
+    IF strpos(parts[3], 'q') > 0 THEN flags := flags | 16; END IF;
+
+    IF parts[4] <> '-' THEN
+        ep := (ascii(substr(parts[4], 1, 1)) - ascii('a')) + (substr(parts[4], 2, 1)::INT - 1) * 8;
+    END IF;
+    halfmove := LEAST(COALESCE(parts[5]::INT, 0), 255);
+    fullmove := LEAST(COALESCE(parts[6]::INT, 1), 65535);
+
+    packed := set_byte(packed, 32, flags);
+    packed := set_byte(packed, 33, ep);
+    packed := set_byte(packed, 34, halfmove);
+    packed := set_byte(packed, 35, fullmove >> 8);
+    packed := set_byte(packed, 36, fullmove & 255);
+    RETURN packed;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Существующие FEN переносятся не здесь: миграция выполняется одной транзакцией,
+-- и блокировки строк и WAL держались бы до её конца. Перенос - отдельным запуском
+-- с коммитом каждой пачки: python chess-api/pack_board_states.py --backfill
@@ -0,0 +1,13 @@
+-- Keyset-пагинация GET /games по (started_at, id): started_at не должен быть NULL,
+-- иначе сравнение строк (started_at, id) < (...) теряет такие партии
+UPDATE games SET started_at = COALESCE(finished_at, CURRENT_TIMESTAMP) WHERE started_at IS NULL;
+ALTER TABLE games ALTER COLUMN started_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE games ALTER COLUMN started_at SET NOT NULL;
+
+-- Лента всех партий и фильтр по результату
+CREATE INDEX IF NOT EXISTS idx_games_started_id ON games (started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_games_result_started_id ON games (result, started_at DESC, id DESC);
+
+-- Фильтр по игроку: отдельные ветки для белых и чёрных
+CREATE INDEX IF NOT EXISTS idx_games_white_started_id ON games (white_player_id, started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_games_black_started_id ON games (black_player_id, started_at DESC, id DESC);
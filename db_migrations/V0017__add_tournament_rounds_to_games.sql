@@ -0,0 +1,24 @@
+-- Партии турниров: привязка к турниру, номер тура и доски
+ALTER TABLE t_p67413675_chess_tournament_org.games
+ADD COLUMN IF NOT EXISTS tournament_id INTEGER REFERENCES t_p67413675_chess_tournament_org.tournaments(id),
+ADD COLUMN IF NOT EXISTS round INTEGER,
+ADD COLUMN IF NOT EXISTS board INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_games_tournament_round
+ON t_p67413675_chess_tournament_org.games (tournament_id, round)
+WHERE tournament_id IS NOT NULL;
+
+-- Повторная жеребьёвка того же тура не пройдёт: доска в туре уникальна
+CREATE UNIQUE INDEX IF NOT EXISTS uq_games_tournament_round_board
+ON t_p67413675_chess_tournament_org.games (tournament_id, round, board)
+WHERE tournament_id IS NOT NULL;
+
+-- Игроки, получившие bye в туре (без соперника)
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.tournament_round_byes (
+    tournament_id INTEGER NOT NULL REFERENCES t_p67413675_chess_tournament_org.tournaments(id),
+    round INTEGER NOT NULL,
+    player_id INTEGER NOT NULL REFERENCES t_p67413675_chess_tournament_org.players(id),
+    points NUMERIC(3, 1) NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tournament_id, round, player_id)
+);
@@ -0,0 +1,4 @@
+-- Версия результатов турнира: увеличивается при завершении каждой партии турнира,
+-- по ней сбрасывается кэш турнирной таблицы
+ALTER TABLE t_p67413675_chess_tournament_org.tournaments
+ADD COLUMN IF NOT EXISTS results_version BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,17 @@
+-- Арена: берсерк сторон и снимки турнирной таблицы для быстрого восстановления
+ALTER TABLE t_p67413675_chess_tournament_org.games
+ADD COLUMN IF NOT EXISTS white_berserk BOOLEAN NOT NULL DEFAULT FALSE,
+ADD COLUMN IF NOT EXISTS black_berserk BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Догрузка завершённых партий арены по водяному знаку finished_at
+CREATE INDEX IF NOT EXISTS idx_games_tournament_finished
+ON t_p67413675_chess_tournament_org.games (tournament_id, finished_at, id)
+WHERE tournament_id IS NOT NULL AND result <> 'in_progress';
+
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.arena_snapshots (
+    tournament_id INTEGER PRIMARY KEY REFERENCES t_p67413675_chess_tournament_org.tournaments(id),
+    watermark TIMESTAMP,
+    state JSONB NOT NULL,
+    games_applied INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
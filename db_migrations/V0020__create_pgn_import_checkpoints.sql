@@ -0,0 +1,8 @@
+-- Контрольные точки импорта PGN: смещение в файле после последней записанной пачки
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.pgn_import_checkpoints (
+    source VARCHAR(255) PRIMARY KEY,
+    byte_offset BIGINT NOT NULL DEFAULT 0,
+    games_imported BIGINT NOT NULL DEFAULT 0,
+    games_skipped BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
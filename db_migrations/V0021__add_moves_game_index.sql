@@ -0,0 +1,2 @@
+-- Ходы партии по порядку: выгрузка собирает их string_agg для каждой партии
+CREATE INDEX IF NOT EXISTS idx_moves_game_move ON moves (game_id, move_number);
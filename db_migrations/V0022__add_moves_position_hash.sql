@@ -0,0 +1,3 @@
+-- Zobrist-хеш позиции после хода (знаковое 64-битное число): повторения позиций
+-- и поиск партий по позиции без распаковки board_state_packed
+ALTER TABLE moves ADD COLUMN IF NOT EXISTS position_hash BIGINT;
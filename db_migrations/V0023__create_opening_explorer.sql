@@ -0,0 +1,12 @@
+-- Дебютный справочник: ходы из позиции (Zobrist-хеш до хода) и их результаты.
+-- Первичный ключ одновременно служит индексом запроса по позиции
+CREATE TABLE IF NOT EXISTS opening_explorer (
+    position_hash BIGINT NOT NULL,
+    move VARCHAR(10) NOT NULL,
+    white_wins INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    black_wins INTEGER NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    rating_games INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (position_hash, move)
+);
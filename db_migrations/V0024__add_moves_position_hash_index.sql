@@ -0,0 +1,5 @@
+-- Поиск партий по позиции: хеш позиции и партия, в порядке которой отдаются страницы.
+-- Старые ходы получают position_hash скриптом chess-api/position_search.py --backfill
+CREATE INDEX IF NOT EXISTS idx_moves_position_hash_game
+ON moves (position_hash, game_id)
+WHERE position_hash IS NOT NULL;
@@ -0,0 +1,38 @@
+-- Версии кэшируемых данных: функции держат ответ в памяти, пока версия не изменилась
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p67413675_chess_tournament_org.cache_versions (name)
+VALUES ('tournaments')
+ON CONFLICT (name) DO NOTHING;
+
+-- Увеличивает версию списка турниров и оповещает слушателей канала cache_invalidation.
+-- Срабатывает на уровне команды: массовое изменение - одно увеличение версии
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.bump_tournaments_cache_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE t_p67413675_chess_tournament_org.cache_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE name = 'tournaments';
+    PERFORM pg_notify('cache_invalidation', 'tournaments');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Только колонки, которые видны в публичном списке: завершение партий (results_version)
+-- и служебные поля кэш не сбрасывают
+DROP TRIGGER IF EXISTS trg_tournaments_cache_version ON t_p67413675_chess_tournament_org.tournaments;
+CREATE TRIGGER trg_tournaments_cache_version
+AFTER INSERT OR DELETE OR UPDATE OF name, description, start_date, end_date, max_participants,
+    entry_fee, prize_fund, tournament_type, status, location, time_control, age_category,
+    start_time_msk, rounds
+ON t_p67413675_chess_tournament_org.tournaments
+FOR EACH STATEMENT EXECUTE FUNCTION t_p67413675_chess_tournament_org.bump_tournaments_cache_version();
+
+DROP TRIGGER IF EXISTS trg_tournament_registrations_cache_version ON t_p67413675_chess_tournament_org.tournament_registrations;
+CREATE TRIGGER trg_tournament_registrations_cache_version
+AFTER INSERT OR DELETE OR UPDATE
+ON t_p67413675_chess_tournament_org.tournament_registrations
+FOR EACH STATEMENT EXECUTE FUNCTION t_p67413675_chess_tournament_org.bump_tournaments_cache_version();
@@ -0,0 +1,74 @@
+-- Число участников со статусом registered хранится в турнире, а не считается GROUP BY
+-- при каждом чтении. Точность держит триггер на tournament_registrations;
+-- расхождения проверяет и исправляет tournaments-admin/registration_counts.py
+ALTER TABLE t_p67413675_chess_tournament_org.tournaments
+ADD COLUMN IF NOT EXISTS registered_count INTEGER NOT NULL DEFAULT 0;
+
+-- Вклад строки регистрации - 1, если она в статусе registered. Переходы
+-- pending/registered/cancelled/rejected и перенос в другой турнир дают разность вкладов
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.maintain_registered_count() RETURNS TRIGGER AS $$
+DECLARE
+    old_tournament INTEGER;
+    new_tournament INTEGER;
+    old_counted INTEGER := 0;
+    new_counted INTEGER := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_tournament := OLD.tournament_id;
+        old_counted := CASE WHEN OLD.status = 'registered' THEN 1 ELSE 0 END;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_tournament := NEW.tournament_id;
+        new_counted := CASE WHEN NEW.status = 'registered' THEN 1 ELSE 0 END;
+    END IF;
+
+    IF old_tournament IS NOT DISTINCT FROM new_tournament THEN
+        IF new_counted <> old_counted THEN
+            UPDATE t_p67413675_chess_tournament_org.tournaments
+            SET registered_count = registered_count + new_counted - old_counted
+            WHERE id = new_tournament;
+        END IF;
+    ELSE
+        IF old_counted = 1 THEN
+            UPDATE t_p67413675_chess_tournament_org.tournaments
+            SET registered_count = registered_count - 1
+            WHERE id = old_tournament;
+        END IF;
+        IF new_counted = 1 THEN
+            UPDATE t_p67413675_chess_tournament_org.tournaments
+            SET registered_count = registered_count + 1
+            WHERE id = new_tournament;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Регистрации не меняются, пока создаётся триггер и пересчитываются счётчики
+LOCK TABLE t_p67413675_chess_tournament_org.tournament_registrations IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_tournament_registrations_count ON t_p67413675_chess_tournament_org.tournament_registrations;
+CREATE TRIGGER trg_tournament_registrations_count
+AFTER INSERT OR DELETE OR UPDATE OF status, tournament_id
+ON t_p67413675_chess_tournament_org.tournament_registrations
+FOR EACH ROW EXECUTE FUNCTION t_p67413675_chess_tournament_org.maintain_registered_count();
+
+UPDATE t_p67413675_chess_tournament_org.tournaments t
+SET registered_count = COALESCE(r.registered_count, 0)
+FROM t_p67413675_chess_tournament_org.tournaments t2
+LEFT JOIN (
+    SELECT tournament_id, COUNT(*) AS registered_count
+    FROM t_p67413675_chess_tournament_org.tournament_registrations
+    WHERE status = 'registered'
+    GROUP BY tournament_id
+) r ON r.tournament_id = t2.id
+WHERE t.id = t2.id AND t.registered_count <> COALESCE(r.registered_count, 0);
+
+ALTER TABLE t_p67413675_chess_tournament_org.tournaments
+DROP CONSTRAINT IF EXISTS tournaments_registered_count_check;
+ALTER TABLE t_p67413675_chess_tournament_org.tournaments
+ADD CONSTRAINT tournaments_registered_count_check CHECK (registered_count >= 0);
+
+-- Публичный список ближайших турниров: диапазон по дате старта без сортировки
+CREATE INDEX IF NOT EXISTS idx_tournaments_start_date
+ON t_p67413675_chess_tournament_org.tournaments (start_date, id);
@@ -0,0 +1,21 @@
+-- Каталог турниров в get-tournaments: фильтр по колонке и выдача по ключу (start_date, id).
+-- Общий индекс (start_date, id) создан в V0026
+CREATE INDEX IF NOT EXISTS idx_tournaments_status_start
+ON t_p67413675_chess_tournament_org.tournaments (status, start_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_type_start
+ON t_p67413675_chess_tournament_org.tournaments (tournament_type, start_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_age_category_start
+ON t_p67413675_chess_tournament_org.tournaments (age_category, start_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_time_control_start
+ON t_p67413675_chess_tournament_org.tournaments (time_control, start_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_location_start
+ON t_p67413675_chess_tournament_org.tournaments (lower(location), start_date, id);
+
+-- Самый частый запрос витрины: турниры, на которые ещё можно записаться
+CREATE INDEX IF NOT EXISTS idx_tournaments_open_start
+ON t_p67413675_chess_tournament_org.tournaments (start_date, id)
+WHERE status IN ('planned', 'registration');
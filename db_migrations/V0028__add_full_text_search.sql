@@ -0,0 +1,35 @@
+-- Поиск на сервере для админки: полнотекстовый по русской морфологии и нечёткий
+-- по триграммам для имён с опечатками (tournaments-admin и admin-users, параметр q)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Вес A - название, B - место, C - описание
+ALTER TABLE t_p67413675_chess_tournament_org.tournaments
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(location, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_search_vector
+ON t_p67413675_chess_tournament_org.tournaments USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_tournaments_name_trgm
+ON t_p67413675_chess_tournament_org.tournaments USING GIN (name gin_trgm_ops);
+
+-- Логин и почта разбираются конфигурацией simple: стемминг их только портит
+ALTER TABLE t_p67413675_chess_tournament_org.users
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(full_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(username, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(email, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(educational_institution, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_users_search_vector
+ON t_p67413675_chess_tournament_org.users USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm
+ON t_p67413675_chess_tournament_org.users USING GIN (full_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm
+ON t_p67413675_chess_tournament_org.users USING GIN (username gin_trgm_ops);
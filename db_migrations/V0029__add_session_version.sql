@@ -0,0 +1,26 @@
+-- Подписанные токены сессий (session_tokens.py): user_sessions.session_token хранит jti
+-- токена, выход помечает строку отозванной вместо удаления
+ALTER TABLE t_p67413675_chess_tournament_org.user_sessions
+ADD COLUMN IF NOT EXISTS revoked_at TIMESTAMP;
+
+-- Версия сессий пользователя входит в подпись токена: её увеличение отзывает все токены
+ALTER TABLE t_p67413675_chess_tournament_org.users
+ADD COLUMN IF NOT EXISTS session_version INTEGER NOT NULL DEFAULT 0;
+
+-- Смена роли, блокировка и смена пароля отзывают выданные токены при любом способе записи
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.bump_session_version() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.session_version := OLD.session_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_session_version ON t_p67413675_chess_tournament_org.users;
+CREATE TRIGGER trg_users_session_version
+BEFORE UPDATE OF role, is_active, password_hash
+ON t_p67413675_chess_tournament_org.users
+FOR EACH ROW
+WHEN (OLD.role IS DISTINCT FROM NEW.role
+      OR OLD.is_active IS DISTINCT FROM NEW.is_active
+      OR OLD.password_hash IS DISTINCT FROM NEW.password_hash)
+EXECUTE FUNCTION t_p67413675_chess_tournament_org.bump_session_version();
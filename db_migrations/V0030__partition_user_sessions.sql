@@ -0,0 +1,73 @@
+-- user_sessions секционируется по месяцу expires_at: истёкшие сессии удаляются
+-- целой секцией (auth-new/session_sweeper.py), а не построчно, и поиск сессии по
+-- (jti, expires_at) из токена затрагивает одну секцию с небольшим индексом
+CREATE TABLE t_p67413675_chess_tournament_org.user_sessions_partitioned (
+    id BIGINT NOT NULL,
+    user_id INTEGER REFERENCES t_p67413675_chess_tournament_org.users(id),
+    session_token VARCHAR(255) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_agent TEXT,
+    ip_address INET,
+    revoked_at TIMESTAMP,
+    PRIMARY KEY (id, expires_at),
+    UNIQUE (session_token, expires_at)
+) PARTITION BY RANGE (expires_at);
+
+-- Активные сессии пользователя для ограничения их числа при входе
+CREATE INDEX idx_user_sessions_user_expires
+ON t_p67413675_chess_tournament_org.user_sessions_partitioned (user_id, expires_at);
+
+-- Секция месяца: user_sessions_pYYYYMM, границы [начало месяца, начало следующего)
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.create_user_sessions_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    lower_bound DATE := date_trunc('month', month_start)::DATE;
+    upper_bound DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'user_sessions_p' || to_char(lower_bound, 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.%I '
+        'PARTITION OF t_p67413675_chess_tournament_org.user_sessions '
+        'FOR VALUES FROM (%L) TO (%L)',
+        partition_name, lower_bound, upper_bound);
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переносим только действующие сессии: истёкшие никому не нужны
+LOCK TABLE t_p67413675_chess_tournament_org.user_sessions IN EXCLUSIVE MODE;
+
+ALTER SEQUENCE t_p67413675_chess_tournament_org.user_sessions_id_seq OWNED BY NONE;
+ALTER SEQUENCE t_p67413675_chess_tournament_org.user_sessions_id_seq AS BIGINT;
+ALTER TABLE t_p67413675_chess_tournament_org.user_sessions RENAME TO user_sessions_legacy;
+ALTER TABLE t_p67413675_chess_tournament_org.user_sessions_partitioned RENAME TO user_sessions;
+ALTER TABLE t_p67413675_chess_tournament_org.user_sessions
+ALTER COLUMN id SET DEFAULT nextval('t_p67413675_chess_tournament_org.user_sessions_id_seq');
+ALTER SEQUENCE t_p67413675_chess_tournament_org.user_sessions_id_seq
+OWNED BY t_p67413675_chess_tournament_org.user_sessions.id;
+
+-- Секции с текущего месяца на три месяца вперёд; дальше их создаёт сборщик
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', CURRENT_DATE)::DATE;
+BEGIN
+    FOR i IN 0..3 LOOP
+        PERFORM t_p67413675_chess_tournament_org.create_user_sessions_partition(
+            (month_start + make_interval(months => i))::DATE);
+    END LOOP;
+END $$;
+
+INSERT INTO t_p67413675_chess_tournament_org.user_sessions
+    (id, user_id, session_token, expires_at, created_at, user_agent, ip_address, revoked_at)
+SELECT id, user_id, session_token, expires_at, created_at, user_agent, ip_address, revoked_at
+FROM t_p67413675_chess_tournament_org.user_sessions_legacy
+WHERE expires_at > CURRENT_TIMESTAMP
+  AND expires_at < date_trunc('month', CURRENT_DATE) + INTERVAL '4 months';
+
+DROP TABLE t_p67413675_chess_tournament_org.user_sessions_legacy;
+
+ALTER INDEX t_p67413675_chess_tournament_org.user_sessions_partitioned_pkey
+RENAME TO user_sessions_pkey;
+ALTER INDEX t_p67413675_chess_tournament_org.user_sessions_partitioned_session_token_expires_at_key
+RENAME TO user_sessions_session_token_expires_at_key;
@@ -0,0 +1,12 @@
+-- Общие корзины ограничения попыток входа (auth-new/login_throttle.py): ключ
+-- "user:<логин>" или "ip:<адрес>", остаток жетонов на момент updated_at и параметры
+-- корзины, с которыми он посчитан. Жетон тратится только за неудачный вход.
+-- Таблица UNLOGGED: после сбоя сервера лимиты просто начинаются заново,
+-- зато частые перезаписи строк не нагружают WAL
+CREATE UNLOGGED TABLE t_p67413675_chess_tournament_org.login_throttle (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    burst DOUBLE PRECISION NOT NULL,
+    rate DOUBLE PRECISION NOT NULL CHECK (rate > 0),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
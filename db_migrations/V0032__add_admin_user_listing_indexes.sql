@@ -0,0 +1,16 @@
+-- Список пользователей в admin-users идёт по id от новых к старым страницами
+-- "id < курсор": с фильтром по роли или типу пользователя страница читается
+-- из составного индекса без сортировки всей выборки
+CREATE INDEX IF NOT EXISTS idx_users_role_id
+ON t_p67413675_chess_tournament_org.users (role, id);
+
+CREATE INDEX IF NOT EXISTS idx_users_user_type_id
+ON t_p67413675_chess_tournament_org.users (user_type, id);
+
+-- Деактивированных немного: частичный индекс вместо индекса по is_active
+CREATE INDEX IF NOT EXISTS idx_users_inactive_id
+ON t_p67413675_chess_tournament_org.users (id)
+WHERE is_active = false;
+
+-- idx_users_role - префикс idx_users_role_id
+DROP INDEX IF EXISTS t_p67413675_chess_tournament_org.idx_users_role;
@@ -0,0 +1,46 @@
+-- Секция по умолчанию для user_sessions: если сборщик (auth-new/session_sweeper.py)
+-- не запускался и секции месяца ещё нет, вход и регистрация пишут сессию сюда,
+-- а не падают с "no partition of relation found for row"
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.user_sessions_default
+PARTITION OF t_p67413675_chess_tournament_org.user_sessions DEFAULT;
+
+-- При секции по умолчанию CREATE TABLE ... PARTITION OF отказывает, если в ней уже
+-- есть строки месяца. Поэтому секция месяца создаётся отдельной таблицей, строки
+-- месяца переносятся в неё из секции по умолчанию, и только потом она присоединяется.
+-- Всё в одной транзакции вызывающего; секция по умолчанию обычно пуста
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.create_user_sessions_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    lower_bound DATE := date_trunc('month', month_start)::DATE;
+    upper_bound DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'user_sessions_p' || to_char(lower_bound, 'YYYYMM');
+BEGIN
+    IF to_regclass('t_p67413675_chess_tournament_org.' || quote_ident(partition_name)) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE t_p67413675_chess_tournament_org.%I '
+        '(LIKE t_p67413675_chess_tournament_org.user_sessions INCLUDING DEFAULTS)',
+        partition_name);
+    EXECUTE format(
+        'WITH moved AS ('
+        '  DELETE FROM t_p67413675_chess_tournament_org.user_sessions_default'
+        '  WHERE expires_at >= %L AND expires_at < %L RETURNING *'
+        ') INSERT INTO t_p67413675_chess_tournament_org.%I SELECT * FROM moved',
+        lower_bound, upper_bound, partition_name);
+    -- Ограничение избавляет ATTACH от проверки всей таблицы
+    EXECUTE format(
+        'ALTER TABLE t_p67413675_chess_tournament_org.%I ADD CONSTRAINT %I '
+        'CHECK (expires_at IS NOT NULL AND expires_at >= %L AND expires_at < %L)',
+        partition_name, partition_name || '_range', lower_bound, upper_bound);
+    EXECUTE format(
+        'ALTER TABLE t_p67413675_chess_tournament_org.user_sessions '
+        'ATTACH PARTITION t_p67413675_chess_tournament_org.%I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, lower_bound, upper_bound);
+    EXECUTE format(
+        'ALTER TABLE t_p67413675_chess_tournament_org.%I DROP CONSTRAINT %I',
+        partition_name, partition_name || '_range');
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
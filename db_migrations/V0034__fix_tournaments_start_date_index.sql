@@ -0,0 +1,8 @@
+-- V0026 создавал индекс (start_date, id) под именем idx_tournaments_start_date, но
+-- индекс с этим именем по одному start_date уже был из V0002, и IF NOT EXISTS его
+-- пропустил. Каталог get-tournaments (выдача по ключу (start_date, id)) получает
+-- свой индекс здесь; старый - его префикс и больше не нужен
+CREATE INDEX IF NOT EXISTS idx_tournaments_start_date_id
+ON t_p67413675_chess_tournament_org.tournaments (start_date, id);
+
+DROP INDEX IF EXISTS t_p67413675_chess_tournament_org.idx_tournaments_start_date;
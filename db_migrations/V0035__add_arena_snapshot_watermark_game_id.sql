@@ -0,0 +1,7 @@
+-- Арена: водяной знак таблицы - пара (finished_at, id партии), партии учитываются строго
+-- в этом порядке. Прежние снимки собраны в порядке поступления партий на экземпляр и
+-- могут расходиться между экземплярами, поэтому удаляются: таблицы пересоберутся из games
+ALTER TABLE t_p67413675_chess_tournament_org.arena_snapshots
+ADD COLUMN IF NOT EXISTS watermark_game_id INTEGER NOT NULL DEFAULT 0;
+
+DELETE FROM t_p67413675_chess_tournament_org.arena_snapshots;
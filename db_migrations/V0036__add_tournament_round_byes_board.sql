@@ -0,0 +1,4 @@
+-- Место bye в сетке олимпийской системы (как доска у партии): по местам предыдущего
+-- тура строится следующий. В круговых и швейцарских турнирах остаётся NULL
+ALTER TABLE t_p67413675_chess_tournament_org.tournament_round_byes
+ADD COLUMN IF NOT EXISTS board INTEGER;
@@ -0,0 +1,43 @@
+-- Арена: журнал завершённых партий с порядковым номером, присвоенным после коммита.
+-- finish_game добавляет строку без номера той же транзакцией; номера раздаёт один
+-- экземпляр за раз (рекомендательная блокировка в arena.py) только видимым, то есть уже
+-- закоммиченным строкам. Поэтому строка с меньшим seq не появится после строки с большим,
+-- и таблица арены применяет партии по seq одинаково на всех экземплярах
+CREATE SEQUENCE IF NOT EXISTS t_p67413675_chess_tournament_org.arena_game_log_seq AS BIGINT;
+
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.arena_game_log (
+    game_id INTEGER PRIMARY KEY REFERENCES t_p67413675_chess_tournament_org.games(id),
+    tournament_id INTEGER NOT NULL REFERENCES t_p67413675_chess_tournament_org.tournaments(id),
+    seq BIGINT UNIQUE
+);
+
+-- Догрузка таблицы арены после водяного знака
+CREATE INDEX IF NOT EXISTS idx_arena_game_log_tournament_seq
+ON t_p67413675_chess_tournament_org.arena_game_log (tournament_id, seq)
+WHERE seq IS NOT NULL;
+
+-- Строки, ждущие номера
+CREATE INDEX IF NOT EXISTS idx_arena_game_log_unsequenced
+ON t_p67413675_chess_tournament_org.arena_game_log (game_id)
+WHERE seq IS NULL;
+
+-- Уже завершённые партии арен получают номера в прежнем порядке (finished_at, id)
+INSERT INTO t_p67413675_chess_tournament_org.arena_game_log (game_id, tournament_id, seq)
+SELECT ordered.id, ordered.tournament_id,
+       nextval('t_p67413675_chess_tournament_org.arena_game_log_seq')
+FROM (
+    SELECT g.id, g.tournament_id
+    FROM t_p67413675_chess_tournament_org.games g
+    JOIN t_p67413675_chess_tournament_org.tournaments t ON t.id = g.tournament_id
+    WHERE t.tournament_type = 'arena' AND g.result <> 'in_progress'
+    ORDER BY g.finished_at, g.id
+) ordered
+ON CONFLICT (game_id) DO NOTHING;
+
+-- Водяной знак снимка - seq последней учтённой партии; снимки по (finished_at, id)
+-- несовместимы с новым порядком и пересоберутся из журнала
+DELETE FROM t_p67413675_chess_tournament_org.arena_snapshots;
+ALTER TABLE t_p67413675_chess_tournament_org.arena_snapshots
+DROP COLUMN IF EXISTS watermark_game_id,
+DROP COLUMN IF EXISTS watermark,
+ADD COLUMN IF NOT EXISTS watermark_seq BIGINT NOT NULL DEFAULT 0;
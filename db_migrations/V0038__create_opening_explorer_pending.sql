@@ -0,0 +1,9 @@
+-- Очередь дебютного справочника: finish_game ставит завершённую партию сюда той же
+-- транзакцией, а строки opening_explorer (общие для всех партий у первых ходов)
+-- обновляются пачками после коммита (chess-api/opening_explorer.py, drain_pending).
+-- rating - средний рейтинг игроков до партии
+CREATE TABLE IF NOT EXISTS t_p67413675_chess_tournament_org.opening_explorer_pending (
+    game_id INTEGER PRIMARY KEY REFERENCES t_p67413675_chess_tournament_org.games(id),
+    rating DOUBLE PRECISION,
+    queued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
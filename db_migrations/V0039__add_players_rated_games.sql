@@ -0,0 +1,23 @@
+-- Число рейтинговых партий игрока (оба игрока указаны и различны) для провизорного
+-- K-фактора. finish_game и полный пересчёт (chess-api/rating.py) считают его одинаково,
+-- поэтому пересчёт воспроизводит рейтинги, полученные по ходу игры
+ALTER TABLE t_p67413675_chess_tournament_org.players
+ADD COLUMN IF NOT EXISTS rated_games INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_p67413675_chess_tournament_org.players p
+SET rated_games = c.games
+FROM (
+    SELECT player_id, count(*) AS games
+    FROM (
+        SELECT white_player_id AS player_id, black_player_id AS opponent_id
+        FROM t_p67413675_chess_tournament_org.games
+        WHERE result IN ('white_wins', 'black_wins', 'draw')
+        UNION ALL
+        SELECT black_player_id, white_player_id
+        FROM t_p67413675_chess_tournament_org.games
+        WHERE result IN ('white_wins', 'black_wins', 'draw')
+    ) sides
+    WHERE player_id IS NOT NULL AND opponent_id IS NOT NULL AND player_id <> opponent_id
+    GROUP BY player_id
+) c
+WHERE p.id = c.player_id;
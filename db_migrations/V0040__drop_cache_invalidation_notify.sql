@@ -0,0 +1,24 @@
+-- Канал cache_invalidation никто не слушает, а pg_notify при коммите берёт общую
+-- блокировку очереди уведомлений и выстраивает пишущие транзакции в очередь
+CREATE OR REPLACE FUNCTION t_p67413675_chess_tournament_org.bump_tournaments_cache_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE t_p67413675_chess_tournament_org.cache_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE name = 'tournaments';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Из регистраций публичный список показывает только registered_count, а его меняет
+-- триггер V0026 через UPDATE tournaments. Версию сбрасывает триггер на tournaments,
+-- поэтому отдельный триггер на tournament_registrations не нужен: заявки в статусе
+-- pending и отклонённые больше не сбрасывают кэш
+DROP TRIGGER IF EXISTS trg_tournament_registrations_cache_version ON t_p67413675_chess_tournament_org.tournament_registrations;
+
+DROP TRIGGER IF EXISTS trg_tournaments_cache_version ON t_p67413675_chess_tournament_org.tournaments;
+CREATE TRIGGER trg_tournaments_cache_version
+AFTER INSERT OR DELETE OR UPDATE OF name, description, start_date, end_date, max_participants,
+    entry_fee, prize_fund, tournament_type, status, location, time_control, age_category,
+    start_time_msk, rounds, registered_count
+ON t_p67413675_chess_tournament_org.tournaments
+FOR EACH STATEMENT EXECUTE FUNCTION t_p67413675_chess_tournament_org.bump_tournaments_cache_version();
@@ -42,6 +42,47 @@ export interface AdminTournament {
   registered_count: number;
 }
 
+export interface SearchPage<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+export interface UserListParams {
+  role?: AdminUser['role'][];
+  userType?: string[];
+  isActive?: boolean;
+  fields?: (keyof AdminUser)[];
+  limit?: number;
+  cursor?: string;
+}
+
+export interface ExportPage {
+  blob: Blob;
+  count: number;
+  nextCursor: string | null;
+}
+
+export type BulkOutcome = 'updated' | 'unchanged' | 'protected' | 'self' | 'not_found';
+
+export interface BulkUserFilter {
+  role?: AdminUser['role'][];
+  user_type?: string[];
+  is_active?: boolean;
+  last_login_before?: string;
+}
+
+export type BulkUserRequest = (
+  | { operation: 'set_role'; role: Exclude<AdminUser['role'], 'admin'> }
+  | { operation: 'activate' | 'deactivate' }
+) & ({ ids: number[] } | { filter: BulkUserFilter }) & { dry_run?: boolean };
+
+export interface BulkUserResult {
+  operation: string;
+  dry_run: boolean;
+  summary: Record<BulkOutcome, number>;
+  outcomes: Record<BulkOutcome, number[]>;
+}
+
 export interface CreateTournamentData {
   name: string;
   description?: string;
@@ -86,9 +127,46 @@ class AdminApiService {
 
   // === API для управления пользователями ===
 
-  async getUsers(): Promise<AdminUser[]> {
-    const response = await this.makeRequest(ADMIN_USERS_URL);
-    return response.users || [];
+  private userListQuery(params: UserListParams): URLSearchParams {
+    const query = new URLSearchParams();
+    if (params.role?.length) query.set('role', params.role.join(','));
+    if (params.userType?.length) query.set('user_type', params.userType.join(','));
+    if (params.isActive !== undefined) query.set('is_active', String(params.isActive));
+    if (params.fields?.length) query.set('fields', params.fields.join(','));
+    if (params.limit) query.set('limit', String(params.limit));
+    if (params.cursor) query.set('cursor', params.cursor);
+    return query;
+  }
+
+  async getUsers(params: UserListParams = {}): Promise<SearchPage<AdminUser>> {
+    const response = await this.makeRequest(`${ADMIN_USERS_URL}?${this.userListQuery(params)}`);
+    return { items: response.users || [], nextCursor: response.next_cursor || null };
+  }
+
+  // Одна страница выгрузки; следующая запрашивается с cursor = nextCursor
+  async exportUsers(format: 'csv' | 'ndjson', params: UserListParams = {}): Promise<ExportPage> {
+    const query = this.userListQuery(params);
+    query.set('format', format);
+    const sessionToken = authService.getSessionToken();
+    const response = await fetch(`${ADMIN_USERS_URL}?${query}`, {
+      headers: sessionToken ? { 'X-Session-Token': sessionToken } : {},
+    });
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || `HTTP Error: ${response.status}`);
+    }
+    return {
+      blob: await response.blob(),
+      count: Number(response.headers.get('X-Users-Count') || 0),
+      nextCursor: response.headers.get('X-Next-Cursor') || null,
+    };
+  }
+
+  async searchUsers(query: string, cursor?: string): Promise<SearchPage<AdminUser>> {
+    const params = new URLSearchParams({ q: query });
+    if (cursor) params.set('cursor', cursor);
+    const response = await this.makeRequest(`${ADMIN_USERS_URL}?${params}`);
+    return { items: response.users || [], nextCursor: response.next_cursor || null };
   }
 
   async updateUser(userData: Partial<AdminUser> & { id: number }): Promise<AdminUser> {
@@ -99,6 +177,13 @@ class AdminApiService {
     return response.user;
   }
 
+  async bulkUpdateUsers(request: BulkUserRequest): Promise<BulkUserResult> {
+    return this.makeRequest(ADMIN_USERS_URL, {
+      method: 'PATCH',
+      body: JSON.stringify(request),
+    });
+  }
+
   async deleteUser(userId: number): Promise<boolean> {
     const response = await this.makeRequest(`${ADMIN_USERS_URL}?id=${userId}`, {
       method: 'DELETE',
@@ -113,6 +198,13 @@ class AdminApiService {
     return response.tournaments || [];
   }
 
+  async searchTournaments(query: string, cursor?: string): Promise<SearchPage<AdminTournament>> {
+    const params = new URLSearchParams({ q: query });
+    if (cursor) params.set('cursor', cursor);
+    const response = await this.makeRequest(`${ADMIN_TOURNAMENTS_URL}?${params}`);
+    return { items: response.tournaments || [], nextCursor: response.next_cursor || null };
+  }
+
   async createTournament(tournamentData: CreateTournamentData): Promise<AdminTournament> {
     const response = await this.makeRequest(ADMIN_TOURNAMENTS_URL, {
       method: 'POST',
@@ -31,6 +31,40 @@ export interface GameDetails extends Game {
   moves: GameMove[];
 }
 
+export interface ArenaRow {
+  place: number;
+  player_id: number;
+  name: string | null;
+  score: number;
+  on_streak: boolean;
+  games_played: number;
+  games_won: number;
+  berserks: number;
+}
+
+export interface ExplorerMove {
+  move: string;
+  games: number;
+  white_wins: number;
+  draws: number;
+  black_wins: number;
+  white_score: number | null;
+  average_rating: number | null;
+}
+
+export interface StandingsRow {
+  place: number;
+  player_id: number;
+  name: string | null;
+  rating: number | null;
+  games_played: number;
+  score: number;
+  buchholz: number;
+  median_buchholz: number;
+  sonneborn_berger: number;
+  progressive: number;
+}
+
 class ChessApi {
   private async makeRequest(endpoint: string, options: RequestInit = {}) {
     const url = `${API_BASE_URL}${endpoint}`;
@@ -74,6 +108,47 @@ class ChessApi {
     return data.games;
   }
 
+  async getGamesPage(
+    options: { cursor?: string; limit?: number; playerId?: number; result?: Game['result'] } = {}
+  ): Promise<{ games: Game[]; next_cursor: string | null }> {
+    const params = new URLSearchParams();
+    if (options.cursor) params.set('cursor', options.cursor);
+    if (options.limit) params.set('limit', String(options.limit));
+    if (options.playerId) params.set('player_id', String(options.playerId));
+    if (options.result) params.set('result', options.result);
+    return this.makeRequest(`/games?${params.toString()}`);
+  }
+
+  async getArena(
+    tournamentId: number,
+    options: { top?: number; offset?: number; playerId?: number } = {}
+  ): Promise<{ players_total: number; leaders: ArenaRow[]; player: ArenaRow | null }> {
+    const params = new URLSearchParams({ tournament_id: String(tournamentId) });
+    if (options.top) params.set('top', String(options.top));
+    if (options.offset) params.set('offset', String(options.offset));
+    if (options.playerId) params.set('player_id', String(options.playerId));
+    return this.makeRequest(`/arena?${params.toString()}`);
+  }
+
+  async berserk(gameId: number, color: 'white' | 'black'): Promise<void> {
+    await this.makeRequest('/', {
+      method: 'POST',
+      body: JSON.stringify({ action: 'berserk', game_id: gameId, color }),
+    });
+  }
+
+  async getOpeningMoves(fen?: string): Promise<ExplorerMove[]> {
+    const params = new URLSearchParams();
+    if (fen) params.set('fen', fen);
+    const data = await this.makeRequest(`/explorer?${params.toString()}`);
+    return data.moves;
+  }
+
+  async getStandings(tournamentId: number): Promise<StandingsRow[]> {
+    const data = await this.makeRequest(`/standings?tournament_id=${tournamentId}`);
+    return data.standings;
+  }
+
   async getGame(gameId: number): Promise<GameDetails> {
     const data = await this.makeRequest(`/game?id=${gameId}`);
     return data.game;
@@ -112,6 +187,24 @@ class ChessApi {
     });
   }
 
+  async saveMoves(
+    moves: Array<{
+      game_id: number;
+      move_number: number;
+      player_color: 'white' | 'black';
+      move_notation: string;
+      board_state?: string;
+    }>
+  ): Promise<void> {
+    await this.makeRequest('/', {
+      method: 'POST',
+      body: JSON.stringify({
+        action: 'save_moves',
+        moves,
+      }),
+    });
+  }
+
   async finishGame(gameId: number, result: 'white_wins' | 'black_wins' | 'draw'): Promise<void> {
     await this.makeRequest('/', {
       method: 'POST',